@@ -0,0 +1,5 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+""" Benchmarks for waydroid's hot paths. They are not installed, run them
+    from the source tree, e.g. "python3 -m benchmarks.importtime". """
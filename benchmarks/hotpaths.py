@@ -0,0 +1,178 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+import types
+from unittest import mock
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+import tools.config
+import tools.helpers.logging
+from benchmarks.simulator import Simulator, DATA
+
+""" Micro-benchmarks of waydroid's hot paths against the fake container of
+    benchmarks.simulator. Run "python3 -m benchmarks.hotpaths --help".
+
+    Results can be saved with --save and compared against later with
+    --compare, e.g. before and after a change. """
+
+def make_args(workdir, sim):
+    args = types.SimpleNamespace()
+    args.details_to_stdout = False
+    args.quiet = True
+    args.verbose = False
+    args.action = "benchmark"
+    args.work = workdir
+    args.log = os.path.join(workdir, "waydroid.log")
+    args.config = os.path.join(workdir, "waydroid.cfg")
+    args.timeout = 1800
+    args.sudo_timer = False
+    args.cache = {}
+
+    # Keep everything away from the real /var/lib/waydroid
+    for key in ["rootfs", "overlay", "overlay_rw", "overlay_work", "data",
+                "lxc", "host_perms"]:
+        tools.config.defaults[key] = os.path.join(workdir, key)
+        os.makedirs(tools.config.defaults[key], exist_ok=True)
+    tools.config.defaults["images_path"] = os.path.join(workdir, "images")
+    tools.config.tools_src = sim.tools_src
+
+    with open(os.path.join(workdir, "waydroid_base.prop"), "w") as handle:
+        handle.write("ro.product.brand=waydroid\nro.hardware.gralloc=gbm\n")
+
+    tools.helpers.logging.init(args)
+    cfg = tools.config.load(args)
+    tools.config.save(args, cfg)
+    return args
+
+def case_status(args, sim):
+    import tools.helpers.lxc
+    return lambda: tools.helpers.lxc.status(args)
+
+def case_getprop(args, sim):
+    import tools.helpers.lxc
+    return lambda: tools.helpers.lxc.getprop("ro.build.version.release")
+
+def case_sleep_status(args, sim):
+    import tools.helpers.lxc
+    return lambda: tools.helpers.lxc.sleep_status()
+
+def case_notification_parse(args, sim):
+    import tools.actions.notification_server
+    with open(os.path.join(DATA, "dumpsys_notification.txt")) as handle:
+        dumpsys = handle.read()
+    with open(os.path.join(DATA, "pm_packages.txt")) as handle:
+        packages = [line.split(":")[1] for line in handle.read().splitlines()]
+    return lambda: tools.actions.notification_server.parse_notifications(
+        dumpsys, packages)
+
+def case_container_stop(args, sim):
+    import tools.actions.container_manager
+
+    def op():
+        sim.set_state("RUNNING")
+        tools.actions.container_manager.stop(args, quit_session=False)
+    return op
+
+def case_mount_rootfs(args, sim):
+    import tools.helpers.images
+    import tools.helpers.mount
+    session = copy.copy(tools.config.session_defaults)
+    for name in ["mount", "mount_overlay", "bind", "bind_file", "umount_all"]:
+        mock.patch.object(tools.helpers.mount, name).start()
+    mock.patch.object(tools.helpers.mount, "ismount",
+                      return_value=False).start()
+    return lambda: tools.helpers.images.mount_rootfs(
+        args, tools.config.defaults["images_path"], session)
+
+CASES = {
+    "lxc.status": case_status,
+    "lxc.getprop": case_getprop,
+    "lxc.sleep_status": case_sleep_status,
+    "notification_server.parse": case_notification_parse,
+    "container_manager.stop": case_container_stop,
+    "images.mount_rootfs": case_mount_rootfs,
+}
+
+def measure(op, iterations, warmup=2):
+    for _ in range(warmup):
+        op()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        op()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return {
+        "ops": len(durations) / sum(durations),
+        "p50": durations[len(durations) // 2] * 1000,
+        "p99": durations[min(len(durations) - 1,
+                             int(len(durations) * 0.99))] * 1000,
+    }
+
+def delta(new, old):
+    if not old:
+        return ""
+    return "{:+6.1f}%".format((new - old) * 100.0 / old)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.hotpaths")
+    parser.add_argument("-l", "--latency", type=float, default=5,
+                        help="latency of every fake lxc command in ms"
+                             " (default: 5)")
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("-k", "--only", action="append", choices=CASES,
+                        help="only run this benchmark (may be repeated)")
+    parser.add_argument("--save", metavar="FILE",
+                        help="save the results as baseline")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="compare against a saved baseline")
+    bench = parser.parse_args()
+
+    baseline = {}
+    if bench.compare:
+        with open(bench.compare) as handle:
+            baseline = json.load(handle)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, \
+            Simulator(bench.latency / 1000.0) as sim:
+        args = make_args(workdir, sim)
+        print("{:<28} {:>10} {:>10} {:>10}{}".format(
+            "BENCHMARK", "OPS/s", "P50(ms)", "P99(ms)",
+            "  {:>8} {:>8}".format("OPS", "P50") if baseline else ""))
+        for name in bench.only or CASES:
+            try:
+                op = CASES[name](args, sim)
+            except ImportError as e:
+                print("{:<28} skipped: {}".format(name, e))
+                continue
+            try:
+                result = measure(op, bench.iterations)
+            except Exception:
+                print("{:<28} failed:".format(name))
+                traceback.print_exc()
+                continue
+            results[name] = result
+            old = baseline.get(name, {})
+            print("{:<28} {:>10.1f} {:>10.2f} {:>10.2f}{}".format(
+                name, result["ops"], result["p50"], result["p99"],
+                "  {:>8} {:>8}".format(delta(result["ops"], old.get("ops")),
+                                       delta(result["p50"], old.get("p50")))
+                if baseline else ""))
+        mock.patch.stopall()
+        tools.helpers.logging.stop_writer()
+
+    if bench.save:
+        with open(bench.save, "w") as handle:
+            json.dump(results, handle, indent=1)
+
+if __name__ == "__main__":
+    main()
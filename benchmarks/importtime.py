@@ -0,0 +1,90 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import os
+import subprocess
+import sys
+
+""" Import-time regression check for the common subcommands. Every case
+    imports what the subcommand imports before doing any actual work, under
+    "python3 -X importtime", and the cumulative time of everything imported
+    on top of a bare interpreter is compared against a budget. """
+
+SRC = os.path.normpath(os.path.join(os.path.dirname(__file__), ".."))
+
+# subcommand -> (statements run after "import tools", budget in ms)
+CASES = {
+    "log": ([], 40),
+    "status": (["import dbus.mainloop.glib",
+                "tools.actions.status"], 120),
+    "prop get": (["import dbus.mainloop.glib",
+                  "tools.actions.prop",
+                  "tools.interfaces.IPlatform"], 250),
+}
+
+def parse_importtime(stderr):
+    """
+    :returns: dict of module name -> cumulative import time in us, for the
+              top level imports only (nested ones are part of those)
+    """
+    ret = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        if name.startswith("  "):
+            continue
+        ret[name.strip()] = int(fields[1])
+    return ret
+
+def measure(statements, repeat):
+    """ Best of <repeat> runs, in ms. """
+    code = "\n".join(["import tools"] + statements)
+    env = dict(os.environ, PYTHONPATH=SRC, PYTHONDONTWRITEBYTECODE="")
+    best = None
+    for _ in range(repeat):
+        base = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"],
+                              cwd=SRC, env=env, stderr=subprocess.PIPE, text=True)
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                              cwd=SRC, env=env, stderr=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        startup = parse_importtime(base.stderr)
+        total = sum(us for name, us in parse_importtime(proc.stderr).items()
+                    if name not in startup)
+        best = total if best is None else min(best, total)
+    return best / 1000.0
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.importtime")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="runs per subcommand, the best one counts")
+    parser.add_argument("-b", "--budget", action="append", default=[],
+                        metavar="SUBCOMMAND=MS",
+                        help="override the budget of a subcommand")
+    args = parser.parse_args()
+
+    budgets = {name: budget for name, (_, budget) in CASES.items()}
+    for override in args.budget:
+        name, _, value = override.partition("=")
+        budgets[name] = float(value)
+
+    failed = False
+    for name, (statements, _) in CASES.items():
+        try:
+            ms = measure(statements, args.repeat)
+        except RuntimeError as e:
+            print("{:<10} SKIP  {}".format(name, e))
+            continue
+        ok = ms <= budgets[name]
+        failed |= not ok
+        print("{:<10} {}  {:7.1f} ms (budget {:.0f} ms)".format(
+            name, "ok  " if ok else "FAIL", ms, budgets[name]))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
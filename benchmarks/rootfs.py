@@ -0,0 +1,91 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import copy
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+import tools.config
+import tools.helpers.images
+import tools.helpers.logging
+import tools.helpers.loop
+import tools.helpers.mount
+from benchmarks.hotpaths import make_args, measure
+from benchmarks.simulator import Simulator
+
+""" Time the rootfs assembly of images.mount_rootfs (system.img, vendor.img,
+    both overlays and the waydroid.prop bind mount) with the syscall mount
+    backend and with mount(8), and with cold and warm loop devices. Needs
+    root and mkfs.ext4, the images are
+    small synthetic ext4 images. Run "python3 -m benchmarks.rootfs". """
+
+# (mount backend, keep the loop devices attached between iterations)
+BACKENDS = [("mount", False), ("syscall", False), ("syscall", True)]
+
+def make_image(path, tree, size_mb):
+    """ Create an ext4 image populated with the (empty) files of tree """
+    with tempfile.TemporaryDirectory() as root:
+        for name in tree:
+            full = os.path.join(root, name)
+            if name.endswith("/"):
+                os.makedirs(full, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(full), exist_ok=True)
+                open(full, "w").close()
+        subprocess.run(["truncate", "-s", "{}M".format(size_mb), path],
+                       check=True)
+        subprocess.run(["mkfs.ext4", "-q", "-F", "-d", root, path],
+                       check=True)
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.rootfs")
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("--size", type=int, default=64,
+                        help="size of each image in MiB (default: 64)")
+    bench = parser.parse_args()
+
+    if os.geteuid() != 0:
+        print("benchmarks.rootfs needs to run as root")
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as workdir, Simulator(0) as sim:
+        args = make_args(workdir, sim)
+        images = tools.config.defaults["images_path"]
+        os.makedirs(images, exist_ok=True)
+        make_image(images + "/system.img",
+                   ["vendor/", "odm_extra/", "system/build.prop"], bench.size)
+        make_image(images + "/vendor.img",
+                   ["waydroid.prop", "build.prop", "lib64/egl/"], bench.size)
+        session = copy.copy(tools.config.session_defaults)
+
+        def release():
+            for name, entry in tools.helpers.loop.load_state(args).items():
+                tools.helpers.loop.release(entry["device"], name)
+
+        def op(warm):
+            try:
+                tools.helpers.images.mount_rootfs(args, images, session)
+            finally:
+                tools.helpers.images.umount_rootfs(args)
+                if not warm:
+                    release()
+
+        print("{:<16} {:>10} {:>10} {:>10}".format(
+            "BACKEND", "OPS/s", "P50(ms)", "P99(ms)"))
+        try:
+            for backend, warm in BACKENDS:
+                tools.helpers.mount.backend = backend
+                result = measure(lambda: op(warm), bench.iterations)
+                print("{:<16} {:>10.1f} {:>10.2f} {:>10.2f}".format(
+                    backend + (" (warm)" if warm else ""),
+                    result["ops"], result["p50"], result["p99"]))
+        finally:
+            release()
+            tools.helpers.logging.stop_writer()
+
+if __name__ == "__main__":
+    main()
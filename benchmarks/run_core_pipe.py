@@ -0,0 +1,81 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(__file__), "..")))
+import tools.helpers.logging
+import tools.helpers.run_core
+
+""" Throughput of tools.helpers.run_core.foreground_pipe() with a command
+    that prints a lot of log-like lines. Every output mode that goes through
+    the pump is measured: log only, returning the output and copying it to
+    stdout (redirected to /dev/null here). """
+
+LINE = "[12:34:56] lorem ipsum dolor sit amet, consectetur adipiscing elit\n"
+
+def make_args(workdir):
+    args = types.SimpleNamespace()
+    args.details_to_stdout = False
+    args.quiet = True
+    args.verbose = False
+    args.action = "benchmark"
+    args.log = os.path.join(workdir, "waydroid.log")
+    args.config = os.path.join(workdir, "waydroid.cfg")
+    args.timeout = 1800
+    args.sudo_timer = False
+    args.cache = {}
+    tools.helpers.logging.init(args)
+    # Measure the pump, not the rotation
+    tools.helpers.logging.writer.can_rotate = False
+    return args
+
+def run(args, size, output, output_return):
+    cmd = ["sh", "-c", "yes '{}' | head -c {}".format(LINE.rstrip("\n"),
+                                                    size)]
+    start = time.perf_counter()
+    ret = tools.helpers.run_core.core(args, "% benchmark", cmd, output=output,
+                                      output_return=output_return)
+    elapsed = time.perf_counter() - start
+    if output_return and len(ret) != size:
+        raise RuntimeError("Got {} bytes instead of {}".format(len(ret), size))
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks.run_core_pipe")
+    parser.add_argument("-s", "--size", type=int, default=100,
+                        help="output size in MiB")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="runs per mode, the best one counts")
+    args_bench = parser.parse_args()
+    size = args_bench.size * 1024 * 1024
+
+    with tempfile.TemporaryDirectory() as workdir:
+        args = make_args(workdir)
+        stdout = os.dup(1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        for name, output, output_return in [("log", "log", False),
+                                            ("output_return", "log", True),
+                                            ("stdout", "stdout", False)]:
+            best = None
+            for _ in range(args_bench.repeat):
+                os.truncate(args.log, 0)
+                sys.stdout.flush()
+                os.dup2(devnull, 1)
+                try:
+                    elapsed = run(args, size, output, output_return)
+                finally:
+                    sys.stdout.flush()
+                    os.dup2(stdout, 1)
+                best = elapsed if best is None else min(best, elapsed)
+            print("{:<14} {:7.3f} s {:9.1f} MiB/s".format(
+                name, best, args_bench.size / best))
+        tools.helpers.logging.stop_writer()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+""" A fake LXC container for benchmarks. Simulator() creates lxc-info,
+    lxc-attach, lxc-start, lxc-stop, lxc-freeze, lxc-unfreeze, getprop and
+    systemctl executables that answer from canned data after a configurable
+    latency, and puts them first in PATH. lxc-attach serves getprop, dumpsys
+    (from benchmarks/data/dumpsys_<service>.txt) and pm list packages.
+
+    It also provides a tools_src tree with a no-op waydroid-net.sh, so
+    container stop/start paths don't touch the host network. """
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+FAKE = """#!{python} -IS
+import json, os, sys, time
+
+sim = {sim!r}
+time.sleep(float(os.environ.get("WAYDROID_SIM_LATENCY", "0")))
+name = os.path.basename(sys.argv[0])
+argv = sys.argv[1:]
+
+def state(new=None):
+    if new is not None:
+        with open(sim + "/state", "w") as handle:
+            handle.write(new)
+    with open(sim + "/state") as handle:
+        return handle.read()
+
+def getprop(props, argv):
+    if argv:
+        print(props.get(argv[0], ""))
+    else:
+        for key, value in props.items():
+            print("[{{}}]: [{{}}]".format(key, value))
+
+def android(cmd):
+    with open(sim + "/android.json") as handle:
+        props = json.load(handle)
+    if cmd[0] == "getprop":
+        getprop(props, cmd[1:])
+    elif cmd[0] == "dumpsys":
+        with open({data!r} + "/dumpsys_" + cmd[1] + ".txt") as handle:
+            sys.stdout.write(handle.read())
+    elif cmd[:3] == ["pm", "list", "packages"]:
+        with open({data!r} + "/pm_packages.txt") as handle:
+            sys.stdout.write(handle.read())
+
+if name == "lxc-info":
+    print(state())
+elif name == "lxc-start":
+    state("RUNNING")
+elif name == "lxc-stop":
+    state("STOPPED")
+elif name == "lxc-freeze":
+    state("FROZEN")
+elif name == "lxc-unfreeze":
+    state("RUNNING")
+elif name == "lxc-attach":
+    if state() != "RUNNING":
+        sys.exit(1)
+    cmd = argv[argv.index("--") + 1:]
+    if cmd[:2] == ["/system/bin/sh", "-c"]:
+        cmd = cmd[2].split()
+    android(cmd)
+elif name == "getprop":
+    with open(sim + "/host.json") as handle:
+        getprop(json.load(handle), argv)
+elif name == "systemctl":
+    sys.exit(1)
+"""
+
+COMMANDS = ["lxc-info", "lxc-attach", "lxc-start", "lxc-stop", "lxc-freeze",
+            "lxc-unfreeze", "getprop", "systemctl"]
+
+ANDROID_PROPS = {
+    "ro.build.version.release": "13",
+    "ro.build.version.sdk": "33",
+    "sys.boot_completed": "1",
+    "furios.android.userunlocked": "true",
+    "waydroid.host_data_path": "/home/furios/.local/share/waydroid/data",
+}
+
+HOST_PROPS = {
+    "ro.product.vendor.brand": "FuriLabs",
+    "ro.product.vendor.device": "FLX1",
+    "ro.sf.lcd_density": "480",
+}
+
+class Simulator:
+    def __init__(self, latency=0.0, state="RUNNING"):
+        self.latency = latency
+        self.initial_state = state
+        self.dir = None
+        self.old_env = {}
+
+    def __enter__(self):
+        self.dir = tempfile.mkdtemp(prefix="waydroid-sim-")
+        bin_dir = os.path.join(self.dir, "bin")
+        os.makedirs(bin_dir)
+        fake = os.path.join(bin_dir, "fake")
+        with open(fake, "w") as handle:
+            handle.write(FAKE.format(python=sys.executable, sim=self.dir,
+                                     data=DATA))
+        os.chmod(fake, 0o755)
+        for command in COMMANDS:
+            os.symlink("fake", os.path.join(bin_dir, command))
+
+        scripts = os.path.join(self.dir, "src", "data", "scripts")
+        os.makedirs(scripts)
+        with open(scripts + "/waydroid-net.sh", "w") as handle:
+            handle.write("#!/bin/sh\nexit 0\n")
+        os.chmod(scripts + "/waydroid-net.sh", 0o755)
+
+        with open(self.dir + "/android.json", "w") as handle:
+            json.dump(ANDROID_PROPS, handle)
+        with open(self.dir + "/host.json", "w") as handle:
+            json.dump(HOST_PROPS, handle)
+        self.set_state(self.initial_state)
+
+        for key, value in [("PATH", bin_dir + ":" + os.environ["PATH"]),
+                           ("WAYDROID_SIM_LATENCY", str(self.latency))]:
+            self.old_env[key] = os.environ.get(key)
+            os.environ[key] = value
+        return self
+
+    def __exit__(self, *exc):
+        for key, value in self.old_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        shutil.rmtree(self.dir)
+
+    @property
+    def tools_src(self):
+        return os.path.join(self.dir, "src")
+
+    def set_state(self, state):
+        with open(self.dir + "/state", "w") as handle:
+            handle.write(state)
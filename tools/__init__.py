@@ -9,9 +9,6 @@ import subprocess
 import os
 import time
 import traceback
-import dbus.mainloop.glib
-import dbus
-import dbus.exceptions
 
 from . import actions
 from . import config
@@ -44,8 +41,11 @@ def main():
 
         tools_logging.init(args)
 
-        dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
-        dbus.mainloop.glib.threads_init()
+        # Only pay for dbus when the action may talk to a bus
+        if args.action not in (None, "log", "shell", "logcat"):
+            import dbus.mainloop.glib
+            dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+            dbus.mainloop.glib.threads_init()
         dbus_name_scope = None
         dbus_notification_scope = None
         dbus_statechange_scope = None
@@ -73,6 +73,7 @@ def main():
         elif args.action == "container":
             actionNeedRoot(args.action)
             if args.subaction == "start":
+                import dbus.service
                 if dbus_name_scope is None:
                     try:
                         dbus_name_scope = dbus.service.BusName("id.waydro.Container", dbus.SystemBus(), do_not_queue=True)
@@ -95,6 +96,7 @@ def main():
         elif args.action == "notification_server":
             actionNeedRoot(args.action)
             if args.subaction == "start":
+                import dbus.service
                 if dbus_notification_scope is None:
                     try:
                         dbus_notification_scope = dbus.service.BusName("id.waydro.Notification", dbus.SystemBus(), do_not_queue=True)
@@ -113,6 +115,7 @@ def main():
         elif args.action == "statechange_server":
             actionNeedRoot(args.action)
             if args.subaction == "start":
+                import dbus.service
                 if dbus_notification_scope is None:
                     try:
                         dbus_notification_scope = dbus.service.BusName("id.waydro.StateChange", dbus.SystemBus(), do_not_queue=True)
@@ -160,6 +163,23 @@ def main():
             actions.app_manager.showFullUI(args)
         elif args.action == "status":
             actions.status.print_status(args)
+        elif args.action == "debug":
+            if args.subaction == "binder-stats":
+                actions.debug.binder_stats(args)
+            elif args.subaction == "binder":
+                actionNeedRoot(args.action)
+                actions.debug.binder(args)
+            elif args.subaction == "last-boot":
+                actions.debug.last_boot(args)
+            elif args.subaction == "props":
+                actions.debug.props(args)
+            elif args.subaction == "boot-profile":
+                if args.reset:
+                    actionNeedRoot(args.action)
+                actions.debug.boot_profile(args)
+            else:
+                logging.info(
+                    "Run waydroid {} -h for usage information.".format(args.action))
         elif args.action == "log":
             if args.clear_log:
                 helpers.run.user(args, ["truncate", "-s", "0", args.log])
@@ -190,6 +210,11 @@ def main():
         print(log_hint)
         return 1
 
+    finally:
+        # Binder calls of CLI commands count towards the session's statistics
+        if args and args.action != "session":
+            helpers.binder_stats.report_to_session()
+
 
 if __name__ == "__main__":
     sys.exit(main())
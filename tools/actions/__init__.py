@@ -2,12 +2,44 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from tools.actions.initializer import init, wait_for_init
-from tools.actions.upgrader import upgrade
-from tools.actions.session_manager import start, stop
-from tools.actions.container_manager import start, stop, freeze, unfreeze
-from tools.actions.notification_server import start, stop
-from tools.actions.statechange_server import start, stop
-from tools.actions.app_manager import install, remove, launch, list
-from tools.actions.status import print_status
-from tools.actions.prop import get, set
+import importlib
+
+""" Action modules are imported on first use, so every subcommand only pays
+    for the modules (dbus, gbinder, gi.repository, ...) it actually needs.
+    tools.actions.<module> and the functions below resolve transparently. """
+
+_exports = {
+    "init": "initializer",
+    "wait_for_init": "initializer",
+    "upgrade": "upgrader",
+    "start": "statechange_server",
+    "stop": "statechange_server",
+    "freeze": "container_manager",
+    "unfreeze": "container_manager",
+    "install": "app_manager",
+    "remove": "app_manager",
+    "launch": "app_manager",
+    "list": "app_manager",
+    "print_status": "status",
+    "get": "prop",
+    "set": "prop",
+    "binder_stats": "debug",
+    "binder": "debug",
+    "last_boot": "debug",
+    "boot_profile": "debug",
+    "props": "debug",
+}
+
+def __getattr__(name):
+    if name in _exports:
+        module = importlib.import_module("tools.actions." + _exports[name])
+        value = getattr(module, name)
+    else:
+        try:
+            value = importlib.import_module("tools.actions." + name)
+        except ModuleNotFoundError as e:
+            if e.name != "tools.actions." + name:
+                raise
+            raise AttributeError("module 'tools.actions' has no attribute '{}'".format(name))
+    globals()[name] = value
+    return value
@@ -7,6 +7,7 @@ import logging
 import os
 import time
 import glob
+import concurrent.futures
 import signal
 import sys
 import uuid
@@ -49,6 +50,10 @@ class DbusContainerManager(dbus.service.Object):
     def Stop(self, quit_session):
         stop(self.args, quit_session)
 
+    @dbus.service.method("id.waydro.ContainerManager", in_signature='', out_signature='')
+    def StopSession(self):
+        stop_session(self.args)
+
     @dbus.service.method("id.waydro.ContainerManager", in_signature='', out_signature='')
     def Freeze(self):
         freeze(self.args)
@@ -108,6 +113,10 @@ class DbusContainerManager(dbus.service.Object):
     def GetNfcStatus(self):
         return nfc_status(self.args)
 
+    @dbus.service.method("id.waydro.ContainerManager", in_signature='', out_signature='')
+    def BootCompleted(self):
+        boot_completed(self.args)
+
     @dbus.service.method("id.waydro.ContainerManager", in_signature='', out_signature='')
     def ForceFinishSetup(self):
         force_finish_setup(self.args)
@@ -168,11 +177,21 @@ def service(args, looper):
     looper.run()
 
 def chmod(args, path, mode):
-    if os.path.exists(path):
-        command = ["chmod", mode, "-R", path]
-        tools.helpers.run.user(args, command, check=False)
+    checked, changed, failed = helpers.fileops.chmod_tree(path, int(mode, 8))
+    if changed:
+        logging.debug("% chmod {} -R {} ({} of {} changed)".format(
+            mode, path, len(changed), len(checked)))
+    return checked, changed, failed
 
 def set_permissions(args, perm_list=None, mode="777"):
+    """
+    Make device nodes accessible to the container. Nodes that already have
+    the right mode are left alone and independent paths are handled in
+    parallel.
+
+    :returns: dict with the number of nodes "checked", "changed" and
+              "failed"
+    """
     # Nodes list
     if not perm_list:
         perm_list = [
@@ -201,8 +220,18 @@ def set_permissions(args, perm_list=None, mode="777"):
         # Videos
         perm_list.extend(glob.glob("/dev/video*"))
 
-    for path in perm_list:
-        chmod(args, path, mode)
+    summary = {"checked": 0, "changed": 0, "failed": 0}
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(8, len(perm_list) or 1)) as executor:
+        for checked, changed, failed in executor.map(
+                lambda path: chmod(args, path, mode), perm_list):
+            summary["checked"] += len(checked)
+            summary["changed"] += len(changed)
+            summary["failed"] += len(failed)
+
+    logging.debug("Permissions set to {}: {checked} nodes checked, {changed}"
+                  " changed, {failed} failed".format(mode, **summary))
+    return summary
 
 def start(args):
     try:
@@ -214,7 +243,7 @@ def start(args):
     status = helpers.lxc.status(args)
     if status == "STOPPED":
         # Load binder and ashmem drivers
-        cfg = tools.config.load(args)
+        cfg = tools.config.view(args)
         if cfg["waydroid"]["vendor_type"] == "MAINLINE":
             if helpers.drivers.probeBinderDriver(args) != 0:
                 logging.error("Failed to load Binder driver")
@@ -242,45 +271,271 @@ def do_start(args, session):
     if "session" in args:
         raise RuntimeError("Already tracking a session")
 
-    # Networking
-    command = [tools.config.tools_src +
-               "/data/scripts/waydroid-net.sh", "start"]
-    tools.helpers.run.user(args, command)
-
+    trace = helpers.trace
+    boot_start = session.get("boot_start")
+    try:
+        trace.begin_boot(int(boot_start) if boot_start else None,
+                         int(session["pid"]), int(session["user_id"]))
+    except OSError as e:
+        logging.debug("Failed to start the boot trace: {}".format(e))
+    try:
+        with trace.span("container start"):
+            if not resume(args, session):
+                do_start_traced(args, session)
+    finally:
+        trace.detach()
+
+def run_steps(steps):
+    """
+    Run steps on a thread pool, each one as soon as the steps it depends on
+    are done. When a step fails, the steps that didn't start yet are
+    cancelled and its exception is raised once the running ones returned.
+
+    :param steps: list of (name, function, names of dependencies)
+    :returns: dict of step name -> (start, end) in time.monotonic() seconds
+    """
+    pending = {name: (func, deps) for name, func, deps in steps}
+    done = {}
+    running = {}
+    error = None
+
+    def run_step(name, func):
+        with helpers.trace.span(name):
+            start = time.monotonic()
+            func()
+            return start, time.monotonic()
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(steps)) as executor:
+        while pending or running:
+            if error is None:
+                for name, (func, deps) in list(pending.items()):
+                    if all(dep in done for dep in deps):
+                        del pending[name]
+                        future = executor.submit(run_step, name, func)
+                        running[future] = name
+            if not running:
+                break
+            finished, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    done[name] = future.result()
+                except Exception as e:
+                    logging.error("Start step {} failed: {}".format(name, e))
+                    if error is None:
+                        error = e
+
+    if error is not None:
+        if pending:
+            logging.debug("Cancelled start steps: " + ", ".join(pending))
+        raise error
+    if pending:
+        raise RuntimeError("Unresolved start steps: " + ", ".join(pending))
+    return done
+
+def critical_path(steps, times):
+    """
+    :returns: names of the chain of steps that determined how long running
+              all of them took, in the order they ran
+    """
+    deps = {name: step_deps for name, _, step_deps in steps}
+    name = max(times, key=lambda step: times[step][1])
+    path = [name]
+    while deps[name]:
+        name = max(deps[name], key=lambda step: times[step][1])
+        path.append(name)
+    return path[::-1]
+
+def do_start_traced(args, session):
     # Cgroup hacks
-    if os.path.ismount("/sys/fs/cgroup/schedtune"):
-        command = ["umount", "-l", "/sys/fs/cgroup/schedtune"]
-        tools.helpers.run.user(args, command, check=False)
+    def umount_schedtune():
+        if os.path.ismount("/sys/fs/cgroup/schedtune"):
+            command = ["umount", "-l", "/sys/fs/cgroup/schedtune"]
+            tools.helpers.run.user(args, command, check=False)
 
     #TODO: remove NFC hacks
-    if which("systemctl") and (tools.helpers.run.user(args, ["systemctl", "is-active", "-q", "nfcd"], check=False) == 0):
-        command = ["systemctl", "stop", "nfcd"]
-        tools.helpers.run.user(args, command, check=False)
-
-    # Set permissions
-    set_permissions(args)
+    def stop_nfcd():
+        if which("systemctl") and (tools.helpers.run.user(args, ["systemctl", "is-active", "-q", "nfcd"], check=False) == 0):
+            command = ["systemctl", "stop", "nfcd"]
+            tools.helpers.run.user(args, command, check=False)
 
     # Create session-specific LXC config file
-    helpers.lxc.generate_session_lxc_config(args, session)
-    # Backwards compatibility
-    with open(tools.config.defaults["lxc"] + "/waydroid/config") as f:
-        if "config_session" not in f.read():
-            helpers.mount.bind(args, session["waydroid_data"],
-                               tools.config.defaults["data"])
-
-    # Mount rootfs
-    cfg = tools.config.load(args)
-    helpers.images.mount_rootfs(args, cfg["waydroid"]["images_path"], session)
-
-    helpers.protocol.set_aidl_version(args)
+    def session_config():
+        helpers.lxc.generate_session_lxc_config(args, session)
+        # Backwards compatibility
+        with open(tools.config.defaults["lxc"] + "/waydroid/config") as f:
+            if "config_session" not in f.read():
+                helpers.mount.bind(args, session["waydroid_data"],
+                                   tools.config.defaults["data"])
+
+    def mount_rootfs():
+        cfg = tools.config.view(args)
+        helpers.images.mount_rootfs(args, cfg["waydroid"]["images_path"],
+                                    session)
+
+    # Networking, device permissions and the rootfs don't depend on each
+    # other, only the container start needs all of them
+    steps = [
+        ("start network", lambda: helpers.net.start_network(args), []),
+        ("umount schedtune", umount_schedtune, []),
+        ("stop nfcd", stop_nfcd, []),
+        ("set_permissions", lambda: set_permissions(args), []),
+        ("generate_session_lxc_config", session_config, []),
+        ("mount_rootfs", mount_rootfs, []),
+        ("set_aidl_version", lambda: helpers.protocol.set_aidl_version(args),
+         ["mount_rootfs"]),
+        ("lxc-start", lambda: helpers.lxc.start(args),
+         ["start network", "umount schedtune", "stop nfcd",
+          "set_permissions", "generate_session_lxc_config",
+          "set_aidl_version"]),
+    ]
+    start = time.monotonic()
+    times = run_steps(steps)
+    for name, (step_start, step_end) in sorted(times.items(),
+                                               key=lambda item: item[1]):
+        logging.debug("Start step {}: {:.1f} ms (at +{:.1f} ms)".format(
+            name, (step_end - step_start) * 1000,
+            (step_start - start) * 1000))
+    path = critical_path(steps, times)
+    logging.debug("Container start took {:.1f} ms, critical path: {}"
+                  " ({:.1f} ms)".format(
+                      (time.monotonic() - start) * 1000, " -> ".join(path),
+                      sum(times[name][1] - times[name][0]
+                          for name in path) * 1000))
 
-    helpers.lxc.start(args)
+    args.session = session
 
+def resume(args, session):
+    """
+    Hand the container kept in standby to a new session.
+
+    :returns: True when it was resumed, False when it needs to be started
+    """
+    standby_session = getattr(args, "standby", None)
+    if standby_session is None:
+        return False
+    if (session["user_id"] != standby_session["user_id"] or
+            session["waydroid_data"] != standby_session["waydroid_data"] or
+            helpers.lxc.status(args) != "FROZEN"):
+        logging.info("Stopping the container kept for another session")
+        stop(args, quit_session=False)
+        return False
+
+    clear_standby(args)
+    start = time.monotonic()
+    try:
+        with helpers.trace.span("resume from standby"):
+            helpers.lxc.generate_session_lxc_config(args, session)
+            helpers.lxc.attach_session_sockets(args, session)
+            helpers.lxc.unfreeze(args)
+    except (OSError, RuntimeError) as e:
+        logging.warning("Failed to resume the container ({}), starting it"
+                        " again".format(e))
+        args.session = standby_session
+        stop(args, quit_session=False)
+        return False
+
+    # Android doesn't unlock the user again, the session has to know
+    session["resumed"] = "true"
     args.session = session
+    logging.info("Resumed the container from standby in {:.1f} ms".format(
+        (time.monotonic() - start) * 1000))
+    return True
+
+def stop_session(args):
+    """
+    The session stopped. With stop_action = standby the container is frozen
+    and kept for the next session of the same user, otherwise it's stopped.
+    """
+    cfg = tools.config.view(args)
+    if cfg["waydroid"]["stop_action"] == "standby" and "session" in args and \
+            helpers.lxc.status(args) == "RUNNING":
+        try:
+            standby(args, cfg)
+            return
+        except (OSError, RuntimeError, ValueError) as e:
+            logging.warning("Failed to keep the container in standby: {}".format(e))
+    stop(args, quit_session=False)
+
+def standby(args, cfg):
+    session = args.session
+    helpers.lxc.freeze(args)
+    while helpers.lxc.status(args) == "RUNNING":
+        pass
+    helpers.lxc.detach_session_sockets(args, session)
+    del args.session
+    args.standby = session
+
+    sources = []
+    timeout = int(cfg["waydroid"]["standby_timeout"] or 0)
+    if timeout > 0:
+        sources.append(GLib.timeout_add_seconds(
+            timeout, end_standby, args, "idle for {} s".format(timeout)))
+    trigger = cfg["waydroid"]["standby_memory_pressure"]
+    if trigger:
+        try:
+            fd = os.open("/proc/pressure/memory",
+                         os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError as e:
+            logging.warning("Can't watch memory pressure: {}".format(e))
+        else:
+            try:
+                os.write(fd, trigger.encode() + b"\0")
+            except OSError as e:
+                os.close(fd)
+                logging.warning("Invalid standby_memory_pressure {}: {}".format(
+                    trigger, e))
+            else:
+                args.standby_psi = fd
+                sources.append(GLib.io_add_watch(
+                    fd, GLib.PRIORITY_DEFAULT, GLib.IO_PRI | GLib.IO_ERR,
+                    lambda *_: end_standby(args, "memory pressure")))
+    args.standby_sources = sources
+    logging.info("Container is in standby")
+
+def end_standby(args, reason):
+    logging.info("Stopping the container in standby: " + reason)
+    stop(args, quit_session=False)
+    return False
+
+def clear_standby(args):
+    """
+    Stop watching the container in standby.
+
+    :returns: the session it was kept for, or None
+    """
+    for source in getattr(args, "standby_sources", []):
+        GLib.source_remove(source)
+    args.standby_sources = []
+    if getattr(args, "standby_psi", None) is not None:
+        os.close(args.standby_psi)
+        args.standby_psi = None
+    session = getattr(args, "standby", None)
+    args.standby = None
+    return session
+
+def boot_completed(args):
+    images = getattr(args, "record_boot_profile", None)
+    if not images:
+        return
+    args.record_boot_profile = None
+    try:
+        helpers.prefetch.record(args, images)
+    except OSError as e:
+        logging.warning("Failed to record the boot profile: {}".format(e))
 
 def stop(args, quit_session=True):
+    standby_session = clear_standby(args)
+    if standby_session is not None:
+        # Its session process is long gone
+        args.session = standby_session
+        quit_session = False
     try:
         status = helpers.lxc.status(args)
+        if status == "FROZEN":
+            helpers.lxc.unfreeze(args)
         if status != "STOPPED":
             helpers.lxc.stop(args)
             while helpers.lxc.status(args) != "STOPPED":
@@ -332,6 +587,10 @@ def freeze(args):
         logging.error("WayDroid container is {}".format(status))
 
 def unfreeze(args):
+    if getattr(args, "standby", None) is not None:
+        # Only a new session thaws the container in standby
+        logging.debug("Not unfreezing the container in standby")
+        return
     status = helpers.lxc.status(args)
     if status == "FROZEN":
         helpers.lxc.unfreeze(args)
@@ -0,0 +1,149 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import os
+import time
+import tools.helpers.drivers
+import tools.helpers.ipc
+import tools.helpers.prefetch
+import tools.helpers.props
+import tools.helpers.trace
+import dbus
+
+def binder_stats(args):
+    try:
+        stats = tools.helpers.ipc.DBusSessionService().GetBinderStats()
+    except dbus.DBusException:
+        logging.error("WayDroid session is stopped")
+        return
+
+    if not stats:
+        print("No binder transactions recorded yet")
+        return
+
+    print("{:<32} {:<20} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}".format(
+        "INTERFACE", "TRANSACTION", "COUNT", "ERRORS",
+        "P50(us)", "P90(us)", "P99(us)", "MAX(us)"))
+    for entry in stats:
+        print("{:<32} {:<20} {:>8} {:>7} {:>9} {:>9} {:>9} {:>9}".format(
+            str(entry["interface"]), str(entry["transaction"]),
+            int(entry["count"]), int(entry["errors"]),
+            int(entry["p50_us"]), int(entry["p90_us"]),
+            int(entry["p99_us"]), int(entry["max_us"])))
+
+def binder(args):
+    logs_dir = tools.helpers.drivers.binderLogsDir()
+    if not os.path.isdir(logs_dir):
+        logging.error("{} not found, binderfs needs to be mounted with"
+                      " stats=global".format(logs_dir))
+        return
+
+    samples = max(2, args.samples)
+    collector = tools.helpers.drivers.BinderStatsCollector(
+        args, args.interval, samples)
+    collector.start()
+    try:
+        time.sleep(args.interval * (samples - 1) + 0.1)
+    except KeyboardInterrupt:
+        pass
+    collector.stop()
+
+    stats = collector.summary()
+    if not stats:
+        print("No binder activity on the waydroid binder nodes")
+        return
+
+    print("{:<16} {:>7} {:<16} {:>10} {:>9} {:>7} {:>9} {:>8} {:>8} {:>7}".format(
+        "CONTEXT", "PID", "COMM", "TXNS", "TXNS/s", "FAILED", "FAILED/s",
+        "BUFFERS", "BUF(KiB)", "ACTIVE"))
+    for entry in stats:
+        print("{:<16} {:>7} {:<16} {:>10} {:>9.1f} {:>7} {:>9.1f} {:>8} {:>8} {:>7}".format(
+            entry["context"], entry["pid"], entry["comm"][:16],
+            entry["transactions"], entry["transactions_per_sec"],
+            entry["failed"], entry["failed_per_sec"], entry["buffers"],
+            entry["buffer_bytes"] // 1024, entry["in_flight"]))
+
+def last_boot(args):
+    path = args.trace or tools.helpers.trace.LAST_BOOT
+    try:
+        events = tools.helpers.trace.load(path)
+    except FileNotFoundError:
+        logging.error("No boot trace found, start a session first")
+        return
+    except ValueError as e:
+        logging.error("Failed to parse {}: {}".format(path, e))
+        return
+
+    if not events:
+        print("The boot trace is empty")
+        return
+
+    begin = events[0]["ts"]
+    end = max(event["ts"] + event["dur"] for event in events)
+    print("Trace: {}".format(os.path.realpath(path)))
+    print("{:>10} {:>10} {:>7}  {}".format("START(ms)", "TIME(ms)", "PID", "PHASE"))
+    # Nest spans that lie within an earlier span of the same process
+    stack = []
+    for event in events:
+        event_end = event["ts"] + event["dur"]
+        while stack and (stack[-1]["pid"] != event["pid"] or
+                         stack[-1]["ts"] + stack[-1]["dur"] < event_end):
+            stack.pop()
+        print("{:>10.1f} {:>10.1f} {:>7}  {}{}".format(
+            (event["ts"] - begin) / 1000, event["dur"] / 1000, event["pid"],
+            "  " * len(stack), event["name"]))
+        stack.append(event)
+    print("Total: {:.1f} ms".format((end - begin) / 1000))
+
+def boot_profile(args):
+    if args.reset:
+        if tools.helpers.prefetch.reset(args):
+            logging.info("Boot profile removed, the next boot records a new one")
+        else:
+            logging.info("There is no boot profile")
+        return
+
+    profile = tools.helpers.prefetch.load(args)
+    if not profile:
+        print("No boot profile recorded yet (enable it with boot_prefetch = True)")
+        return
+
+    print("{:<48} {:>8} {:>10} {:>8}".format("IMAGE", "EXTENTS", "SIZE(MiB)", "CURRENT"))
+    for image, entry in sorted(profile.items()):
+        print("{:<48} {:>8} {:>10.1f} {:>8}".format(
+            image, len(entry["extents"]),
+            sum(extent[1] for extent in entry["extents"]) / (1 << 20),
+            "yes" if tools.helpers.prefetch.is_current(profile, [image]) else "no"))
+
+def props(args):
+    for path in [args.work + "/waydroid_base.prop", args.work + "/waydroid.prop"]:
+        sidecar = tools.helpers.props.load_sidecar(path)
+        print("{}:".format(path))
+        if not sidecar:
+            print("  not generated yet")
+            continue
+
+        if not args.diff:
+            for key, value in sidecar["values"].items():
+                source = sidecar["sources"].get(key)
+                if isinstance(source, list):
+                    source = ",".join(source)
+                print("  {:<44} {:<32} {}".format(key, value, source))
+            continue
+
+        if "previous" not in sidecar:
+            print("  no earlier generation to compare with")
+            continue
+        changes = tools.helpers.props.diff_sidecar(sidecar)
+        if not changes:
+            print("  no changes")
+        for name, old, new, keys in changes:
+            if name is None:
+                print("  other changes:")
+            else:
+                print("  {}: {!r} -> {!r}".format(name, old, new))
+            for key, old_value, new_value in keys:
+                print("    {}: {} -> {}".format(
+                    key, "(unset)" if old_value is None else old_value,
+                    "(unset)" if new_value is None else new_value))
@@ -6,16 +6,7 @@ import logging
 import os
 from tools import helpers
 import tools.config
-
-import sys
-import threading
-import multiprocessing
-import select
-import queue
 import time
-import dbus
-import dbus.service
-from gi.repository import GLib
 
 def is_initialized(args):
     return os.path.isfile(args.config) and os.path.isdir(tools.config.defaults["rootfs"])
@@ -88,6 +79,7 @@ def init(args):
         helpers.lxc.setup_host_perms(args)
         helpers.lxc.set_lxc_config(args)
         helpers.lxc.make_base_props(args)
+        tools.actions.upgrader.record_steps(args)
         if status != "STOPPED":
             logging.info("Starting container")
             try:
@@ -65,6 +65,82 @@ def monitor_mounts():
     finally:
         sock.close()
 
+def parse_notifications(dumpsys_output, packages):
+    """
+    Parse the output of "dumpsys notification --noredact".
+
+    :param packages: only notifications of these packages are returned
+    :returns: dict of message hash -> notification dict
+    """
+    notifications = {}
+    current_msg_hash = None
+    multiline_ticker = None
+    multiline_text = None
+    for line in dumpsys_output.splitlines():
+        # ticker and text may be multi line and there seems no better way
+        # to parse this with the dumpsys format
+        if multiline_ticker:
+            if line.startswith("  "):
+                notifications[current_msg_hash]['ticker'] = multiline_ticker
+                multiline_ticker = None
+            else:
+                multiline_ticker = multiline_ticker + "\n" + line
+                continue
+        elif multiline_text:
+            if line.startswith("  "):
+                notifications[current_msg_hash]['text'] = multiline_text[:-1]
+                multiline_text = None
+            else:
+                multiline_text = multiline_text + "\n" + line
+                continue
+
+        if "NotificationRecord" in line:
+            current_msg_hash = None
+            fields = line.split("|")
+            if len(fields) > 3:
+                package_name = fields[1].strip()
+                res = re.search(r'NotificationRecord\(([^:]+):', line)
+                if package_name in packages and res:
+                    current_msg_hash = res.group(1)
+                    notifications[current_msg_hash] = {
+                        'package_name': package_name,
+                        'msg_id': fields[2],
+                        'ticker': '',
+                        'title': '',
+                        'text': '',
+                        'is_foreground_msg': False,
+                        'is_group_summary': False,
+                        'show_light': False,
+                        'when': 0
+                    }
+        elif current_msg_hash:
+            msg_hash = current_msg_hash
+
+            if "  tickerText=" in line:
+                multiline_ticker = line.replace('tickerText=','').strip()
+            elif "  android.title=" in line:
+                res = re.search(r'android.title=\w+\s*\((.*)\)$', line)
+                if res:
+                    notifications[msg_hash]['title'] = res.group(1).strip()
+            elif "  android.text=" in line:
+                res = re.search(r'android.text=\w+\s*\((.*)$', line)
+                if res:
+                    multiline_text = res.group(1).strip()
+            elif "  flags=" in line:
+                flags = int(line.replace('flags=','').strip(), 0)
+                notifications[msg_hash]['is_foreground_msg'] = \
+                  (flags & 0x00000040) != 0
+                notifications[msg_hash]['is_group_summary'] = \
+                  (flags & 0x00000200) != 0
+            elif "  mLight=" in line:
+                notifications[msg_hash]['show_light'] = \
+                  line.replace('mLight=','').strip() != "null"
+            elif "  when=" in line:
+                notifications[msg_hash]['when'] = \
+                  int(line.replace('when=','').strip(), 0)
+
+    return notifications
+
 def get_notifications(_old_notification):
     notifications = {}
     old_notifications = {}
@@ -113,72 +189,7 @@ def get_notifications(_old_notification):
         applist_stdout = applist_stdout.decode()
         packages = [line.split(':')[1] for line in applist_stdout.splitlines() if ':' in line]
 
-        # parse notifications
-        current_msg_hash = None
-        multiline_ticker = None
-        multiline_text = None
-        for line in notification_stdout.splitlines():
-            # ticker and text may be multi line and there seems no better way
-            # to parse this with the dumpsys format
-            if multiline_ticker:
-                if line.startswith("  "):
-                    notifications[current_msg_hash]['ticker'] = multiline_ticker
-                    multiline_ticker = None
-                else:
-                    multiline_ticker = multiline_ticker + "\n" + line
-                    continue
-            elif multiline_text:
-                if line.startswith("  "):
-                    notifications[current_msg_hash]['text'] = multiline_text[:-1]
-                    multiline_text = None
-                else:
-                    multiline_text = multiline_text + "\n" + line
-                    continue
-
-            if "NotificationRecord" in line:
-                current_msg_hash = None
-                fields = line.split("|")
-                if len(fields) > 3:
-                    package_name = fields[1].strip()
-                    res = re.search(r'NotificationRecord\(([^:]+):', line)
-                    if package_name in packages and res:
-                        current_msg_hash = res.group(1)
-                        notifications[current_msg_hash] = {
-                            'package_name': package_name,
-                            'msg_id': fields[2],
-                            'ticker': '',
-                            'title': '',
-                            'text': '',
-                            'is_foreground_msg': False,
-                            'is_group_summary': False,
-                            'show_light': False,
-                            'when': 0
-                        }
-            elif current_msg_hash:
-                msg_hash = current_msg_hash
-
-                if "  tickerText=" in line:
-                    multiline_ticker = line.replace('tickerText=','').strip()
-                elif "  android.title=" in line:
-                    res = re.search(r'android.title=\w+\s*\((.*)\)$', line)
-                    if res:
-                        notifications[msg_hash]['title'] = res.group(1).strip()
-                elif "  android.text=" in line:
-                    res = re.search(r'android.text=\w+\s*\((.*)$', line)
-                    if res:
-                        multiline_text = res.group(1).strip()
-                elif "  flags=" in line:
-                    flags = int(line.replace('flags=','').strip(), 0)
-                    notifications[msg_hash]['is_foreground_msg'] = \
-                      (flags & 0x00000040) != 0
-                    notifications[msg_hash]['is_group_summary'] = \
-                      (flags & 0x00000200) != 0
-                elif "  mLight=" in line:
-                    notifications[msg_hash]['show_light'] = \
-                      line.replace('mLight=','').strip() != "null"
-                elif "  when=" in line:
-                    notifications[msg_hash]['when'] = \
-                      int(line.replace('when=','').strip(), 0)
+        notifications = parse_notifications(notification_stdout, packages)
 
         # analyse and send notifications
         updated_hashes = set()
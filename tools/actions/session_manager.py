@@ -11,6 +11,8 @@ import sys
 import shutil
 import tools.config
 import tools.helpers.ipc
+import tools.helpers.binder_stats
+import tools.helpers.trace
 from tools import services
 from tools.interfaces import IPlatform
 import dbus
@@ -36,7 +38,7 @@ class DbusSessionManager(dbus.service.Object):
 
     @dbus.service.method("id.waydro.SessionManager", in_signature='', out_signature='s')
     def VendorType(self):
-        cfg = tools.config.load(self.args)
+        cfg = tools.config.view(self.args)
         return cfg["waydroid"]["vendor_type"]
 
     @dbus.service.method("id.waydro.SessionManager", in_signature='', out_signature='s')
@@ -149,6 +151,30 @@ class DbusSessionManager(dbus.service.Object):
             return apps
         return []
 
+    @dbus.service.method("id.waydro.SessionManager", in_signature='', out_signature='aa{sv}')
+    def GetBinderStats(self):
+        stats = []
+        for entry in tools.helpers.binder_stats.snapshot():
+            stats.append(dbus.Dictionary({
+                'interface': dbus.String(entry['interface']),
+                'transaction': dbus.String(entry['transaction']),
+                'code': dbus.Int32(entry['code']),
+                'count': dbus.UInt64(entry['count']),
+                'errors': dbus.UInt64(entry['errors']),
+                'p50_us': dbus.UInt64(entry['p50_us']),
+                'p90_us': dbus.UInt64(entry['p90_us']),
+                'p99_us': dbus.UInt64(entry['p99_us']),
+                'max_us': dbus.UInt64(entry['max_us'])
+            }, signature='sv'))
+        return stats
+
+    @dbus.service.method("id.waydro.SessionManager", in_signature='a(sittta{ut})', out_signature='')
+    def ReportBinderStats(self, entries):
+        tools.helpers.binder_stats.merge(
+            (str(interface), int(code), int(count), int(errors), int(max_us),
+             {int(index): int(hits) for index, hits in buckets.items()})
+            for interface, code, count, errors, max_us, buckets in entries)
+
 def service(args, looper):
     dbus_obj = DbusSessionManager(looper, dbus.SessionBus(), '/SessionManager', args)
     looper.run()
@@ -163,6 +189,7 @@ def start(args, unlocked_cb=None, background=True):
         return
 
     session = copy.copy(tools.config.session_defaults)
+    session["boot_start"] = str(tools.helpers.trace.now_us())
 
     # TODO: also support WAYLAND_SOCKET?
     wayland_display = session["wayland_display"]
@@ -218,7 +245,10 @@ def start(args, unlocked_cb=None, background=True):
     GLib.unix_signal_add(GLib.PRIORITY_HIGH, signal.SIGTERM, sigint_handler, None)
     GLib.unix_signal_add(GLib.PRIORITY_HIGH, signal.SIGUSR1, sigusr_handler, None)
     try:
-        tools.helpers.ipc.DBusContainerService().Start(session)
+        container = tools.helpers.ipc.DBusContainerService()
+        container.Start(session)
+        # Set when the container was resumed from standby instead of booted
+        session["resumed"] = str(container.GetSession().get("resumed", "false"))
     except dbus.DBusException as e:
         logging.debug(e)
         if e.get_dbus_name().startswith("org.freedesktop.DBus.Python"):
@@ -227,16 +257,22 @@ def start(args, unlocked_cb=None, background=True):
             logging.error("WayDroid container is not listening")
         sys.exit(0)
 
-    services.user_manager.start(args, session, unlocked_cb)
-    services.clipboard_manager.start(args)
-    services.gnss_manager.start(args)
-    services.notification_client.start(args)
-    services.screen_manager.start(args)
+    tools.helpers.trace.attach()
+    with tools.helpers.trace.span("session services start"):
+        if not tools.helpers.drivers.should_use_statechange():
+            services.binder_hub.start(args)
+        services.user_manager.start(args, session, unlocked_cb)
+        services.clipboard_manager.start(args)
+        services.gnss_manager.start(args)
+        services.notification_client.start(args)
+        services.screen_manager.start(args)
+    tools.helpers.trace.detach()
     service(args, mainloop)
 
 def do_stop(args, looper):
     services.user_manager.stop(args)
     services.clipboard_manager.stop(args)
+    services.binder_hub.stop(args)
     services.gnss_manager.stop(args)
     services.screen_manager.stop(args)
     looper.quit()
@@ -249,7 +285,13 @@ def stop(args):
 
 def stop_container(quit_session):
     try:
-        tools.helpers.ipc.DBusContainerService().Stop(quit_session)
+        container = tools.helpers.ipc.DBusContainerService()
+        if quit_session:
+            container.Stop(quit_session)
+        else:
+            # The session ends, the container manager decides between
+            # stopping and keeping it in standby (stop_action)
+            container.StopSession()
     except dbus.DBusException:
         pass
 
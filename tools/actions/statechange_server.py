@@ -19,13 +19,15 @@ NETLINK_KOBJECT_UEVENT = 15
 BUFFER_SIZE = 4096
 ROOTFS_PATH = '/var/lib/waydroid/rootfs'
 
+logger = logging.getLogger(__name__)
+
 running = False
 mainloop = None
 state_change = None
 
 def signal_handler(signum, frame):
     global running
-    logging.info(f"Received signal {signum}, shutting down...")
+    logger.info("Received signal %s, shutting down...", signum)
     running = False
     stop()
 
@@ -42,22 +44,23 @@ class StateChangeInterface(dbus.service.Object):
 
     @dbus.service.signal(dbus_interface='id.waydro.StateChange', signature='i')
     def userUnlocked(self, uid):
-        logging.info("Signal: userUnlocked emitted")
+        logger.info("Signal: userUnlocked emitted")
         pass
 
     @dbus.service.signal(dbus_interface='id.waydro.StateChange', signature='isi')
     def packageStateChanged(self, action, name, uid):
-        logging.info(f"Signal: packageStateChanged emitted: action={action}, name={name}, uid={uid}")
+        logger.info("Signal: packageStateChanged emitted: action=%s, name=%s, uid=%s", action, name, uid)
         pass
 
     @dbus.service.signal(dbus_interface='id.waydro.StateChange', signature='s')
     def sendClipboardData(self, content):
-        logging.info(f"Signal: sendClipboardData emitted: content={content}")
+        logger.info("Signal: sendClipboardData emitted: %d characters", len(content))
+        logger.debug("Clipboard content: %s", content)
         pass
 
     @dbus.service.signal(dbus_interface='id.waydro.StateChange', signature='b')
     def gnssStateChanged(self, state):
-        logging.info(f"Signal: gnssStateChanged emitted: state={state}")
+        logger.info("Signal: gnssStateChanged emitted: state=%s", state)
         pass
 
     def propwatch(self, propname):
@@ -68,10 +71,10 @@ class StateChangeInterface(dbus.service.Object):
                 result = self.current_watch_process.stdout.readline().strip()
                 return result
             else:
-                logging.error(f"Failed to watch the prop {propname}: Process or stdout is None")
+                logger.error("Failed to watch the prop %s: Process or stdout is None", propname)
                 return None
         except Exception as e:
-            logging.error(f"Failed to watch the prop {propname}: {e}")
+            logger.error("Failed to watch the prop %s: %s", propname, e)
             return None
         finally:
             if self.current_watch_process:
@@ -90,7 +93,7 @@ class StateChangeInterface(dbus.service.Object):
         while not self.stop_monitoring and running:
             try:
                 if not self.is_rootfs_mounted():
-                    logging.info("Rootfs unmounted in package monitor")
+                    logger.info("Rootfs unmounted in package monitor")
                     break
 
                 new_name = self.propwatch("furios.android.package.name")
@@ -106,7 +109,7 @@ class StateChangeInterface(dbus.service.Object):
             except KeyboardInterrupt:
                 break
             except Exception as e:
-                logging.error(f"Error monitoring package state: {e}")
+                logger.error("Error monitoring package state: %s", e)
                 time.sleep(5)
 
     def monitor_clipboard(self):
@@ -114,7 +117,7 @@ class StateChangeInterface(dbus.service.Object):
         while not self.stop_monitoring and running:
             try:
                 if not self.is_rootfs_mounted():
-                    logging.info("Rootfs unmounted in clipboard monitor")
+                    logger.info("Rootfs unmounted in clipboard monitor")
                     break
 
                 new_count = self.propwatch("furios.android.clipboard.count")
@@ -132,12 +135,12 @@ class StateChangeInterface(dbus.service.Object):
                                 content = f.read()
                             self.sendClipboardData(content)
                         except Exception as e:
-                            logging.error(f"Error reading clipboard file: {e}")
+                            logger.error("Error reading clipboard file: %s", e)
                     initial_count = new_count
             except KeyboardInterrupt:
                 break
             except Exception as e:
-                logging.error(f"Error monitoring clipboard: {e}")
+                logger.error("Error monitoring clipboard: %s", e)
                 time.sleep(5)
 
     def monitor_gnss_state(self):
@@ -147,16 +150,16 @@ class StateChangeInterface(dbus.service.Object):
             if initial_state:
                 initial_state = bool(int(initial_state))
             else:
-                logging.error("initial GNSS state is an empty string, defaulting to false")
+                logger.error("initial GNSS state is an empty string, defaulting to false")
                 initial_state = False
         except Exception as e:
-            logging.error(f"Failed to convert initial state to boolean: {e}")
+            logger.error("Failed to convert initial state to boolean: %s", e)
             initial_state = False
 
         while not self.stop_monitoring and running:
             try:
                 if not self.is_rootfs_mounted():
-                    logging.info("Rootfs unmounted in GNSS monitor")
+                    logger.info("Rootfs unmounted in GNSS monitor")
                     break
 
                 new_state = self.propwatch("furios.gnss.active")
@@ -173,11 +176,11 @@ class StateChangeInterface(dbus.service.Object):
                         if state:
                             new_state = bool(int(state))
                         else:
-                            logging.error("new GNSS state is an empty string, defaulting to false")
+                            logger.error("new GNSS state is an empty string, defaulting to false")
                             new_state = False
                             time.sleep(2)
                 except Exception as e:
-                    logging.error(f"Failed to convert new state to boolean: {e}")
+                    logger.error("Failed to convert new state to boolean: %s", e)
                     new_state = False
 
                 if new_state != initial_state:
@@ -186,7 +189,7 @@ class StateChangeInterface(dbus.service.Object):
             except KeyboardInterrupt:
                 break
             except Exception as e:
-                logging.error(f"Error monitoring gnss state: {e}")
+                logger.error("Error monitoring gnss state: %s", e)
                 time.sleep(5)
 
     def monitor_composer(self):
@@ -194,7 +197,7 @@ class StateChangeInterface(dbus.service.Object):
         while not self.stop_monitoring and running:
             try:
                 if not self.is_rootfs_mounted():
-                    logging.info("Rootfs unmounted in composer monitor")
+                    logger.info("Rootfs unmounted in composer monitor")
                     break
 
                 new_state = self.propwatch("init.svc.vendor.hwcomposer-2-1")
@@ -211,22 +214,22 @@ class StateChangeInterface(dbus.service.Object):
                     if current_process and current_process.stdout:
                         result = current_process.stdout.readline().strip()
                     else:
-                        logging.error(f"Failed to get waydroid display: Process or stdout is None")
+                        logger.error("Failed to get waydroid display: Process or stdout is None")
 
                     if result and result == 'vendor.waydroid.display@1.0::IWaydroidDisplay/default':
-                        logging.info("vendor.hwcomposer-2-1 is up with all interfaces")
+                        logger.info("vendor.hwcomposer-2-1 is up with all interfaces")
                         break
                     else:
                         pid = helpers.lxc.getprop("init.svc_debug_pid.vendor.hwcomposer-2-1")
                         if pid:
-                            logging.info(f"vendor.hwcomposer-2-1 is stuck. killing pid {pid}")
+                            logger.info("vendor.hwcomposer-2-1 is stuck. killing pid %s", pid)
                             command = ["lxc-attach", "-P", tools.config.defaults["lxc"], "-n", "waydroid", "--clear-env", "--", "kill", "-9", f"{pid}"]
                             subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
                         break
             except KeyboardInterrupt:
                 break
             except Exception as e:
-                logging.error(f"Error monitoring composer state: {e}")
+                logger.error("Error monitoring composer state: %s", e)
                 time.sleep(5)
 
     def start_watchers(self):
@@ -280,19 +283,25 @@ class StateChangeInterface(dbus.service.Object):
     def monitor_main(self):
         while running:
             if self.is_rootfs_mounted():
-                logging.info("Rootfs is mounted")
+                logger.info("Rootfs is mounted")
+                helpers.trace.attach()
                 if helpers.lxc.getprop("furios.android.userunlocked") == "true":
-                    logging.info("User is already unlocked")
+                    logger.info("User is already unlocked")
+                    helpers.trace.detach()
                     self.userUnlocked(0)
                     self.start_watchers()
                 else:
                     self.composer_monitor_thread = threading.Thread(target=self.monitor_composer)
                     self.composer_monitor_thread.start()
-                    logging.info("Waiting for user unlock")
+                    logger.info("Waiting for user unlock")
+                    wait_start = helpers.trace.now_us()
                     while running and self.is_rootfs_mounted():
                         result = self.propwatch("furios.android.userunlocked")
                         if result == "true":
-                            logging.info("User unlocked")
+                            logger.info("User unlocked")
+                            helpers.trace.add_event("user unlock wait", wait_start,
+                                                    helpers.trace.now_us())
+                            helpers.trace.detach()
                             self.userUnlocked(0)
 
                             if self.composer_monitor_thread and self.composer_monitor_thread.is_alive():
@@ -307,10 +316,10 @@ class StateChangeInterface(dbus.service.Object):
                         if not self.is_rootfs_mounted():
                             break
 
-                logging.info("Rootfs unmounted, stopping watchers")
+                logger.info("Rootfs unmounted, stopping watchers")
                 self.stop_watchers()
             else:
-                logging.info("Waiting for rootfs to be mounted")
+                logger.info("Waiting for rootfs to be mounted")
                 while running and not self.is_rootfs_mounted():
                     if self.wait_for_netlink_event():
                         if self.is_rootfs_mounted():
@@ -349,7 +358,7 @@ def stop(_args=None):
         return
 
     running = False
-    logging.info("Stopping service...")
+    logger.info("Stopping service...")
 
     if state_change:
         state_change.stop_monitoring = True
@@ -360,5 +369,5 @@ def stop(_args=None):
     if mainloop:
         mainloop.quit()
 
-    logging.info("Service stopped")
+    logger.info("Service stopped")
     sys.exit(0)
@@ -4,15 +4,21 @@
 
 import os
 import tools.config
+import tools.helpers.gpu
 import tools.helpers.ipc
 import tools.helpers.net
 import dbus
 
 def print_status(args):
-    cfg = tools.config.load(args)
+    cfg = tools.config.view(args)
+    def print_gpu():
+        gpu = tools.helpers.gpu.selectGpu(args)
+        print("GPU:\t\t" + (tools.helpers.gpu.describeGpu(gpu) if gpu else "NONE"))
+
     def print_stopped():
         print("Session:\tSTOPPED")
         print("Vendor type:\t" + cfg["waydroid"]["vendor_type"])
+        print_gpu()
 
     try:
         session = tools.helpers.ipc.DBusContainerService().GetSession()
@@ -20,6 +26,7 @@ def print_status(args):
             print("Session:\tRUNNING")
             print("Container:\t" + session["state"])
             print("Vendor type:\t" + cfg["waydroid"]["vendor_type"])
+            print_gpu()
             print("IP address:\t" + (tools.helpers.net.get_device_ip_address() or "UNKNOWN"))
             print("Session user:\t{}({})".format(session["user_name"], session["user_id"]))
             print("Wayland display:\t" + session["wayland_display"])
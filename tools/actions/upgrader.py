@@ -2,6 +2,8 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+import json
 import logging
 import os
 from tools import helpers
@@ -9,15 +11,102 @@ from tools.helpers.version import versiontuple
 import tools.config
 import dbus
 
+# Steps of an upgrade, in the order they run
+STEPS = ["host_perms", "lxc_config", "base_props"]
+
 def get_config(args):
-    cfg = tools.config.load(args)
+    cfg = tools.config.view(args)
     args.arch = cfg["waydroid"]["arch"]
     args.images_path = cfg["waydroid"]["images_path"]
     args.vendor_type = cfg["waydroid"]["vendor_type"]
     args.session = None
 
+def state_path(args):
+    return args.work + "/upgrade.json"
+
+def load_state(args):
+    try:
+        with open(state_path(args)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(args, fingerprints):
+    helpers.fileops.atomic_write(state_path(args),
+                                 json.dumps(fingerprints, indent=1) + "\n")
+
+def fingerprint(inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+def code_fingerprint(args):
+    """
+    :returns: hash of waydroid's own python sources, so an update that
+              changes how a step generates its output redoes the step, even
+              when tools.config.version stays the same
+    """
+    if "code_fingerprint" not in args.cache:
+        digest = hashlib.sha256()
+        tools_dir = os.path.join(tools.config.tools_src, "tools")
+        for root, dirs, files in os.walk(tools_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    path = os.path.join(root, name)
+                    digest.update(os.path.relpath(path, tools_dir).encode())
+                    with open(path, "rb") as handle:
+                        digest.update(handle.read())
+        args.cache["code_fingerprint"] = digest.hexdigest()
+    return args.cache["code_fingerprint"]
+
+def step_fingerprints(args, props):
+    """
+    :param props: PropertyMap of waydroid_base.prop
+    :returns: dict of step name to the fingerprint of its inputs
+    """
+    code = code_fingerprint(args)
+    return {
+        "host_perms": fingerprint([code, helpers.lxc.host_perms_inputs(args)]),
+        "lxc_config": fingerprint([code, helpers.lxc.lxc_config_inputs(args)]),
+        "base_props": fingerprint([code, props.fingerprint()]),
+    }
+
+def changed_steps(args, fingerprints, props):
+    """ :returns: the steps whose inputs or outputs changed """
+    state = load_state(args)
+    lxc_path = tools.config.defaults["lxc"] + "/waydroid"
+    ret = []
+    for step in STEPS:
+        if args.force or state.get(step) != fingerprints[step]:
+            ret.append(step)
+        elif step == "host_perms" and \
+                not os.path.isdir(tools.config.defaults["host_perms"]):
+            ret.append(step)
+        elif step == "lxc_config" and not all(
+                os.path.exists(lxc_path + "/" + name)
+                for name in ["config", "config_nodes", "waydroid.seccomp"]):
+            ret.append(step)
+        elif step == "base_props" and \
+                not props.is_written(args.work + "/waydroid_base.prop"):
+            ret.append(step)
+    return ret
+
+def record_steps(args):
+    """ Remember the inputs of all steps after they ran, e.g. in init """
+    save_state(args, step_fingerprints(args, helpers.lxc.base_props(args)))
+
 def upgrade(args):
     get_config(args)
+    helpers.drivers.loadBinderNodes(args)
+    helpers.drivers.probeAshmemDriver(args)
+
+    props = helpers.lxc.base_props(args)
+    fingerprints = step_fingerprints(args, props)
+    steps = changed_steps(args, fingerprints, props)
+    if not steps:
+        logging.info("Nothing changed, not touching the container")
+        return
+    logging.info("Updating: " + ", ".join(steps))
+
     status = "STOPPED"
     if os.path.exists(tools.config.defaults["lxc"] + "/waydroid"):
         status = helpers.lxc.status(args)
@@ -30,11 +119,13 @@ def upgrade(args):
         except Exception as e:
             logging.debug(e)
             tools.actions.container_manager.stop(args)
-    helpers.drivers.loadBinderNodes(args)
-    helpers.drivers.probeAshmemDriver(args)
-    helpers.lxc.setup_host_perms(args)
-    helpers.lxc.set_lxc_config(args)
-    helpers.lxc.make_base_props(args)
+    if "host_perms" in steps:
+        helpers.lxc.setup_host_perms(args)
+    if "lxc_config" in steps:
+        helpers.lxc.set_lxc_config(args)
+    if "base_props" in steps:
+        props.write(args.work + "/waydroid_base.prop")
+    save_state(args, fingerprints)
     if status != "STOPPED":
         logging.info("Starting container")
         try:
@@ -8,7 +8,7 @@ import pwd
 #
 # Exported functions
 #
-from tools.config.load import load
+from tools.config.load import load, view
 from tools.config.save import save
 
 #
@@ -23,7 +23,17 @@ config_keys = ["arch",
                "vendor_type",
                "suspend_action",
                "mount_overlays",
-               "auto_adb"]
+               "auto_adb",
+               "log_max_size",
+               "log_backups",
+               "loop_direct_io",
+               "loop_read_ahead_kb",
+               "boot_prefetch",
+               "boot_prefetch_budget_mb",
+               "gpu_policy",
+               "stop_action",
+               "standby_timeout",
+               "standby_memory_pressure"]
 
 # Config file/commandline default values
 # $WORK gets replaced with the actual value for args.work (which may be
@@ -39,6 +49,19 @@ defaults = {
     "suspend_action": "freeze",
     "mount_overlays": "True",
     "auto_adb": "True",
+    "log_max_size": str(4 * 1024 * 1024),
+    "log_backups": "1",
+    "loop_direct_io": "False",
+    "loop_read_ahead_kb": "",
+    "boot_prefetch": "False",
+    "boot_prefetch_budget_mb": "256",
+    "gpu_policy": "auto",
+    # "standby" keeps the container frozen after the session stopped, until
+    # the next session, standby_timeout seconds (0: no limit) or the PSI
+    # trigger standby_memory_pressure fires
+    "stop_action": "stop",
+    "standby_timeout": "600",
+    "standby_memory_pressure": "some 150000 1000000",
     "container_xdg_runtime_dir": "/run/xdg",
     "container_wayland_display": "wayland-0",
 }
@@ -4,14 +4,24 @@
 
 import logging
 import configparser
+import io
 import os
+import types
 import tools.config
 
-def load(args):
-    cfg = configparser.ConfigParser()
-    if os.path.isfile(args.config):
-        cfg.read(args.config)
+# Parsed config files by path, together with the stat_key() of the file
+# they were parsed from. Long running services call load() and view() a
+# lot, this way they only parse the file again after it changed.
+cache = {}
+
+def stat_key(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
 
+def normalize(cfg):
     if "waydroid" not in cfg:
         cfg["waydroid"] = {}
 
@@ -31,4 +41,53 @@ def load(args):
         cfg["properties"] = {}
     # no default values for property override
 
+    if "logging" not in cfg:
+        cfg["logging"] = {}
+    # per component log levels, see tools.helpers.logging
+
+    return types.MappingProxyType(dict(
+        (name, types.MappingProxyType(dict(cfg.items(name, raw=True))))
+        for name in cfg.sections()))
+
+def raw_copy(sections):
+    """
+    :param sections: mapping of sections to mappings of keys to raw values
+    :returns: ConfigParser holding the values the way read() stores them.
+              read_dict() would check them for interpolation syntax and
+              refuse e.g. "50%", so this goes through the file format.
+    """
+    raw = configparser.RawConfigParser(interpolation=None)
+    raw.read_dict(sections)
+    handle = io.StringIO()
+    raw.write(handle)
+    cfg = configparser.ConfigParser()
+    cfg.read_string(handle.getvalue())
     return cfg
+
+def store(args, cfg, key):
+    """ Cache cfg as the contents of args.config with the given stat_key() """
+    copy = raw_copy(dict((name, dict(cfg.items(name, raw=True)))
+                         for name in cfg.sections()))
+    cache[args.config] = (key, normalize(copy))
+
+def view(args):
+    """
+    :returns: read-only mapping of sections to read-only mappings of keys to
+              values, with the defaults filled in. Cheap as long as the
+              config file doesn't change, use load() to get a copy that can
+              be modified and saved.
+    """
+    key = stat_key(args.config)
+    cached = cache.get(args.config)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    cfg = configparser.ConfigParser()
+    if key is not None:
+        cfg.read(args.config)
+    data = normalize(cfg)
+    cache[args.config] = (key, data)
+    return data
+
+def load(args):
+    return raw_copy(view(args))
@@ -2,12 +2,17 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import io
 import os
 import logging
 import tools.config
+import tools.helpers.fileops
+from tools.config.load import stat_key, store
 
 def save(args, cfg):
     logging.debug("Save config: " + args.config)
     os.makedirs(os.path.dirname(args.config), 0o700, True)
-    with open(args.config, "w") as handle:
-        cfg.write(handle)
+    handle = io.StringIO()
+    cfg.write(handle)
+    tools.helpers.fileops.atomic_write(args.config, handle.getvalue())
+    store(args, cfg, stat_key(args.config))
@@ -2,15 +2,27 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import importlib
 from tools.helpers.arguments import arguments
-from tools.helpers.wayland_clipboard import WaylandClipboardHandler
-import tools.helpers.arch
-import tools.helpers.props
-import tools.helpers.lxc
-import tools.helpers.images
-import tools.helpers.drivers
-import tools.helpers.mount
-import tools.helpers.ipc
-import tools.helpers.gpu
-import tools.helpers.protocol
-import tools.helpers.version
+
+""" Helper modules are imported on first use, see tools/actions/__init__.py.
+    Most of them are cheap, but lxc, ipc and the binder interfaces drag in
+    gbinder, dbus and gi.repository. """
+
+_exports = {
+    "WaylandClipboardHandler": "wayland_clipboard",
+}
+
+def __getattr__(name):
+    if name in _exports:
+        module = importlib.import_module("tools.helpers." + _exports[name])
+        value = getattr(module, name)
+    else:
+        try:
+            value = importlib.import_module("tools.helpers." + name)
+        except ModuleNotFoundError as e:
+            if e.name != "tools.helpers." + name:
+                raise
+            raise AttributeError("module 'tools.helpers' has no attribute '{}'".format(name))
+    globals()[name] = value
+    return value
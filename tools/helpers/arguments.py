@@ -38,6 +38,8 @@ def arguments_upgrade(subparser):
     ret = subparser.add_parser("upgrade", help="upgrade images")
     ret.add_argument("-o", "--offline", action="store_true",
                      help="just for updating configs")
+    ret.add_argument("-f", "--force", action="store_true",
+                     help="redo all steps, even if their inputs didn't change")
     return ret
 
 def arguments_log(subparser):
@@ -128,6 +130,31 @@ def arguments_logcat(subparser):
     ret = subparser.add_parser("logcat", help="show android logcat")
     return ret
 
+def arguments_debug(subparser):
+    ret = subparser.add_parser("debug", help="inspect waydroid internals")
+    sub = ret.add_subparsers(title="subaction", dest="subaction")
+    sub.add_parser("binder-stats",
+                   help="show binder transaction counts and latencies of the session")
+    binder = sub.add_parser("binder",
+                            help="sample host binderfs statistics of the waydroid binder nodes")
+    binder.add_argument("-i", "--interval", type=float, default=1.0,
+                        help="seconds between samples (default: 1)")
+    binder.add_argument("-n", "--samples", type=int, default=5,
+                        help="number of samples to take (default: 5)")
+    last_boot = sub.add_parser("last-boot",
+                               help="show where the time went during the last container start")
+    last_boot.add_argument("trace", nargs="?",
+                           help="trace file to show instead of the last boot's")
+    props = sub.add_parser("props",
+                           help="show the generated properties and where they come from")
+    props.add_argument("--diff", action="store_true",
+                       help="show which inputs changed which properties in the last generation")
+    boot_profile = sub.add_parser("boot-profile",
+                                  help="show the image prefetch profile recorded during boot")
+    boot_profile.add_argument("--reset", action="store_true",
+                              help="record a new profile on the next boot")
+    return ret
+
 def arguments():
     parser = argparse.ArgumentParser(prog="waydroid")
 
@@ -166,6 +193,7 @@ def arguments():
 #    arguments_fullUI(sub)
     arguments_shell(sub)
     arguments_logcat(sub)
+    arguments_debug(sub)
 
     if argcomplete:
         argcomplete.autocomplete(parser, always_complete_options="long")
@@ -0,0 +1,176 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import threading
+import time
+
+"""
+Per-transaction binder telemetry. Every transaction that goes through
+transact() or an instrument_handler() wrapped local object is counted, and
+its latency is recorded in a log-linear (HDR-style) histogram, so it's
+cheap to record and percentiles stay within ~6% of the real value.
+"""
+
+# 2^SUB_BUCKET_BITS linear buckets per power of two
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    exponent = value.bit_length() - SUB_BUCKET_BITS - 1
+    return ((exponent + 1) << SUB_BUCKET_BITS) + (value >> exponent) - SUB_BUCKETS
+
+def bucket_upper(index):
+    if index < SUB_BUCKETS:
+        return index
+    exponent = (index >> SUB_BUCKET_BITS) - 1
+    low = ((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS) << exponent
+    return low + (1 << exponent) - 1
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = {}
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        index = bucket_index(value)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.total += 1
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if not self.total:
+            return 0
+        wanted = max(1, int(self.total * percent / 100.0 + 0.5))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= wanted:
+                return min(bucket_upper(index), self.max)
+        return self.max
+
+class TransactionStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+_lock = threading.Lock()
+_stats = {}
+_names = {}
+
+def register_interface(interface, module_globals):
+    """
+    Remember readable names for the TRANSACTION_* constants of an interface
+    module, e.g. register_interface(INTERFACE, globals()).
+    """
+    prefix = "TRANSACTION_"
+    _names[interface] = {v: k[len(prefix):] for k, v in module_globals.items()
+                         if k.startswith(prefix)}
+
+def record(interface, code, elapsed_us, error):
+    with _lock:
+        stats = _stats.get((interface, code))
+        if stats is None:
+            stats = _stats[(interface, code)] = TransactionStats()
+        stats.count += 1
+        if error:
+            stats.errors += 1
+        stats.latency.record(elapsed_us)
+
+def transact(client, interface, code, request):
+    """
+    Drop-in replacement for client.transact_sync_reply() that records the
+    transaction. A non-zero status ("Sending reply failed") counts as error.
+    """
+    start = time.perf_counter_ns()
+    reply, status = client.transact_sync_reply(code, request)
+    record(interface, code, (time.perf_counter_ns() - start) // 1000,
+           status != 0)
+    return reply, status
+
+def instrument_handler(interface, handler):
+    """
+    Wrap a local object response handler, so incoming transactions are
+    recorded the same way as outgoing ones.
+    """
+    def wrapper(req, code, flags):
+        start = time.perf_counter_ns()
+        error = True
+        try:
+            reply, status = handler(req, code, flags)
+            error = status != 0
+            return reply, status
+        finally:
+            record(interface, code, (time.perf_counter_ns() - start) // 1000,
+                   error)
+    return wrapper
+
+def snapshot():
+    """
+    :returns: list of dicts, one per (interface, transaction code), with the
+              count, error count and latency percentiles in microseconds
+    """
+    ret = []
+    with _lock:
+        for (interface, code), stats in sorted(_stats.items()):
+            ret.append({
+                "interface": interface,
+                "transaction": _names.get(interface, {}).get(code, str(code)),
+                "code": code,
+                "count": stats.count,
+                "errors": stats.errors,
+                "p50_us": stats.latency.percentile(50),
+                "p90_us": stats.latency.percentile(90),
+                "p99_us": stats.latency.percentile(99),
+                "max_us": stats.latency.max,
+            })
+    return ret
+
+def export():
+    """
+    :returns: the raw counters as list of (interface, code, count, errors,
+              max_us, buckets), for merge() in another process
+    """
+    with _lock:
+        return [(interface, code, stats.count, stats.errors,
+                 stats.latency.max, dict(stats.latency.buckets))
+                for (interface, code), stats in sorted(_stats.items())]
+
+def merge(entries):
+    """ Add counters from export() of another process to this one's """
+    with _lock:
+        for interface, code, count, errors, max_us, buckets in entries:
+            stats = _stats.get((interface, code))
+            if stats is None:
+                stats = _stats[(interface, code)] = TransactionStats()
+            stats.count += count
+            stats.errors += errors
+            latency = stats.latency
+            for index, hits in buckets.items():
+                latency.buckets[index] = latency.buckets.get(index, 0) + hits
+            latency.total += sum(buckets.values())
+            latency.max = max(latency.max, max_us)
+
+def report_to_session():
+    """
+    Hand the transactions of a short lived process (e.g. waydroid app launch)
+    to the session, so they show up in waydroid debug binder-stats.
+    """
+    entries = export()
+    if not entries:
+        return
+    try:
+        import tools.helpers.ipc
+        tools.helpers.ipc.DBusSessionService().ReportBinderStats(entries)
+    except Exception as e:
+        logging.debug("Failed to report binder statistics: {}".format(e))
+
+def reset():
+    with _lock:
+        _stats.clear()
+    logging.debug("Binder transaction statistics reset")
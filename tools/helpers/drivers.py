@@ -4,10 +4,14 @@
 
 import logging
 import os
-import glob
 import fcntl
 import struct
+import threading
+import time
+import collections
 import tools.config
+import tools.helpers.fileops
+import tools.helpers.mount
 import tools.helpers.run
 
 BINDER_DRIVERS = [
@@ -38,7 +42,19 @@ def isBinderfsLoaded(args):
 
     return False
 
-def allocBinderNodes(args, binder_dev_nodes):
+def binderfsMountpoint():
+    """ :returns: where binderfs is mounted (/dev/binderfs), or None """
+    ret = None
+    with open("/proc/mounts", "r") as handle:
+        for line in handle:
+            words = line.split()
+            if len(words) >= 3 and words[2] == "binder":
+                if words[1] == "/dev/binderfs":
+                    return words[1]
+                ret = ret or words[1]
+    return ret
+
+def allocBinderNodes(args, binder_dev_nodes, binderfs="/dev/binderfs"):
     NRBITS = 8
     TYPEBITS = 8
     SIZEBITS = 14
@@ -56,17 +72,152 @@ def allocBinderNodes(args, binder_dev_nodes):
         return IOC(READ|WRITE, _type, nr, size)
 
     BINDER_CTL_ADD = IOWR(98, 1, 264)
-    binderctrlfd = open('/dev/binderfs/binder-control','rb')
 
-    for node in binder_dev_nodes:
-        node_struct = struct.pack(
-            '256sII', bytes(node, 'utf-8'), 0, 0)
-        try:
-            fcntl.ioctl(binderctrlfd.fileno(), BINDER_CTL_ADD, node_struct)
-        except FileExistsError:
-            pass
+    with open(binderfs + "/binder-control", "rb") as binderctrlfd:
+        for node in binder_dev_nodes:
+            node_struct = struct.pack(
+                '256sII', bytes(node, 'utf-8'), 0, 0)
+            try:
+                logging.debug("Allocating binder node " + node)
+                fcntl.ioctl(binderctrlfd.fileno(), BINDER_CTL_ADD, node_struct)
+            except FileExistsError:
+                pass
+
+BINDER_FAILED_REPLIES = ["BR_FAILED_REPLY", "BR_DEAD_REPLY", "BR_FROZEN_REPLY"]
+
+def binderLogsDir():
+    """ binder_logs only exists when binderfs is mounted with stats=global """
+    return (binderfsMountpoint() or "/dev/binderfs") + "/binder_logs"
+
+def parseBinderLogs(contexts, logs_dir=None):
+    """
+    Parse the binderfs "stats", "state" and "transactions" logs.
+
+    :param contexts: binder device names to keep, e.g. ["anbox-binder"]
+    :param logs_dir: defaults to binderLogsDir(), can be changed for
+                     testcases
+    :returns: dict of (context, pid) -> (transactions, failed, buffers,
+              buffer_bytes, in_flight), all counters since process start
+    """
+    procs = {}
+    if logs_dir is None:
+        logs_dir = binderLogsDir()
+
+    def parse(name, line_cb):
+        pid = None
+        context = None
+        with open(os.path.join(logs_dir, name)) as handle:
+            for line in handle:
+                if line.startswith("proc "):
+                    pid = int(line.split()[1])
+                    context = None
+                elif line.startswith("context "):
+                    context = line.split()[1]
+                elif pid is not None and context in contexts:
+                    entry = procs.setdefault((context, pid), [0, 0, 0, 0, 0])
+                    line_cb(entry, line.strip())
+
+    def stats_line(entry, line):
+        key, _, value = line.partition(":")
+        if key in ["BC_TRANSACTION", "BC_REPLY"]:
+            entry[0] += int(value)
+        elif key in BINDER_FAILED_REPLIES:
+            entry[1] += int(value)
+        elif key == "buffers":
+            entry[2] = int(value)
+
+    def state_line(entry, line):
+        # buffer 1234: 0 size 100:8:0 delivered
+        words = line.split()
+        if len(words) >= 5 and words[0] == "buffer" and words[3] == "size":
+            entry[3] += sum(int(x) for x in words[4].split(":"))
+
+    def transactions_line(entry, line):
+        if line.split(" ")[0] in ["outgoing", "incoming", "pending"]:
+            entry[4] += 1
+
+    parse("stats", stats_line)
+    parse("state", state_line)
+    parse("transactions", transactions_line)
+    return {key: tuple(value) for key, value in procs.items()}
+
+class BinderStatsCollector:
+    """
+    Sample the binderfs logs of the waydroid binder, vndbinder and hwbinder
+    nodes periodically into a fixed size ring buffer.
+    """
+    def __init__(self, args, interval=1.0, samples=60):
+        loadBinderNodes(args)
+        self.contexts = [args.BINDER_DRIVER, args.VNDBINDER_DRIVER,
+                         args.HWBINDER_DRIVER]
+        self.logs_dir = binderLogsDir()
+        self.interval = interval
+        self.samples = collections.deque(maxlen=samples)
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        self.samples.append((time.monotonic(), parseBinderLogs(self.contexts,
+                                                             self.logs_dir)))
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.sample()
+            except OSError as e:
+                logging.error("Failed to sample binder logs: {}".format(e))
+                return
+            self.stopping.wait(self.interval)
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def summary(self):
+        """
+        :returns: list of dicts, one per process, with the transaction and
+                  failed transaction rates over the sampled window and the
+                  current buffer usage, busiest process first
+        """
+        if not self.samples:
+            return []
+        first_time, first = self.samples[0]
+        last_time, last = self.samples[-1]
+        elapsed = last_time - first_time
+        ret = []
+        for (context, pid), (txns, failed, buffers, buffer_bytes, in_flight) in last.items():
+            old_txns, old_failed = first.get((context, pid), (0, 0))[:2]
+            try:
+                with open("/proc/{}/comm".format(pid)) as handle:
+                    comm = handle.read().strip()
+            except OSError:
+                comm = "?"
+            ret.append({
+                "context": context,
+                "pid": pid,
+                "comm": comm,
+                "transactions": txns,
+                "transactions_per_sec": (txns - old_txns) / elapsed if elapsed else 0.0,
+                "failed": failed,
+                "failed_per_sec": (failed - old_failed) / elapsed if elapsed else 0.0,
+                "buffers": buffers,
+                "buffer_bytes": buffer_bytes,
+                "in_flight": in_flight,
+            })
+        ret.sort(key=lambda x: (x["transactions_per_sec"], x["transactions"]),
+                 reverse=True)
+        return ret
 
 def probeBinderDriver(args):
+    start = time.monotonic()
     binder_dev_nodes = []
     has_binder = False
     has_vndbinder = False
@@ -98,15 +249,29 @@ def probeBinderDriver(args):
                 logging.error(output.strip())
 
         if isBinderfsLoaded(args):
-            command = ["mkdir", "-p", "/dev/binderfs"]
-            tools.helpers.run.user(args, command, check=False)
-            command = ["mount", "-t", "binder", "binder", "/dev/binderfs"]
-            tools.helpers.run.user(args, command, check=False)
-            allocBinderNodes(args, binder_dev_nodes)
-            command = ["ln", "-s"]
-            command.extend(glob.glob("/dev/binderfs/*"))
-            command.append("/dev/")
-            tools.helpers.run.user(args, command, check=False)
+            binderfs = binderfsMountpoint()
+            if binderfs is None:
+                binderfs = "/dev/binderfs"
+                # stats=global adds binder_logs (waydroid debug binder)
+                try:
+                    tools.helpers.mount.mount(args, "binder", binderfs,
+                                              readonly=False,
+                                              mount_type="binder",
+                                              options=["stats=global"])
+                except RuntimeError:
+                    logging.debug("Mounting binderfs with stats=global failed")
+                    tools.helpers.mount.mount(args, "binder", binderfs,
+                                              readonly=False,
+                                              mount_type="binder")
+            existing = os.listdir(binderfs)
+            allocBinderNodes(args, [node for node in binder_dev_nodes
+                                    if node not in existing], binderfs)
+            for node in os.listdir(binderfs):
+                if not os.path.lexists("/dev/" + node):
+                    tools.helpers.fileops.symlink(binderfs + "/" + node,
+                                                  "/dev/" + node)
+            logging.debug("Binder setup took {:.1f} ms".format(
+                (time.monotonic() - start) * 1000))
 
     return 0
 
@@ -168,7 +333,7 @@ def setupBinderNodes(args):
             raise OSError('Binder node "hwbinder" for waydroid not found')
 
 def loadBinderNodes(args):
-    cfg = tools.config.load(args)
+    cfg = tools.config.view(args)
     args.BINDER_DRIVER = cfg["waydroid"]["binder"]
     args.VNDBINDER_DRIVER = cfg["waydroid"]["vndbinder"]
     args.HWBINDER_DRIVER = cfg["waydroid"]["hwbinder"]
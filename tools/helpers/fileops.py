@@ -0,0 +1,152 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import logging
+import os
+import shutil
+import stat
+import tempfile
+
+""" In-process replacements for the coreutils commands waydroid used to run
+    through tools.helpers.run (mkdir -p, touch, mv, cp, sed -i, ln -s). Every
+    function logs the equivalent command, so "waydroid log" reads the same
+    as before. """
+
+def makedirs(path, mode=0o777):
+    """ mkdir -p """
+    if os.path.isdir(path):
+        return
+    logging.debug("% mkdir -p " + path)
+    os.makedirs(path, mode, exist_ok=True)
+
+def touch(path):
+    """ touch, without updating the timestamps of an existing file """
+    logging.debug("% touch " + path)
+    with open(path, "a"):
+        pass
+
+def atomic_write(path, data, mode=None):
+    """
+    Write a file by writing a temporary file in the same directory and
+    renaming it over path, so readers never see a partially written file.
+
+    :param data: str or bytes
+    :param mode: permissions of the new file, default is to keep the ones of
+                 the file that gets replaced (or 0o644)
+    """
+    directory = os.path.dirname(path) or "."
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o644
+
+    fd, tmp = tempfile.mkstemp(dir=directory,
+                               prefix="." + os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as handle:
+            handle.write(data)
+        os.chmod(tmp, mode)
+        logging.debug("% mv {} {}".format(tmp, path))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+def move(source, destination):
+    """ mv, destination may be a directory """
+    logging.debug("% mv {} {}".format(source, destination))
+    if os.path.isdir(destination):
+        destination = os.path.join(destination, os.path.basename(source))
+    try:
+        os.replace(source, destination)
+    except OSError:
+        # Different filesystems
+        shutil.move(source, destination)
+
+def copy(source, destination):
+    """ cp -fpr """
+    logging.debug("% cp -fpr {} {}".format(source, destination))
+    if os.path.isdir(source):
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, os.path.basename(source))
+        shutil.copytree(source, destination, symlinks=True,
+                        dirs_exist_ok=True)
+    else:
+        if os.path.lexists(destination) and not os.path.isdir(destination):
+            os.unlink(destination)
+        shutil.copy2(source, destination, follow_symlinks=False)
+
+def symlink(target, link):
+    """
+    ln -s, link may be a directory
+
+    :returns: False when link already exists
+    """
+    logging.debug("% ln -s {} {}".format(target, link))
+    if os.path.isdir(link) and not os.path.islink(link):
+        link = os.path.join(link, os.path.basename(target))
+    try:
+        os.symlink(target, link)
+    except FileExistsError:
+        return False
+    return True
+
+def chmod_tree(path, mode):
+    """
+    chmod -R, but only nodes whose mode differs get touched. Like chmod -R,
+    path itself is followed if it is a symlink, symlinks below it are not.
+
+    :param mode: int, e.g. 0o777
+    :returns: (checked, changed, failed) lists of paths
+    """
+    checked = []
+    changed = []
+    failed = []
+
+    def apply(node, st):
+        checked.append(node)
+        if stat.S_IMODE(st.st_mode) == mode:
+            return
+        try:
+            os.chmod(node, mode, follow_symlinks=node == path)
+            changed.append(node)
+        except OSError as e:
+            logging.debug("Failed to chmod {}: {}".format(node, e))
+            failed.append(node)
+
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return checked, changed, failed
+    apply(path, st)
+    if stat.S_ISDIR(st.st_mode):
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                node = os.path.join(root, name)
+                try:
+                    st = os.lstat(node)
+                except FileNotFoundError:
+                    continue
+                if not stat.S_ISLNK(st.st_mode):
+                    apply(node, st)
+    return checked, changed, failed
+
+def substitute(text, old, new, count=0, only_lines_matching=None):
+    """
+    Replace old with new per line, like sed "s/old/new/" (count=1) or
+    "s/old/new/g" (count=0).
+
+    :param only_lines_matching: compiled regex, only touch lines where it
+                                matches, like sed "/regex/ s/old/new/"
+    """
+    lines = text.splitlines(keepends=True)
+    for i, line in enumerate(lines):
+        if only_lines_matching is not None and \
+                not only_lines_matching.search(line):
+            continue
+        lines[i] = line.replace(old, new, count if count else -1)
+    return "".join(lines)
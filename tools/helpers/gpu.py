@@ -1,27 +1,178 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-import glob
+import logging
 import os
-import tools.helpers.props
+import tools.config
 
 unsupported = ["nvidia"]
 
-def getKernelDriver(args, dev):
-    return tools.helpers.props.file_get(args, "/sys/class/drm/{}/device/uevent".format(dev), "DRIVER")
+SYSFS_DRM = "/sys/class/drm"
+
+def readUevent(path):
+    ret = {}
+    try:
+        with open(path) as uevent:
+            for line in uevent:
+                key, sep, value = line.strip().partition("=")
+                if sep:
+                    ret[key] = value
+    except OSError:
+        pass
+    return ret
 
-def getCardFromRender(args, dev):
+def readFile(path):
     try:
-        return "/dev/dri/" + os.path.basename(glob.glob("/sys/class/drm/{}/device/drm/card*".format(dev))[0])
-    except IndexError:
+        with open(path) as handle:
+            return handle.read().strip()
+    except OSError:
         return ""
 
+# PCI Express capability, device/port type of a root complex integrated
+# endpoint
+PCI_CAP_ID_EXP = 0x10
+PCI_EXP_TYPE_RC_END = 0x9
+
+def getPcieType(device):
+    """ :returns: device/port type from the PCIe capability, or None """
+    try:
+        with open(device + "/config", "rb") as handle:
+            config = handle.read(256)
+    except OSError:
+        return None
+    # Capabilities list, non-root users only get to read the first 64 bytes
+    if len(config) < 64 or not config[6] & 0x10:
+        return None
+    pos = config[0x34] & ~3
+    for _ in range(48):
+        if pos < 0x40 or pos + 4 > len(config):
+            return None
+        if config[pos] == PCI_CAP_ID_EXP:
+            return (config[pos + 2] >> 4) & 0xf
+        pos = config[pos + 1] & ~3
+    return None
+
+def isDiscrete(device, bus, slot):
+    """
+    Best effort guess from the PCI topology, whether a GPU has its own
+    memory:
+    - GPUs that aren't on the PCI bus are part of the SoC
+    - root complex integrated endpoints and devices on the root bus 00 are
+      part of the CPU or chipset (e.g. Intel's 00:02.0)
+    - AMD APUs put their GPU behind the internal GPP bridge 00:08.x, so it
+      shows up on another bus (e.g. 04:00.0) like a discrete one would
+    """
+    if bus != "pci":
+        return False
+    if getPcieType(device) == PCI_EXP_TYPE_RC_END:
+        return False
+    if slot.split(":")[1:2] == ["00"]:
+        return False
+    bridge = os.path.dirname(os.path.realpath(device))
+    name = os.path.basename(bridge)
+    if readFile(bridge + "/vendor") == "0x1022" and \
+            name.split(":")[1:2] == ["00"] and \
+            name.split(":")[-1].startswith("08."):
+        return False
+    return True
+
+def getGpus(args):
+    """
+    Enumerate the DRM devices once per command (kept in args.cache["gpus"]).
+    :returns: list of dicts with the render node ("render"), the matching
+              card node ("card"), the kernel driver ("driver"), the bus
+              ("pci", "platform"...), the device name on that bus ("slot",
+              e.g. "0000:03:00.0") and whether it is a discrete GPU
+    """
+    if "gpus" in args.cache:
+        return args.cache["gpus"]
+
+    gpus = []
+    try:
+        renders = sorted(name for name in os.listdir(SYSFS_DRM)
+                         if name.startswith("renderD"))
+    except OSError:
+        renders = []
+    for render in renders:
+        device = os.path.join(SYSFS_DRM, render, "device")
+        uevent = readUevent(device + "/uevent")
+        try:
+            cards = sorted(name for name in os.listdir(device + "/drm")
+                           if name.startswith("card"))
+        except OSError:
+            cards = []
+        bus = os.path.basename(os.path.realpath(device + "/subsystem"))
+        slot = os.path.basename(os.path.realpath(device))
+        gpus.append({
+            "render": "/dev/dri/" + render,
+            "card": "/dev/dri/" + cards[0] if cards else "",
+            "driver": uevent.get("DRIVER", ""),
+            "bus": bus,
+            "slot": slot,
+            "discrete": isDiscrete(device, bus, slot),
+        })
+    args.cache["gpus"] = gpus
+    return gpus
+
+def describeGpu(gpu):
+    return "{} ({} {}, {})".format(
+        gpu["render"], gpu["driver"] or "unknown driver", gpu["slot"],
+        "discrete" if gpu["discrete"] else "integrated")
+
+def selectGpu(args):
+    """
+    Pick the GPU for the container according to the gpu_policy config:
+    "auto" (the first supported one), "discrete", "integrated",
+    "driver:<kernel driver>" or "slot:<device name>", e.g.
+    "slot:0000:03:00.0". Telling discrete and integrated GPUs apart is a
+    heuristic (see isDiscrete()), driver: and slot: pick a GPU for sure.
+    :returns: one of the dicts of getGpus(), or None
+    """
+    if "gpu" not in args.cache:
+        args.cache["gpu"] = applyGpuPolicy(args)
+    return args.cache["gpu"]
+
+def applyGpuPolicy(args):
+    gpus = [gpu for gpu in getGpus(args) if gpu["driver"] not in unsupported]
+    if not gpus:
+        return None
+
+    policy = tools.config.view(args)["waydroid"]["gpu_policy"]
+    kind, _, value = policy.partition(":")
+    if kind == "discrete":
+        matches = [gpu for gpu in gpus if gpu["discrete"]]
+    elif kind == "integrated":
+        matches = [gpu for gpu in gpus if not gpu["discrete"]]
+    elif kind == "driver":
+        matches = [gpu for gpu in gpus if gpu["driver"] == value]
+    elif kind == "slot":
+        matches = [gpu for gpu in gpus if gpu["slot"] == value]
+    else:
+        if kind != "auto":
+            logging.warning("Unknown gpu_policy: " + policy)
+        matches = gpus
+
+    if not matches:
+        logging.warning("No GPU matches gpu_policy {}, using {}".format(
+            policy, gpus[0]["render"]))
+        if kind in ["discrete", "integrated"]:
+            logging.warning("GPUs found: {}. Use gpu_policy driver:<driver>"
+                            " or slot:<slot> to pick one of them".format(
+                                ", ".join(describeGpu(gpu) for gpu in gpus)))
+        return gpus[0]
+    return matches[0]
+
+def getKernelDriver(args, dev):
+    for gpu in getGpus(args):
+        if os.path.basename(gpu["render"]) == dev:
+            return gpu["driver"]
+    return ""
+
 def getDriNode(args):
-    for node in glob.glob("/dev/dri/renderD*"):
-        renderDev = os.path.basename(node)
-        if getKernelDriver(args, renderDev) not in unsupported:
-            return node, getCardFromRender(args, renderDev)
-    return "", ""
+    gpu = selectGpu(args)
+    if gpu is None:
+        return "", ""
+    return gpu["render"], gpu["card"]
 
 def getVulkanDriver(args, dev):
     mapping = {
@@ -2,6 +2,7 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
 import logging
 import shutil
 import os
@@ -16,92 +17,152 @@ def remove_overlay(args):
         shutil.rmtree(tools.config.defaults["overlay_work"])
 
 def make_prop(args, cfg, full_props_path):
+    """
+    Generate waydroid.prop from waydroid_base.prop and the session.
+    :returns: True when it changed since the last start
+    """
     if not os.path.isfile(args.work + "/waydroid_base.prop"):
         raise RuntimeError("waydroid_base.prop Not found")
     with open(args.work + "/waydroid_base.prop") as f:
-        props = f.read().splitlines()
-    if not props:
+        base = f.read()
+    if not base.strip():
         raise RuntimeError("waydroid_base.prop is broken!!?")
 
+    props = helpers.props.PropertyMap()
+    props.input("file:waydroid_base.prop",
+                hashlib.sha256(base.encode()).hexdigest())
+    props.update(base.splitlines(), "file:waydroid_base.prop")
+
     def add_prop(key, cfg_key):
-        value = cfg[cfg_key]
+        value = props.input("session:" + cfg_key, cfg[cfg_key])
         if value != "None":
             value = value.replace("/mnt/", "/mnt_extra/")
-            props.append(key + "=" + value)
+            props.set(key, value, "session:" + cfg_key)
 
     add_prop("waydroid.host.user", "user_name")
     add_prop("waydroid.host.uid", "user_id")
     add_prop("waydroid.host.gid", "group_id")
     add_prop("waydroid.host_data_path", "waydroid_data")
     add_prop("waydroid.background_start", "background_start")
-    props.append("waydroid.xdg_runtime_dir=" + tools.config.defaults["container_xdg_runtime_dir"])
-    props.append("waydroid.pulse_runtime_path=" + tools.config.defaults["container_pulse_runtime_path"])
-    props.append("waydroid.wayland_display=" + tools.config.defaults["container_wayland_display"])
+    props.set("waydroid.xdg_runtime_dir", tools.config.defaults["container_xdg_runtime_dir"])
+    props.set("waydroid.pulse_runtime_path", tools.config.defaults["container_pulse_runtime_path"])
+    props.set("waydroid.wayland_display", tools.config.defaults["container_wayland_display"])
 
-    if which("waydroid-sensord") is None:
-        props.append("waydroid.stub_sensors_hal=1")
+    if props.input("which:waydroid-sensord", which("waydroid-sensord")) is None:
+        props.set("waydroid.stub_sensors_hal", "1", "which:waydroid-sensord")
 
-    if not os.path.exists("/usr/libexec/android-vibrator"):
-        props.append("furios.stub_vibrator_hal=1")
+    vibrator = "/usr/libexec/android-vibrator"
+    if not props.input("file:" + vibrator, os.path.exists(vibrator)):
+        props.set("furios.stub_vibrator_hal", "1", "file:" + vibrator)
 
-    dpi = cfg["lcd_density"]
+    dpi = props.input("session:lcd_density", cfg["lcd_density"])
     if dpi != "0":
-        props.append("ro.sf.lcd_density=" + dpi)
+        props.set("ro.sf.lcd_density", dpi, "session:lcd_density")
 
-    width = cfg["width"]
+    width = props.input("session:width", cfg["width"])
     if width != "0":
-        props.append("waydroid.display_width_override=" + width)
+        props.set("waydroid.display_width_override", width, "session:width")
 
-    height = cfg["height"]
+    height = props.input("session:height", cfg["height"])
     if height != "0":
-        props.append("waydroid.display_height_override=" + height)
-
-    final_props = open(full_props_path, "w")
-    for prop in props:
-        final_props.write(prop + "\n")
-    final_props.close()
-    os.chmod(full_props_path, 0o644)
+        props.set("waydroid.display_height_override", height, "session:height")
+
+    return props.write(full_props_path)
+
+def attach_image(args, cfg, image, name):
+    """
+    Attach an image to its persistent loop device.
+    :returns: (loop device, filesystem type), or (image, None) to let mount
+              set up a loop device when that isn't possible
+    """
+    try:
+        fs_type = helpers.loop.detect_fs(image)
+        if fs_type is None:
+            return image, None
+        read_ahead_kb = cfg["waydroid"]["loop_read_ahead_kb"]
+        device = helpers.loop.attach_image(
+            args, image, name,
+            direct_io=cfg["waydroid"]["loop_direct_io"] == "True",
+            read_ahead_kb=int(read_ahead_kb) if read_ahead_kb else None)
+        return device, fs_type
+    except (OSError, ValueError) as e:
+        logging.debug("Failed to attach {} to a loop device: {}".format(
+            image, e))
+        return image, None
+
+def start_prefetch(args, cfg, images):
+    """
+    Prefetch the images with the boot profile, or remember in
+    args.record_boot_profile to record one once the boot completed.
+    """
+    args.record_boot_profile = None
+    if cfg["waydroid"]["boot_prefetch"] != "True":
+        return
+    if cfg["waydroid"]["loop_direct_io"] == "True":
+        logging.debug("Not prefetching the images, loop devices use direct I/O")
+        return
+    try:
+        budget_mb = int(cfg["waydroid"]["boot_prefetch_budget_mb"])
+        if helpers.prefetch.start(args, images, budget_mb):
+            args.record_boot_profile = images
+    except (OSError, ValueError) as e:
+        logging.warning("Failed to prefetch the images: {}".format(e))
 
 def mount_rootfs(args, images_dir, session):
-    cfg = tools.config.load(args)
-    helpers.mount.mount(args, images_dir + "/system.img",
-                        tools.config.defaults["rootfs"], umount=True)
+    trace = helpers.trace
+    cfg = tools.config.view(args)
+    start_prefetch(args, cfg, [images_dir + "/system.img",
+                               images_dir + "/vendor.img"])
+    with trace.span("mount system"):
+        source, fs_type = attach_image(args, cfg, images_dir + "/system.img",
+                                       "waydroid-system")
+        helpers.mount.mount(args, source, tools.config.defaults["rootfs"],
+                            umount=True, mount_type=fs_type)
     if cfg["waydroid"]["mount_overlays"] == "True":
         try:
-            helpers.mount.mount_overlay(args, [tools.config.defaults["overlay"],
-                                               tools.config.defaults["rootfs"]],
-                                    tools.config.defaults["rootfs"],
-                                    upper_dir=tools.config.defaults["overlay_rw"] + "/system",
-                                    work_dir=tools.config.defaults["overlay_work"] + "/system")
+            with trace.span("mount system overlay"):
+                helpers.mount.mount_overlay(args, [tools.config.defaults["overlay"],
+                                                   tools.config.defaults["rootfs"]],
+                                        tools.config.defaults["rootfs"],
+                                        upper_dir=tools.config.defaults["overlay_rw"] + "/system",
+                                        work_dir=tools.config.defaults["overlay_work"] + "/system")
         except RuntimeError:
+            cfg = tools.config.load(args)
             cfg["waydroid"]["mount_overlays"] = "False"
             tools.config.save(args, cfg)
             logging.warning("Mounting overlays failed. The feature has been disabled.")
 
-    helpers.mount.mount(args, images_dir + "/vendor.img",
-                           tools.config.defaults["rootfs"] + "/vendor")
+    with trace.span("mount vendor"):
+        source, fs_type = attach_image(args, cfg, images_dir + "/vendor.img",
+                                       "waydroid-vendor")
+        helpers.mount.mount(args, source,
+                            tools.config.defaults["rootfs"] + "/vendor",
+                            mount_type=fs_type)
     if cfg["waydroid"]["mount_overlays"] == "True":
-        helpers.mount.mount_overlay(args, [tools.config.defaults["overlay"] + "/vendor",
-                                           tools.config.defaults["rootfs"] + "/vendor"],
-                                    tools.config.defaults["rootfs"] + "/vendor",
-                                    upper_dir=tools.config.defaults["overlay_rw"] + "/vendor",
-                                    work_dir=tools.config.defaults["overlay_work"] + "/vendor")
-
-    for egl_path in ["/vendor/lib/egl", "/vendor/lib64/egl"]:
-        if os.path.isdir(egl_path):
+        with trace.span("mount vendor overlay"):
+            helpers.mount.mount_overlay(args, [tools.config.defaults["overlay"] + "/vendor",
+                                               tools.config.defaults["rootfs"] + "/vendor"],
+                                        tools.config.defaults["rootfs"] + "/vendor",
+                                        upper_dir=tools.config.defaults["overlay_rw"] + "/vendor",
+                                        work_dir=tools.config.defaults["overlay_work"] + "/vendor")
+
+    with trace.span("bind host dirs"):
+        for egl_path in ["/vendor/lib/egl", "/vendor/lib64/egl"]:
+            if os.path.isdir(egl_path):
+                helpers.mount.bind(
+                    args, egl_path, tools.config.defaults["rootfs"] + egl_path)
+        if helpers.mount.ismount("/odm"):
             helpers.mount.bind(
-                args, egl_path, tools.config.defaults["rootfs"] + egl_path)
-    if helpers.mount.ismount("/odm"):
-        helpers.mount.bind(
-            args, "/odm", tools.config.defaults["rootfs"] + "/odm_extra")
-    else:
-        if os.path.isdir("/vendor/odm"):
-            helpers.mount.bind(
-                args, "/vendor/odm", tools.config.defaults["rootfs"] + "/odm_extra")
-
-    make_prop(args, session, args.work + "/waydroid.prop")
-    helpers.mount.bind_file(args, args.work + "/waydroid.prop",
-                            tools.config.defaults["rootfs"] + "/vendor/waydroid.prop")
+                args, "/odm", tools.config.defaults["rootfs"] + "/odm_extra")
+        else:
+            if os.path.isdir("/vendor/odm"):
+                helpers.mount.bind(
+                    args, "/vendor/odm", tools.config.defaults["rootfs"] + "/odm_extra")
+
+    with trace.span("make_prop"):
+        make_prop(args, session, args.work + "/waydroid.prop")
+        helpers.mount.bind_file(args, args.work + "/waydroid.prop",
+                                tools.config.defaults["rootfs"] + "/vendor/waydroid.prop")
 
 def umount_rootfs(args):
     helpers.mount.umount_all(args, tools.config.defaults["rootfs"])
@@ -2,9 +2,147 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import atexit
 import logging
 import os
 import sys
+import threading
+import tools.config
+
+# Lines are written by a background thread, at most this long after they
+# were logged, or as soon as this many are pending
+FLUSH_INTERVAL = 0.1
+FLUSH_LINES = 256
+
+class LogWriter:
+    """
+    Write log lines to args.log from a background thread in batches, and
+    rotate the file once it gets bigger than max_size. Lines of ERROR and
+    above are written synchronously by flush(), so they are never lost.
+
+    Several waydroid processes append to the same file. When one of them
+    rotated it, the others notice the inode change and reopen args.log.
+    """
+    def __init__(self, args, max_size, backups):
+        self.args = args
+        self.max_size = max_size
+        self.backups = backups
+        self.io_lock = threading.Lock()
+        self.cond = threading.Condition(threading.Lock())
+        self.pending = []
+        self.can_rotate = max_size > 0
+        self.stopped = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="log-writer",
+                                       daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        with self.cond:
+            self.pending.append(line)
+            if len(self.pending) == 1 or len(self.pending) >= FLUSH_LINES:
+                self.cond.notify()
+
+    def write_pending(self):
+        """ Write out everything queued so far, io_lock must be held. """
+        with self.cond:
+            lines = self.pending
+            self.pending = []
+        if not lines:
+            return
+        logfd = self.args.logfd
+        logfd.write("".join(lines))
+        logfd.flush()
+        self.check_rotate()
+
+    def flush(self):
+        with self.io_lock:
+            self.write_pending()
+            self.args.logfd.flush()
+
+    def write_raw(self, data):
+        """ Write bytes (e.g. subprocess output) behind the queued lines. """
+        with self.io_lock:
+            self.write_pending()
+            self.args.logfd.buffer.write(data)
+
+    def dup(self):
+        """ See dup_logfd() """
+        with self.io_lock:
+            self.write_pending()
+            self.args.logfd.flush()
+            return os.dup(self.args.logfd.fileno())
+
+    def splice(self, fd, size):
+        """ Move up to size bytes from the pipe fd to the log file. """
+        with self.io_lock:
+            self.write_pending()
+            self.args.logfd.flush()
+            return os.splice(fd, self.args.logfd.fileno(), size)
+
+    def check_rotate(self):
+        logfd = self.args.logfd
+        try:
+            try:
+                st = os.stat(self.args.log)
+            except FileNotFoundError:
+                st = None
+            if st is None or st.st_ino != os.fstat(logfd.fileno()).st_ino:
+                # Rotated (or removed) by another process
+                self.reopen()
+            elif self.can_rotate and st.st_size > self.max_size:
+                self.rotate()
+        except OSError:
+            # e.g. the session can't rename files in the root owned work
+            # dir, leave rotating to the container manager
+            self.can_rotate = False
+
+    def rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists("{}.{}".format(self.args.log, i)):
+                os.replace("{}.{}".format(self.args.log, i),
+                           "{}.{}".format(self.args.log, i + 1))
+        if self.backups > 0:
+            os.replace(self.args.log, self.args.log + ".1")
+        else:
+            os.truncate(self.args.log, 0)
+        self.reopen()
+
+    def reopen(self):
+        old = self.args.logfd
+        self.args.logfd = open(self.args.log, "a+")
+        try:
+            os.chmod(self.args.log, 0o666)
+        except PermissionError:
+            pass
+        old.close()
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending or self.stopped)
+                # Give the batch some time to fill up
+                self.cond.wait_for(lambda: len(self.pending) >= FLUSH_LINES or
+                                   self.stopped, FLUSH_INTERVAL)
+                stopped = self.stopped
+            try:
+                self.flush()
+            except Exception as e:
+                sys.stderr.write("Failed to write log file: {}\n".format(e))
+            if stopped:
+                return
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(1)
+        self.flush()
+
+writer = None
 
 class log_handler(logging.StreamHandler):
     """
@@ -26,15 +164,73 @@ class log_handler(logging.StreamHandler):
                 self.flush()
 
             # Everything: Write to logfd
-            msg = "(" + str(os.getpid()).zfill(6) + ") " + msg
-            self._args.logfd.write(msg + "\n")
-            self._args.logfd.flush()
+            msg = "(" + str(os.getpid()).zfill(6) + ") " + msg + "\n"
+            if writer is None:
+                self._args.logfd.write(msg)
+                self._args.logfd.flush()
+            else:
+                writer.write(msg)
+                if record.levelno >= logging.ERROR:
+                    writer.flush()
 
         except (KeyboardInterrupt, SystemExit):
             raise
         except BaseException:
             self.handleError(record)
 
+def flush(args=None):
+    """ Make sure everything logged so far is in the log file. """
+    if writer is not None:
+        writer.flush()
+    elif args is not None:
+        args.logfd.flush()
+
+def dup_logfd(args):
+    """
+    The writer thread may replace args.logfd (and close the old one) at any
+    time when the log gets rotated, so subprocesses get their own copy.
+
+    :returns: a duplicate of the log file descriptor, the caller closes it
+    """
+    if writer is not None:
+        return writer.dup()
+    args.logfd.flush()
+    return os.dup(args.logfd.fileno())
+
+def write_raw(args, data):
+    """ Append raw bytes to the log file, in order with logged lines. """
+    if writer is not None:
+        writer.write_raw(data)
+    else:
+        args.logfd.buffer.write(data)
+
+# Set once splice() turned out to be unsupported for the log file, e.g.
+# because it is opened with O_APPEND
+splice_unsupported = False
+
+def splice(args, fd, size):
+    """
+    Move output from a pipe to the log file without copying it through
+    userspace.
+
+    :returns: number of bytes moved (0 at EOF), or None when splicing to the
+              log file is not possible and the caller needs to copy
+    :raises BlockingIOError: when fd is non-blocking and empty
+    """
+    global splice_unsupported
+    if splice_unsupported or not hasattr(os, "splice"):
+        return None
+    try:
+        if writer is not None:
+            return writer.splice(fd, size)
+        args.logfd.flush()
+        return os.splice(fd, args.logfd.fileno(), size)
+    except BlockingIOError:
+        raise
+    except OSError:
+        splice_unsupported = True
+        return None
+
 def add_verbose_log_level():
     """
     Add a new log level "verbose", which is below "debug". Also monkeypatch
@@ -53,12 +249,52 @@ def add_verbose_log_level():
                                                                msg, *args,
                                                                **kwargs)
 
+def set_component_levels(cfg):
+    """
+    Apply the [logging] section of the config, which maps logger names to
+    levels, e.g. "tools.actions.statechange_server = warning". Messages
+    below that level are dropped before they get formatted.
+    """
+    for name, level in cfg["logging"].items():
+        value = logging.getLevelName(level.upper())
+        if not isinstance(value, int):
+            logging.warning("Ignoring invalid log level for {}: {}".format(
+                name, level))
+            continue
+        logging.getLogger(name).setLevel(value)
+
+def start_writer(args, cfg):
+    global writer
+    try:
+        max_size = int(cfg["waydroid"]["log_max_size"])
+        backups = int(cfg["waydroid"]["log_backups"])
+    except ValueError:
+        max_size = int(tools.config.defaults["log_max_size"])
+        backups = int(tools.config.defaults["log_backups"])
+    writer = LogWriter(args, max_size, backups)
+    writer.start()
+    atexit.register(stop_writer)
+
+def stop_writer():
+    global writer
+    if writer is not None:
+        writer.stop()
+        writer = None
+
+def restart_writer_in_child():
+    # The writer thread doesn't survive fork(), give the child its own
+    global writer
+    if writer is not None:
+        writer = LogWriter(writer.args, writer.max_size, writer.backups)
+        writer.start()
+
 def init(args):
     """
     Set log format and add the log file descriptor to args.logfd, add the
     verbose log level.
     """
     # Set log file descriptor (logfd)
+    log_to_file = False
     if args.details_to_stdout:
         setattr(args, "logfd", sys.stdout)
     else:
@@ -68,6 +304,7 @@ def init(args):
         dir = os.path.dirname(args.log)
         if os.path.exists(dir):
             setattr(args, "logfd", open(args.log, "a+"))
+            log_to_file = True
             try:
                 os.chmod(args.log, 0o666)
             except PermissionError:
@@ -96,6 +333,13 @@ def init(args):
     handler.setFormatter(formatter)
     root_logger.addHandler(handler)
 
+    cfg = tools.config.view(args)
+    set_component_levels(cfg)
+    if log_to_file:
+        start_writer(args, cfg)
+
 def disable():
     logger = logging.getLogger()
     logger.disabled = True
+
+os.register_at_fork(after_in_child=restart_writer_in_child)
@@ -0,0 +1,315 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import ctypes
+import errno
+import fcntl
+import json
+import logging
+import os
+import struct
+import time
+import tools.helpers.fileops
+
+""" Loop device setup through ioctls on /dev/loop-control and /dev/loopN,
+    the way losetup(8) and mount(8) do it, without running either. """
+
+LOOP_SET_FD = 0x4C00
+LOOP_CLR_FD = 0x4C01
+LOOP_SET_STATUS64 = 0x4C04
+LOOP_GET_STATUS64 = 0x4C05
+LOOP_SET_DIRECT_IO = 0x4C08
+LOOP_SET_BLOCK_SIZE = 0x4C09
+LOOP_CONFIGURE = 0x4C0A
+LOOP_CTL_GET_FREE = 0x4C82
+
+LO_FLAGS_READ_ONLY = 1
+LO_FLAGS_AUTOCLEAR = 4
+LO_FLAGS_DIRECT_IO = 16
+
+LO_NAME_SIZE = 64
+LO_KEY_SIZE = 32
+
+class loop_info64(ctypes.Structure):
+    _fields_ = [
+        ("lo_device", ctypes.c_uint64),
+        ("lo_inode", ctypes.c_uint64),
+        ("lo_rdevice", ctypes.c_uint64),
+        ("lo_offset", ctypes.c_uint64),
+        ("lo_sizelimit", ctypes.c_uint64),
+        ("lo_number", ctypes.c_uint32),
+        ("lo_encrypt_type", ctypes.c_uint32),
+        ("lo_encrypt_key_size", ctypes.c_uint32),
+        ("lo_flags", ctypes.c_uint32),
+        ("lo_file_name", ctypes.c_char * LO_NAME_SIZE),
+        ("lo_crypt_name", ctypes.c_char * LO_NAME_SIZE),
+        ("lo_encrypt_key", ctypes.c_ubyte * LO_KEY_SIZE),
+        ("lo_init", ctypes.c_uint64 * 2),
+    ]
+
+class loop_config(ctypes.Structure):
+    _fields_ = [
+        ("fd", ctypes.c_uint32),
+        ("block_size", ctypes.c_uint32),
+        ("info", loop_info64),
+        ("__reserved", ctypes.c_uint64 * 8),
+    ]
+
+# (offset, format, magic, filesystem type)
+FS_MAGICS = [
+    (1024 + 0x38, "<H", 0xEF53, "ext4"),
+    (1024, "<I", 0xE0F5E1E2, "erofs"),
+    (0, "<I", 0x73717368, "squashfs"),
+]
+
+# (filesystem type, offset, format) of the log2 of the filesystem block
+# size in the superblock; ext4 stores it relative to 1024 bytes
+FS_BLOCK_SIZE_BITS = {
+    "ext4": (1024 + 0x18, "<I", 10),
+    "erofs": (1024 + 0x0C, "<B", 0),
+}
+
+def read_header(path):
+    with open(path, "rb") as handle:
+        return handle.read(2048)
+
+def detect_fs(path, header=None):
+    """
+    :returns: filesystem type of an image ("ext4", "erofs", "squashfs"), or
+              None when it isn't one of those
+    """
+    if header is None:
+        header = read_header(path)
+    for offset, fmt, magic, fs_type in FS_MAGICS:
+        size = struct.calcsize(fmt)
+        if len(header) >= offset + size and \
+                struct.unpack_from(fmt, header, offset)[0] == magic:
+            return fs_type
+    return None
+
+def fs_block_size(path):
+    """
+    :returns: block size of the filesystem in an image, limited to what a
+              loop device supports (512 to 4096), or 0 when it is unknown
+    """
+    header = read_header(path)
+    fs_type = detect_fs(path, header)
+    if fs_type not in FS_BLOCK_SIZE_BITS:
+        return 0
+    offset, fmt, base = FS_BLOCK_SIZE_BITS[fs_type]
+    block_size = 1 << (base + struct.unpack_from(fmt, header, offset)[0])
+    return max(512, min(block_size, 4096))
+
+def get_free():
+    """ :returns: path of a free loop device, e.g. /dev/loop3 """
+    fd = os.open("/dev/loop-control", os.O_RDWR | os.O_CLOEXEC)
+    try:
+        return "/dev/loop{}".format(fcntl.ioctl(fd, LOOP_CTL_GET_FREE))
+    finally:
+        os.close(fd)
+
+def attach(image, readonly=True, autoclear=True, name=None, flags=0,
+           block_size=0):
+    """
+    Attach an image to a free loop device, with LOOP_CONFIGURE (Linux 5.8)
+    or LOOP_SET_FD + LOOP_SET_STATUS64 on older kernels.
+
+    :param autoclear: detach the loop device on its last close, i.e. once
+                      the filesystem on it is unmounted
+    :param name: lo_file_name to set, defaults to the image path
+    :param flags: additional LO_FLAGS_*
+    :returns: (path of the loop device, open fd of it). With autoclear the
+              fd must stay open until the device is in use (mounted),
+              otherwise the device is detached right away.
+    """
+    lo_flags = flags
+    if readonly:
+        lo_flags |= LO_FLAGS_READ_ONLY
+    if autoclear:
+        lo_flags |= LO_FLAGS_AUTOCLEAR
+    file_name = (name or image).encode()[:LO_NAME_SIZE - 1]
+
+    image_fd = os.open(image, (os.O_RDONLY if readonly else os.O_RDWR) |
+                       os.O_CLOEXEC)
+    try:
+        # Another process may grab the free device between GET_FREE and
+        # configuring it, retry in that case like losetup does
+        for _ in range(16):
+            device = get_free()
+            loop_fd = os.open(device, (os.O_RDONLY if readonly else os.O_RDWR) |
+                              os.O_CLOEXEC)
+            attached = False
+            try:
+                config = loop_config()
+                config.fd = image_fd
+                config.block_size = block_size
+                config.info.lo_flags = lo_flags
+                config.info.lo_file_name = file_name
+                try:
+                    fcntl.ioctl(loop_fd, LOOP_CONFIGURE, config)
+                except OSError as e:
+                    if e.errno == errno.EBUSY:
+                        continue
+                    if e.errno not in [errno.EINVAL, errno.ENOTTY]:
+                        raise
+                    # No LOOP_CONFIGURE
+                    try:
+                        fcntl.ioctl(loop_fd, LOOP_SET_FD, image_fd)
+                    except OSError as e:
+                        if e.errno == errno.EBUSY:
+                            continue
+                        raise
+                    info = loop_info64()
+                    info.lo_flags = lo_flags & ~LO_FLAGS_READ_ONLY
+                    info.lo_file_name = file_name
+                    try:
+                        fcntl.ioctl(loop_fd, LOOP_SET_STATUS64, info)
+                    except OSError:
+                        fcntl.ioctl(loop_fd, LOOP_CLR_FD)
+                        raise
+                    if block_size:
+                        try:
+                            fcntl.ioctl(loop_fd, LOOP_SET_BLOCK_SIZE,
+                                        block_size)
+                        except OSError as e:
+                            logging.debug("Failed to set the block size of"
+                                          " {}: {}".format(device, e))
+                logging.debug("% losetup {} {}".format(device, image))
+                attached = True
+                return device, loop_fd
+            finally:
+                if not attached:
+                    os.close(loop_fd)
+        raise OSError(errno.EBUSY, "No free loop device", image)
+    finally:
+        os.close(image_fd)
+
+def detach(device):
+    fd = os.open(device, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        logging.debug("% losetup -d " + device)
+        fcntl.ioctl(fd, LOOP_CLR_FD)
+    finally:
+        os.close(fd)
+
+def status(device):
+    """ :returns: loop_info64 of an attached loop device """
+    fd = os.open(device, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        info = loop_info64()
+        fcntl.ioctl(fd, LOOP_GET_STATUS64, info)
+        return info
+    finally:
+        os.close(fd)
+
+def release(device, name):
+    """
+    Detach a loop device attached by attach_image(), unless it was reused
+    for something else in the meantime. When it is still mounted, let the
+    kernel detach it on the last umount instead.
+    """
+    try:
+        fd = os.open(device, os.O_RDONLY | os.O_CLOEXEC)
+    except OSError:
+        return
+    try:
+        info = loop_info64()
+        fcntl.ioctl(fd, LOOP_GET_STATUS64, info)
+        if info.lo_file_name != name.encode():
+            return
+        try:
+            logging.debug("% losetup -d " + device)
+            fcntl.ioctl(fd, LOOP_CLR_FD)
+        except OSError as e:
+            if e.errno != errno.EBUSY:
+                raise
+            info.lo_flags |= LO_FLAGS_AUTOCLEAR
+            fcntl.ioctl(fd, LOOP_SET_STATUS64, info)
+    except OSError as e:
+        if e.errno != errno.ENXIO:
+            logging.debug("Failed to release {}: {}".format(device, e))
+    finally:
+        os.close(fd)
+
+def set_read_ahead(device, read_ahead_kb):
+    path = "/sys/block/{}/queue/read_ahead_kb".format(os.path.basename(device))
+    logging.debug("% echo {} > {}".format(read_ahead_kb, path))
+    with open(path, "w") as handle:
+        handle.write(str(read_ahead_kb))
+
+def state_path(args):
+    return args.work + "/loop_devices.json"
+
+def load_state(args):
+    try:
+        with open(state_path(args)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+def attach_image(args, image, name, direct_io=False, read_ahead_kb=None):
+    """
+    Attach an image to a persistent loop device called name (e.g.
+    "waydroid-system"), or reuse the device from the last start when the
+    image didn't change since. The device stays attached after umounting,
+    which keeps its page cache and saves setting it up again on the next
+    start. The state is kept in loop_devices.json in the work dir.
+
+    :param direct_io: read the image with O_DIRECT, to not cache it twice
+                      (in the loop device and the backing file). Note that
+                      the loop device drops its cache on the last umount,
+                      so this makes every start read the image from disk.
+    :param read_ahead_kb: read-ahead of the loop device, None for the
+                          kernel default
+    :returns: path of the loop device
+    """
+    st = os.stat(image)
+    key = {
+        "image": os.path.realpath(image),
+        "dev": st.st_dev,
+        "inode": st.st_ino,
+        "mtime": st.st_mtime_ns,
+        "direct_io": direct_io,
+        "read_ahead_kb": read_ahead_kb,
+    }
+    state = load_state(args)
+    entry = state.get(name)
+
+    if entry and entry["key"] == key:
+        try:
+            info = status(entry["device"])
+            if info.lo_file_name == name.encode() and \
+                    info.lo_device == st.st_dev and info.lo_inode == st.st_ino:
+                logging.debug("Reusing {} for {}, saves {:.1f} ms".format(
+                    entry["device"], image, entry["attach_ms"]))
+                return entry["device"]
+        except OSError:
+            pass
+    if entry:
+        # The image changed (or the device got detached): start over
+        release(entry["device"], name)
+
+    start = time.monotonic()
+    device, fd = attach(image, autoclear=False, name=name,
+                        block_size=fs_block_size(image))
+    try:
+        if direct_io:
+            try:
+                fcntl.ioctl(fd, LOOP_SET_DIRECT_IO, 1)
+            except OSError as e:
+                # e.g. the backing filesystem doesn't support O_DIRECT
+                logging.debug("No direct I/O for {}: {}".format(device, e))
+        if read_ahead_kb is not None:
+            try:
+                set_read_ahead(device, read_ahead_kb)
+            except OSError as e:
+                logging.debug("Failed to set read-ahead of {}: {}".format(
+                    device, e))
+    finally:
+        os.close(fd)
+    attach_ms = (time.monotonic() - start) * 1000
+
+    state[name] = {"device": device, "key": key, "attach_ms": attach_ms}
+    tools.helpers.fileops.atomic_write(state_path(args),
+                                       json.dumps(state, indent=1) + "\n")
+    return device
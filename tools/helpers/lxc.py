@@ -3,6 +3,8 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import subprocess
+import errno
+import hashlib
 import os
 import re
 import logging
@@ -10,17 +12,23 @@ import glob
 import shutil
 import time
 import platform
-import gbinder
 import tools.config
+import tools.helpers.fileops
+import tools.helpers.mount_api
 import tools.helpers.run
+import tools.helpers.trace
 
 def get_lxc_version(args):
+    if "lxc_version" in args.cache:
+        return args.cache["lxc_version"]
     if shutil.which("lxc-info") is not None:
         command = ["lxc-info", "--version"]
         version_str = tools.helpers.run.user(args, command, output_return=True)
-        return int(version_str[0])
+        version = int(version_str[0])
     else:
-        return 0
+        version = 0
+    args.cache["lxc_version"] = version
+    return version
 
 def add_node_entry(nodes, src, dist, mnt_type, options, check):
     if check and not os.path.exists(src):
@@ -129,6 +137,11 @@ def generate_nodes_lxc_config(args):
 
 LXC_APPARMOR_PROFILE = "lxc-waydroid"
 def get_apparmor_status(args):
+    if "apparmor" not in args.cache:
+        args.cache["apparmor"] = probe_apparmor(args)
+    return args.cache["apparmor"]
+
+def probe_apparmor(args):
     enabled = False
     if shutil.which("aa-enabled"):
         enabled = (tools.helpers.run.user(args, ["aa-enabled", "--quiet"], check=False) == 0)
@@ -141,13 +154,11 @@ def get_apparmor_status(args):
         enabled = False
     return enabled
 
-def set_lxc_config(args):
-    lxc_path = tools.config.defaults["lxc"] + "/waydroid"
+def lxc_config_snippets(args):
     lxc_ver = get_lxc_version(args)
     if lxc_ver == 0:
         raise OSError("LXC is not installed")
     config_paths = tools.config.tools_src + "/data/configs/config_"
-    seccomp_profile = tools.config.tools_src + "/data/configs/waydroid.seccomp"
 
     config_snippets = [ config_paths + "base" ]
     # lxc v1 and v2 are bit special because some options got renamed later
@@ -158,31 +169,113 @@ def set_lxc_config(args):
             snippet = config_paths + str(ver)
             if lxc_ver >= ver and os.path.exists(snippet):
                 config_snippets.append(snippet)
+    return config_snippets
+
+def lxc_config_inputs(args):
+    """
+    :returns: everything set_lxc_config() depends on, to tell whether it
+              needs to run again
+    """
+    inputs = {
+        "tools_version": tools.config.version,
+        "lxc_version": get_lxc_version(args),
+        "machine": platform.machine(),
+        "apparmor": get_apparmor_status(args),
+        "nodes": generate_nodes_lxc_config(args),
+    }
+    seccomp_profile = tools.config.tools_src + "/data/configs/waydroid.seccomp"
+    for path in lxc_config_snippets(args) + [seccomp_profile]:
+        with open(path, "rb") as handle:
+            inputs[os.path.basename(path)] = \
+                hashlib.sha256(handle.read()).hexdigest()
+    return inputs
 
-    command = ["mkdir", "-p", lxc_path]
-    tools.helpers.run.user(args, command)
-    command = ["sh", "-c", "cat {} > \"{}\"".format(' '.join('"{0}"'.format(w) for w in config_snippets), lxc_path + "/config")]
-    tools.helpers.run.user(args, command)
-    command = ["sed", "-i", "s/LXCARCH/{}/".format(platform.machine()), lxc_path + "/config"]
-    tools.helpers.run.user(args, command)
-    command = ["cp", "-fpr", seccomp_profile, lxc_path + "/waydroid.seccomp"]
-    tools.helpers.run.user(args, command)
+def set_lxc_config(args):
+    lxc_path = tools.config.defaults["lxc"] + "/waydroid"
+    config_snippets = lxc_config_snippets(args)
+    seccomp_profile = tools.config.tools_src + "/data/configs/waydroid.seccomp"
+
+    tools.helpers.fileops.makedirs(lxc_path)
+    logging.debug("% cat {} > {}".format(" ".join(config_snippets),
+                                         lxc_path + "/config"))
+    config = ""
+    for snippet in config_snippets:
+        with open(snippet) as handle:
+            config += handle.read()
+    logging.debug("% sed -i s/LXCARCH/{}/ {}".format(platform.machine(),
+                                                    lxc_path + "/config"))
+    config = tools.helpers.fileops.substitute(config, "LXCARCH",
+                                              platform.machine(), count=1)
     if get_apparmor_status(args):
-        command = ["sed", "-i", "-E", "/lxc.aa_profile|lxc.apparmor.profile/ s/unconfined/{}/g".format(LXC_APPARMOR_PROFILE), lxc_path + "/config"]
-        tools.helpers.run.user(args, command)
+        logging.debug("% sed -i -E /lxc.aa_profile|lxc.apparmor.profile/"
+                      " s/unconfined/{}/g {}".format(LXC_APPARMOR_PROFILE,
+                                                     lxc_path + "/config"))
+        config = tools.helpers.fileops.substitute(
+            config, "unconfined", LXC_APPARMOR_PROFILE,
+            only_lines_matching=re.compile("lxc.aa_profile|lxc.apparmor.profile"))
+    tools.helpers.fileops.atomic_write(lxc_path + "/config", config)
+    tools.helpers.fileops.copy(seccomp_profile, lxc_path + "/waydroid.seccomp")
 
     nodes = generate_nodes_lxc_config(args)
-    config_nodes_tmp_path = args.work + "/config_nodes"
-    config_nodes = open(config_nodes_tmp_path, "w")
-    for node in nodes:
-        config_nodes.write(node + "\n")
-    config_nodes.close()
-    command = ["mv", config_nodes_tmp_path, lxc_path]
-    tools.helpers.run.user(args, command)
+    tools.helpers.fileops.atomic_write(lxc_path + "/config_nodes",
+                                       "".join(node + "\n" for node in nodes))
 
     # Create empty file
     open(os.path.join(lxc_path, "config_session"), mode="w").close()
 
+def session_sockets(session):
+    """
+    :returns: (host path, container path) of the Wayland and the pulse
+              socket a session shares with the container
+    """
+    wayland_host_socket = os.path.realpath(os.path.join(session["xdg_runtime_dir"], session["wayland_display"]))
+    wayland_container_socket = os.path.realpath(os.path.join(tools.config.defaults["container_xdg_runtime_dir"], tools.config.defaults["container_wayland_display"]))
+    pulse_host_socket = os.path.join(session["pulse_runtime_path"], "native")
+    pulse_container_socket = os.path.join(tools.config.defaults["container_pulse_runtime_path"], "native")
+    return [(wayland_host_socket, wayland_container_socket),
+            (pulse_host_socket, pulse_container_socket)]
+
+def detach_session_sockets(args, session):
+    """ Unmount the sockets of a session inside the running container """
+    pid = init_pid(args)
+    def detach():
+        for _, target in session_sockets(session):
+            logging.debug("% nsenter -t {} -m umount -l {}".format(pid, target))
+            try:
+                tools.helpers.mount_api.umount(target,
+                                               tools.helpers.mount_api.MNT_DETACH)
+            except OSError as e:
+                if e.errno not in [errno.EINVAL, errno.ENOENT]:
+                    raise
+    tools.helpers.mount_api.in_mount_namespace(pid, detach)
+
+def attach_session_sockets(args, session):
+    """
+    Bind the sockets of a new session into the running container, where
+    detach_session_sockets() left their mount points.
+
+    :raises OSError: when the Wayland socket can't be bound
+    """
+    pid = init_pid(args)
+    wayland, pulse = session_sockets(session)
+    for source, target in [wayland, pulse]:
+        try:
+            if str(os.stat(source).st_uid) != session["user_id"]:
+                raise OSError(errno.EPERM, "Not owned by the session's user",
+                              source)
+            tree_fd = tools.helpers.mount_api.open_tree(source)
+            try:
+                logging.debug("% nsenter -t {} -m mount --bind {} {}".format(
+                    pid, source, target))
+                tools.helpers.mount_api.in_mount_namespace(
+                    pid, tools.helpers.mount_api.move_mount, tree_fd, target)
+            finally:
+                os.close(tree_fd)
+        except OSError as e:
+            if source == wayland[0]:
+                raise
+            logging.warning("Failed to bind {}: {}".format(source, e))
+
 def generate_session_lxc_config(args, session):
     nodes = []
     def make_entry(src, dist=None, mnt_type="none", options="rbind,create=file 0 0"):
@@ -199,29 +292,70 @@ def generate_session_lxc_config(args, session):
     if not make_entry("tmpfs", tools.config.defaults["container_xdg_runtime_dir"], options="create=dir 0 0"):
         raise OSError("Failed to create XDG_RUNTIME_DIR mount point")
 
-    wayland_host_socket = os.path.realpath(os.path.join(session["xdg_runtime_dir"], session["wayland_display"]))
-    wayland_container_socket = os.path.realpath(os.path.join(tools.config.defaults["container_xdg_runtime_dir"], tools.config.defaults["container_wayland_display"]))
-    if not make_entry(wayland_host_socket, wayland_container_socket[1:]):
+    wayland, pulse = session_sockets(session)
+    if not make_entry(wayland[0], wayland[1][1:]):
         raise OSError("Failed to bind Wayland socket")
 
     # Make sure PULSE_RUNTIME_DIR exists
-    pulse_host_socket = os.path.join(session["pulse_runtime_path"], "native")
-    pulse_container_socket = os.path.join(tools.config.defaults["container_pulse_runtime_path"], "native")
-    make_entry(pulse_host_socket, pulse_container_socket[1:])
+    make_entry(pulse[0], pulse[1][1:])
 
     if not make_entry(session["waydroid_data"], "data", options="rbind 0 0"):
         raise OSError("Failed to bind userdata")
 
     lxc_path = tools.config.defaults["lxc"] + "/waydroid"
-    config_nodes_tmp_path = args.work + "/config_session"
-    config_nodes = open(config_nodes_tmp_path, "w")
-    for node in nodes:
-        config_nodes.write(node + "\n")
-    config_nodes.close()
-    command = ["mv", config_nodes_tmp_path, lxc_path]
-    tools.helpers.run.user(args, command)
+    tools.helpers.fileops.atomic_write(lxc_path + "/config_session",
+                                       "".join(node + "\n" for node in nodes))
+
+HAL_LIB_DIRS = ["/odm/lib", "/odm/lib64", "/vendor/lib", "/vendor/lib64",
+                "/system/lib", "/system/lib64"]
+
+def hal_libraries(args):
+    """
+    :returns: set of the HAL library names (e.g. "gralloc.msm8998.so") in
+              the hw/ folders of the host's library dirs, listed once per
+              command and kept in args.cache["hal_libraries"]
+    """
+    if "hal_libraries" not in args.cache:
+        names = set()
+        for lib in HAL_LIB_DIRS:
+            try:
+                with os.scandir(lib + "/hw") as entries:
+                    names.update(entry.name for entry in entries
+                                 if entry.name.endswith(".so") and
+                                 entry.is_file())
+            except OSError:
+                pass
+        args.cache["hal_libraries"] = names
+    return args.cache["hal_libraries"]
+
+def hwbinder_services(args):
+    """
+    :returns: set of the services registered with the host's hwbinder
+              service manager, empty when that isn't reachable. Listed once
+              per command and kept in args.cache["hwbinder_services"].
+    """
+    if "hwbinder_services" not in args.cache:
+        try:
+            import gbinder
+            sm = gbinder.ServiceManager("/dev/hwbinder")
+            services = set(sm.list_sync())
+        except:
+            services = set()
+        args.cache["hwbinder_services"] = services
+    return args.cache["hwbinder_services"]
 
 def make_base_props(args):
+    """ :returns: True when waydroid_base.prop changed """
+    return base_props(args).write(args.work + "/waydroid_base.prop")
+
+def base_props(args):
+    """ :returns: PropertyMap with the contents of waydroid_base.prop """
+    props = tools.helpers.props.PropertyMap()
+
+    def host_get(prop):
+        return props.input("host:" + prop,
+                           tools.helpers.props.host_get(args, prop))
+
     def find_hal(hardware):
         hardware_props = [
             "ro.hardware." + hardware,
@@ -229,173 +363,170 @@ def make_base_props(args):
             "ro.product.board",
             "ro.arch",
             "ro.board.platform"]
+        libraries = hal_libraries(args)
         for p in hardware_props:
-            prop = tools.helpers.props.host_get(args, p)
-            if prop != "":
-                for lib in ["/odm/lib", "/odm/lib64", "/vendor/lib", "/vendor/lib64", "/system/lib", "/system/lib64"]:
-                    hal_file = lib + "/hw/" + hardware + "." + prop + ".so"
-                    if os.path.isfile(hal_file):
-                        return prop
-        return ""
+            prop = host_get(p)
+            if prop != "" and hardware + "." + prop + ".so" in libraries:
+                return props.input("hal:" + hardware, prop)
+        return props.input("hal:" + hardware, "")
 
     def find_hidl(intf):
         if args.vendor_type == "MAINLINE":
             return False
 
-        try:
-            sm = gbinder.ServiceManager("/dev/hwbinder")
-            return intf in sm.list_sync()
-        except:
-            return False
+        return props.input("hidl:" + intf, intf in hwbinder_services(args))
 
-    def append_override_device_props(props):
+    def append_override_device_props():
         try:
             override_file = "/usr/lib/furios/device/android_override.prop"
             if os.path.exists(override_file):
                 with open(override_file, 'r') as override:
-                    for prop in override:
-                        props.append(prop.strip())
+                    lines = props.input("file:" + override_file, override.read())
+                props.update(lines.splitlines(), "file:" + override_file)
         except Exception as e:
             logging.error(f"Failed to read device override props: {e}")
 
-    props = []
+    props.input("config:vendor_type", args.vendor_type)
+    props.input("tools_version", tools.config.version)
 
-    if not os.path.exists("/dev/ashmem"):
-        props.append("sys.use_memfd=true")
+    if not props.input("file:/dev/ashmem", os.path.exists("/dev/ashmem")):
+        props.set("sys.use_memfd", "true", "file:/dev/ashmem")
 
     # Added for security reasons
-    props.append("ro.adb.secure=1")
-    props.append("ro.debuggable=0")
+    props.set("ro.adb.secure", "1")
+    props.set("ro.debuggable", "0")
 
     # SELinux
-    props.append("ro.boot.selinux=enforcing")
-    props.append("ro.boot.veritymode=enforcing")
-    props.append("ro.build.selinux=1")
+    props.set("ro.boot.selinux", "enforcing")
+    props.set("ro.boot.veritymode", "enforcing")
+    props.set("ro.build.selinux", "1")
 
     # Device state
-    props.append("vendor.boot.vbmeta.device_state=locked")
-    props.append("ro.boot.verifiedbootstate=green")
-    props.append("ro.boot.flash.locked=1")
-    props.append("ro.boot.warranty_bit=0")
-    props.append("ro.warranty_bit=0")
-    props.append("ro.secure=1")
-    props.append("ro.vendor.boot.warranty_bit=0")
-    props.append("ro.vendor.warranty_bit=0")
-    props.append("vendor.boot.vbmeta.device_state=locked")
-    props.append("vendor.boot.verifiedbootstate=green")
+    props.set("vendor.boot.vbmeta.device_state", "locked")
+    props.set("ro.boot.verifiedbootstate", "green")
+    props.set("ro.boot.flash.locked", "1")
+    props.set("ro.boot.warranty_bit", "0")
+    props.set("ro.warranty_bit", "0")
+    props.set("ro.secure", "1")
+    props.set("ro.vendor.boot.warranty_bit", "0")
+    props.set("ro.vendor.warranty_bit", "0")
+    props.set("vendor.boot.verifiedbootstate", "green")
 
     # Build tags
-    props.append("ro.build.tags=release-keys")
-    props.append("ro.odm.build.tags=release-keys")
-    props.append("ro.system.build.tags=release-keys")
-    props.append("ro.system_ext.build.tags=release-keys")
-    props.append("ro.vendor.build.tags=release-keys")
-    props.append("ro.vendor_dlkm.build.tags=release-keys")
+    props.set("ro.build.tags", "release-keys")
+    props.set("ro.odm.build.tags", "release-keys")
+    props.set("ro.system.build.tags", "release-keys")
+    props.set("ro.system_ext.build.tags", "release-keys")
+    props.set("ro.vendor.build.tags", "release-keys")
+    props.set("ro.vendor_dlkm.build.tags", "release-keys")
 
     # AIDL radio prop
-    props.append("furios-aidl-radio.start=1")
+    props.set("furios-aidl-radio.start", "1")
 
-    egl = tools.helpers.props.host_get(args, "ro.hardware.egl")
+    egl = host_get("ro.hardware.egl")
     dri, _ = tools.helpers.gpu.getDriNode(args)
+    props.input("dri", dri)
 
+    gralloc_sources = ["hal:gralloc"]
     gralloc = find_hal("gralloc")
     if not gralloc:
-        if find_hidl("android.hardware.graphics.allocator@4.0::IAllocator/default"):
+        intf = "android.hardware.graphics.allocator@4.0::IAllocator/default"
+        gralloc_sources.append("hidl:" + intf)
+        if find_hidl(intf):
             gralloc = "android"
+    egl_sources = ["host:ro.hardware.egl"]
     if not gralloc:
+        gralloc_sources.append("dri")
+        egl_sources = gralloc_sources
         if dri:
             gralloc = "gbm"
             egl = "mesa"
         else:
             gralloc = "default"
             egl = "swiftshader"
-        props.append("debug.stagefright.ccodec=0")
-    props.append("ro.hardware.gralloc=" + gralloc)
+        props.set("debug.stagefright.ccodec", "0", gralloc_sources)
+    props.set("ro.hardware.gralloc", gralloc, gralloc_sources)
 
     if egl != "":
-        props.append("ro.hardware.egl=" + egl)
+        props.set("ro.hardware.egl", egl, egl_sources)
 
-    media_profiles = tools.helpers.props.host_get(args, "media.settings.xml")
+    media_profiles = host_get("media.settings.xml")
     if media_profiles != "":
         media_profiles = media_profiles.replace("vendor/", "vendor_extra/")
         media_profiles = media_profiles.replace("odm/", "odm_extra/")
-        props.append("media.settings.xml=" + media_profiles)
+        props.set("media.settings.xml", media_profiles, "host:media.settings.xml")
 
-    ccodec = tools.helpers.props.host_get(args, "debug.stagefright.ccodec")
+    ccodec = host_get("debug.stagefright.ccodec")
     if ccodec != "":
-        props.append("debug.stagefright.ccodec=" + ccodec)
+        props.set("debug.stagefright.ccodec", ccodec, "host:debug.stagefright.ccodec")
 
-    ext_library = tools.helpers.props.host_get(args, "ro.vendor.extension_library")
+    ext_library = host_get("ro.vendor.extension_library")
     if ext_library != "":
         ext_library = ext_library.replace("vendor/", "vendor_extra/")
         ext_library = ext_library.replace("odm/", "odm_extra/")
-        props.append("ro.vendor.extension_library=" + ext_library)
+        props.set("ro.vendor.extension_library", ext_library,
+                  "host:ro.vendor.extension_library")
 
     vulkan = find_hal("vulkan")
     if not vulkan and dri:
-        vulkan = tools.helpers.gpu.getVulkanDriver(args, os.path.basename(dri))
+        vulkan = props.input("vulkan_driver", tools.helpers.gpu.getVulkanDriver(
+            args, os.path.basename(dri)))
     if vulkan:
-        props.append("ro.hardware.vulkan=" + vulkan)
+        props.set("ro.hardware.vulkan", vulkan, ["hal:vulkan", "dri", "vulkan_driver"])
 
-    treble = tools.helpers.props.host_get(args, "ro.treble.enabled")
+    treble = host_get("ro.treble.enabled")
     if treble != "true":
         camera = find_hal("camera")
         if camera != "":
-            props.append("ro.hardware.camera=" + camera)
+            props.set("ro.hardware.camera", camera, "hal:camera")
         else:
             if args.vendor_type == "MAINLINE":
-                props.append("ro.hardware.camera=v4l2")
+                props.set("ro.hardware.camera", "v4l2", "config:vendor_type")
 
-    opengles = tools.helpers.props.host_get(args, "ro.opengles.version")
+    opengles = host_get("ro.opengles.version")
     if opengles == "":
         opengles = "196609"
-    props.append("ro.opengles.version=" + opengles)
+    props.set("ro.opengles.version", opengles, "host:ro.opengles.version")
 
-    props.append("waydroid.tools_version=" + tools.config.version)
+    props.set("waydroid.tools_version", tools.config.version, "tools_version")
 
     if args.vendor_type == "MAINLINE":
-        props.append("ro.vndk.lite=true")
+        props.set("ro.vndk.lite", "true", "config:vendor_type")
 
     for product in ["brand", "device", "manufacturer", "model", "name"]:
-        prop_product = tools.helpers.props.host_get(
-            args, "ro.product.vendor." + product)
+        prop_product = host_get("ro.product.vendor." + product)
         if prop_product != "":
-            props.append("ro.product.waydroid." + product + "=" + prop_product)
+            props.set("ro.product.waydroid." + product, prop_product,
+                      "host:ro.product.vendor." + product)
         else:
-            if os.path.isfile("/proc/device-tree/" + product):
-                with open("/proc/device-tree/" + product) as f:
-                    f_value = f.read().strip().rstrip('\x00')
+            dt_file = "/proc/device-tree/" + product
+            if os.path.isfile(dt_file):
+                with open(dt_file) as f:
+                    f_value = props.input("file:" + dt_file,
+                                          f.read().strip().rstrip('\x00'))
                     if f_value != "":
-                        props.append("ro.product.waydroid." +
-                                     product + "=" + f_value)
+                        props.set("ro.product.waydroid." + product, f_value,
+                                  "file:" + dt_file)
 
-    prop_fp = tools.helpers.props.host_get(args, "ro.vendor.build.fingerprint")
+    prop_fp = host_get("ro.vendor.build.fingerprint")
     if prop_fp != "":
-        props.append("ro.build.fingerprint=" + prop_fp)
+        props.set("ro.build.fingerprint", prop_fp, "host:ro.vendor.build.fingerprint")
 
     # now append/override with values in [properties] section of waydroid.cfg
-    cfg = tools.config.load(args)
+    cfg = tools.config.view(args)
+    props.input("config:properties", dict(cfg["properties"]))
     for k, v in cfg["properties"].items():
-        for idx, elem in enumerate(props):
-            if (k+"=") in elem:
-                props.pop(idx)
-        props.append(k+"="+v)
-
-    append_override_device_props(props)
+        props.set(k, v, "config:properties")
 
-    base_props = open(args.work + "/waydroid_base.prop", "w")
-    for prop in props:
-        base_props.write(prop + "\n")
-    base_props.close()
+    append_override_device_props()
 
+    return props
 
-def setup_host_perms(args):
-    if not os.path.exists(tools.config.defaults["host_perms"]):
-        os.mkdir(tools.config.defaults["host_perms"])
-
+def host_perms_list(args):
+    """ :returns: the host permission files to copy into the container """
     treble = tools.helpers.props.host_get(args, "ro.treble.enabled")
     if treble != "true":
-        return
+        return []
 
     sku = tools.helpers.props.host_get(args, "ro.boot.product.hardware.sku")
     copy_list = []
@@ -414,7 +545,20 @@ def setup_host_perms(args):
             copy_list.append(
                 "/odm/etc/permissions/sku_{}/android.hardware.consumerir.xml".format(sku))
 
-    for filename in copy_list:
+    return copy_list
+
+def host_perms_inputs(args):
+    inputs = {}
+    for filename in host_perms_list(args):
+        st = os.stat(filename)
+        inputs[filename] = [st.st_mtime_ns, st.st_size]
+    return inputs
+
+def setup_host_perms(args):
+    if not os.path.exists(tools.config.defaults["host_perms"]):
+        os.mkdir(tools.config.defaults["host_perms"])
+
+    for filename in host_perms_list(args):
         shutil.copy(filename, tools.config.defaults["host_perms"])
 
 def status(args):
@@ -425,6 +569,10 @@ def status(args):
         logging.info("Couldn't get LXC status. Assuming STOPPED.")
         return "STOPPED"
 
+def init_pid(args):
+    command = ["lxc-info", "-P", tools.config.defaults["lxc"], "-n", "waydroid", "-pH"]
+    return int(tools.helpers.run.user(args, command, output_return=True).strip())
+
 def wait_for_running(args):
     lxc_status = status(args)
     timeout = 10
@@ -441,7 +589,8 @@ def start(args):
     command = ["lxc-start", "-P", tools.config.defaults["lxc"],
                "-F", "-n", "waydroid", "--", "/init"]
     tools.helpers.run.user(args, command, output="background")
-    wait_for_running(args)
+    with tools.helpers.trace.span("wait_for_running"):
+        wait_for_running(args)
     # Workaround lxc-start changing stdout/stderr permissions to 700
     os.chmod(args.log, 0o666)
 
@@ -2,10 +2,36 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import concurrent.futures
+import errno
+import logging
 import os
+import tools.helpers.fileops
+import tools.helpers.mount_api
 import tools.helpers.run
 from tools.helpers.version import versiontuple, kernel_version
 
+# "syscall": mount through tools.helpers.mount_api and fall back to mount(8)
+# when that fails, "mount": always run mount(8)
+backend = "syscall"
+
+def mount_syscall(cmd, call, *params):
+    """
+    Try a tools.helpers.mount_api call when the syscall backend is enabled.
+    :param cmd: the equivalent mount(8) command, for the log
+    :returns: True when it succeeded, False when mount(8) needs to be used
+    """
+    if backend != "syscall":
+        return False
+    try:
+        call(*params)
+    except OSError as e:
+        logging.debug("Mount syscall failed ({}), using mount(8)".format(e))
+        return False
+    # run.user() logs the command when mount(8) is used instead
+    logging.debug("% " + " ".join(cmd))
+    return True
+
 def ismount(folder):
     """
     Ismount() implementation, that works for mount --bind.
@@ -38,13 +64,16 @@ def bind(args, source, destination, create_folders=True, umount=False):
         if os.path.exists(path):
             continue
         if create_folders:
-            tools.helpers.run.user(args, ["mkdir", "-p", path])
+            tools.helpers.fileops.makedirs(path)
         else:
             raise RuntimeError("Mount failed, folder does not exist: " +
                                path)
 
     # Actually mount the folder
-    tools.helpers.run.user(args, ["mount", "-o", "bind", source, destination])
+    cmd = ["mount", "-o", "bind", source, destination]
+    if mount_syscall(cmd, tools.helpers.mount_api.bind, source, destination):
+        return
+    tools.helpers.run.user(args, cmd)
 
     # Verify, that it has worked
     if not ismount(destination):
@@ -64,13 +93,15 @@ def bind_file(args, source, destination, create_folders=False):
         if create_folders:
             dir = os.path.dirname(destination)
             if not os.path.isdir(dir):
-                tools.helpers.run.user(args, ["mkdir", "-p", dir])
+                tools.helpers.fileops.makedirs(dir)
 
-        tools.helpers.run.user(args, ["touch", destination])
+        tools.helpers.fileops.touch(destination)
 
     # Mount
-    tools.helpers.run.user(args, ["mount", "-o", "bind", source,
-                                destination])
+    cmd = ["mount", "-o", "bind", source, destination]
+    if mount_syscall(cmd, tools.helpers.mount_api.bind, source, destination):
+        return
+    tools.helpers.run.user(args, cmd)
 
 def umount_all_list(prefix, source="/proc/mounts"):
     """
@@ -96,16 +127,70 @@ def umount_all_list(prefix, source="/proc/mounts"):
     ret.sort(reverse=True)
     return ret
 
+def umount_one(args, mountpoint, count):
+    """
+    Umount a mountpoint count times (once per stacked mount) with
+    umount2(2). Busy mounts are detached lazily, so a process keeping a file
+    open in there can't make the teardown fail.
+    """
+    for _ in range(count):
+        try:
+            tools.helpers.mount_api.umount(mountpoint)
+            logging.debug("% umount " + mountpoint)
+            continue
+        except OSError as e:
+            if e.errno == errno.EINVAL:
+                # Not mounted (anymore)
+                return
+            if e.errno != errno.EBUSY:
+                logging.debug("umount2 failed ({}), using umount(8)".format(e))
+                tools.helpers.run.user(args, ["umount", mountpoint])
+                continue
+        logging.warning("{} is busy, detaching it lazily".format(mountpoint))
+        tools.helpers.mount_api.umount(mountpoint,
+                                       tools.helpers.mount_api.MNT_DETACH)
+        logging.debug("% umount -l " + mountpoint)
+
+def umount_tree(args, all_list):
+    """
+    Umount a list of mountpoints from umount_all_list() leaf first. All
+    mountpoints at the same depth of the mount tree are independent of each
+    other, so they get umounted in parallel.
+    """
+    counts = {}
+    for mountpoint in all_list:
+        counts[mountpoint] = counts.get(mountpoint, 0) + 1
+
+    # Depth: number of other mountpoints in the list above a mountpoint
+    levels = {}
+    for mountpoint in counts:
+        depth = sum(1 for other in counts if other != mountpoint and
+                    mountpoint.startswith(other.rstrip("/") + "/"))
+        levels.setdefault(depth, []).append(mountpoint)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        for depth in sorted(levels, reverse=True):
+            futures = [executor.submit(umount_one, args, mountpoint,
+                                       counts[mountpoint])
+                       for mountpoint in levels[depth]]
+            for future in futures:
+                future.result()
+
 def umount_all(args, folder):
     """
     Umount all folders, that are mounted inside a given folder.
     """
     all_list = umount_all_list(folder)
-    for mountpoint in all_list:
-        tools.helpers.run.user(args, ["umount", mountpoint])
-    for mountpoint in all_list:
-        if ismount(mountpoint):
-            raise RuntimeError("Failed to umount: " + mountpoint)
+    if backend == "syscall":
+        umount_tree(args, all_list)
+    else:
+        for mountpoint in all_list:
+            tools.helpers.run.user(args, ["umount", mountpoint])
+
+    # Verify in a single pass over the mount table
+    left = umount_all_list(folder)
+    if left:
+        raise RuntimeError("Failed to umount: " + left[0])
 
 def mount(args, source, destination, create_folders=True, umount=False,
           readonly=True, mount_type=None, options=None, force=True):
@@ -125,7 +210,7 @@ def mount(args, source, destination, create_folders=True, umount=False,
     # Check/create folders
     if not os.path.exists(destination):
         if create_folders:
-            tools.helpers.run.user(args, ["mkdir", "-p", destination])
+            tools.helpers.fileops.makedirs(destination)
         else:
             raise RuntimeError("Mount failed, folder does not exist: " +
                             destination)
@@ -141,8 +226,13 @@ def mount(args, source, destination, create_folders=True, umount=False,
     if opt_args:
         extra_args.extend(["-o", ",".join(opt_args)])
 
-    # Actually mount the folder
-    tools.helpers.run.user(args, ["mount", *extra_args, source, destination])
+    # Actually mount the folder. The syscall either mounted it or raised, so
+    # there's no need to verify it in /proc/mounts.
+    cmd = ["mount", *extra_args, source, destination]
+    if mount_syscall(cmd, tools.helpers.mount_api.mount, source, destination,
+                     mount_type, options, readonly):
+        return
+    tools.helpers.run.user(args, cmd)
 
     # Verify, that it has worked
     if not ismount(destination):
@@ -168,7 +258,7 @@ def mount_overlay(args, lower_dirs, destination, upper_dir=None, work_dir=None,
     for dir_path in dirs:
         if not os.path.exists(dir_path):
             if create_folders:
-                tools.helpers.run.user(args, ["mkdir", "-p", dir_path])
+                tools.helpers.fileops.makedirs(dir_path)
             else:
                 raise RuntimeError("Mount failed, folder does not exist: " +
                                    dir_path)
@@ -0,0 +1,202 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import ctypes
+import errno
+import os
+import threading
+import tools.helpers.loop
+
+""" ctypes mount backend for tools.helpers.mount. Filesystems are mounted
+    with the new mount API (fsopen/fsconfig/fsmount/move_mount, Linux 5.2),
+    bind mounts with open_tree/move_mount, and mount(2) is used when the
+    kernel doesn't have those. Every function raises OSError on failure, so
+    a successful return means the mount is in place. """
+
+# The new mount API syscalls have the same numbers on all architectures
+# waydroid runs on
+SYS_open_tree = 428
+SYS_move_mount = 429
+SYS_fsopen = 430
+SYS_fsconfig = 431
+SYS_fsmount = 432
+
+AT_FDCWD = -100
+AT_RECURSIVE = 0x8000
+OPEN_TREE_CLONE = 1
+OPEN_TREE_CLOEXEC = os.O_CLOEXEC
+MOVE_MOUNT_F_EMPTY_PATH = 0x00000004
+FSOPEN_CLOEXEC = 1
+FSMOUNT_CLOEXEC = 1
+FSCONFIG_SET_FLAG = 0
+FSCONFIG_SET_STRING = 1
+FSCONFIG_CMD_CREATE = 6
+MOUNT_ATTR_RDONLY = 0x00000001
+
+MS_RDONLY = 1
+MS_REMOUNT = 32
+MS_BIND = 4096
+MS_REC = 16384
+
+MNT_DETACH = 2
+
+CLONE_FS = 0x00000200
+CLONE_NEWNS = 0x00020000
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc.syscall.restype = ctypes.c_long
+libc.mount.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p,
+                       ctypes.c_ulong, ctypes.c_char_p]
+libc.umount2.argtypes = [ctypes.c_char_p, ctypes.c_int]
+libc.setns.argtypes = [ctypes.c_int, ctypes.c_int]
+libc.unshare.argtypes = [ctypes.c_int]
+
+# Set once the kernel told us it doesn't know the new mount API
+new_api_unsupported = False
+
+def check(ret, *filenames):
+    if ret < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err), *filenames)
+    return ret
+
+def syscall(number, *args):
+    global new_api_unsupported
+    ret = libc.syscall(ctypes.c_long(number), *args)
+    if ret < 0 and ctypes.get_errno() == errno.ENOSYS:
+        new_api_unsupported = True
+    return ret
+
+def encode(value):
+    return value.encode() if value is not None else None
+
+def sys_mount(source, target, fs_type, flags, data=None):
+    check(libc.mount(encode(source), encode(target), encode(fs_type), flags,
+                     encode(data)), target)
+
+def move_mount(fd, target):
+    check(syscall(SYS_move_mount, ctypes.c_int(fd), b"", ctypes.c_int(AT_FDCWD),
+                  encode(target), ctypes.c_uint(MOVE_MOUNT_F_EMPTY_PATH)),
+          target)
+
+def fs_mount(fs_type, source, target, options, readonly):
+    """ Mount a filesystem with fsopen/fsconfig/fsmount/move_mount """
+    fs_fd = check(syscall(SYS_fsopen, encode(fs_type),
+                          ctypes.c_uint(FSOPEN_CLOEXEC)), target)
+    try:
+        def config(cmd, key=None, value=None):
+            check(syscall(SYS_fsconfig, ctypes.c_int(fs_fd), ctypes.c_uint(cmd),
+                          encode(key), encode(value), ctypes.c_int(0)),
+                  target)
+
+        if source is not None:
+            config(FSCONFIG_SET_STRING, "source", source)
+        if readonly:
+            config(FSCONFIG_SET_FLAG, "ro")
+        for option in options:
+            key, sep, value = option.partition("=")
+            if sep:
+                config(FSCONFIG_SET_STRING, key, value)
+            else:
+                config(FSCONFIG_SET_FLAG, key)
+        config(FSCONFIG_CMD_CREATE)
+
+        mnt_fd = check(syscall(SYS_fsmount, ctypes.c_int(fs_fd),
+                               ctypes.c_uint(FSMOUNT_CLOEXEC),
+                               ctypes.c_uint(MOUNT_ATTR_RDONLY if readonly else 0)),
+                       target)
+        try:
+            move_mount(mnt_fd, target)
+        finally:
+            os.close(mnt_fd)
+    finally:
+        os.close(fs_fd)
+
+def mount(source, target, fs_type=None, options=None, readonly=True):
+    """
+    Mount a filesystem, or an image file through a loop device (the type of
+    the image is detected if fs_type is None).
+    """
+    options = options or []
+    loop_fd = None
+    if os.path.isfile(source):
+        if fs_type is None:
+            fs_type = tools.helpers.loop.detect_fs(source)
+            if fs_type is None:
+                raise OSError(errno.EINVAL, "Unknown filesystem", source)
+        source, loop_fd = tools.helpers.loop.attach(source, readonly=readonly)
+    elif fs_type is None:
+        raise OSError(errno.EINVAL, "Unknown filesystem", source)
+
+    try:
+        if not new_api_unsupported:
+            try:
+                fs_mount(fs_type, source, target, options, readonly)
+                return
+            except OSError:
+                if not new_api_unsupported:
+                    raise
+        sys_mount(source, target, fs_type, MS_RDONLY if readonly else 0,
+                  ",".join(options) or None)
+    finally:
+        if loop_fd is not None:
+            os.close(loop_fd)
+
+def open_tree(source, recursive=False):
+    """
+    :returns: fd of a detached copy of the mount tree at source, which
+              move_mount() can attach anywhere, even in another mount
+              namespace
+    """
+    flags = OPEN_TREE_CLONE | OPEN_TREE_CLOEXEC
+    if recursive:
+        flags |= AT_RECURSIVE
+    return check(syscall(SYS_open_tree, ctypes.c_int(AT_FDCWD), encode(source),
+                         ctypes.c_uint(flags)), source)
+
+def bind(source, target, recursive=False):
+    """ mount --bind, or --rbind with recursive=True """
+    if not new_api_unsupported:
+        try:
+            tree_fd = open_tree(source, recursive)
+        except OSError:
+            if not new_api_unsupported:
+                raise
+        else:
+            try:
+                move_mount(tree_fd, target)
+            finally:
+                os.close(tree_fd)
+            return
+    sys_mount(source, target, None, MS_BIND | (MS_REC if recursive else 0))
+
+def in_mount_namespace(pid, func, *params):
+    """
+    Run func(*params) in the mount namespace of the process pid, e.g. the
+    container's init. This happens on a short lived thread: setns(2) only
+    switches the calling thread, once it stopped sharing its root and cwd
+    with the others (unshare(CLONE_FS)).
+    """
+    errors = []
+    def run():
+        try:
+            ns_fd = os.open("/proc/{}/ns/mnt".format(pid),
+                            os.O_RDONLY | os.O_CLOEXEC)
+            try:
+                check(libc.unshare(CLONE_FS))
+                check(libc.setns(ns_fd, CLONE_NEWNS))
+            finally:
+                os.close(ns_fd)
+            func(*params)
+        except OSError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, name="setns")
+    thread.start()
+    thread.join()
+    if errors:
+        raise errors[0]
+
+def umount(target, flags=0):
+    """ umount2(2), flags=MNT_DETACH is umount -l """
+    check(libc.umount2(encode(target), flags), target)
@@ -3,9 +3,50 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from shutil import which
+import tools.config
 import tools.helpers.run
 import logging
+import os
+import pwd
 import re
+import socket
+import struct
+import time
+
+# Set to "script" to always set up the network with waydroid-net.sh
+backend = "native"
+
+# Same values as in waydroid-net.sh, which still tears the network down
+BRIDGE = "waydroid0"
+BRIDGE_MAC = "00:16:3e:00:00:01"
+BRIDGE_ADDR = "192.168.240.1"
+BRIDGE_PREFIX = 24
+BRIDGE_BROADCAST = "192.168.240.255"
+NETWORK = "192.168.240.0/24"
+DHCP_RANGE = "192.168.240.2,192.168.240.254"
+DHCP_MAX = "253"
+VARRUN = "/run/waydroid-lxc"
+NETWORK_UP = VARRUN + "/network_up"
+DNSMASQ_PID = VARRUN + "/dnsmasq.pid"
+LEASES_DIR = "/var/lib/misc"
+
+# linux/rtnetlink.h, linux/if_link.h, linux/if_addr.h
+NETLINK_ROUTE = 0
+NLMSG_ERROR = 2
+RTM_NEWLINK = 16
+RTM_NEWADDR = 20
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_LINKINFO = 18
+IFLA_INFO_KIND = 1
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_BROADCAST = 4
+IFF_UP = 0x1
 
 def adb_connect(args):
     """
@@ -36,3 +77,193 @@ def get_device_ip_address():
             return re.search(r"(\d{1,3}\.){3}\d{1,3}\s", f.read()).group().strip()
     except:
         pass
+
+def net_script():
+    return tools.config.tools_src + "/data/scripts/waydroid-net.sh"
+
+def rtattr(kind, data):
+    length = 4 + len(data)
+    return struct.pack("HH", length, kind) + data + b"\0" * (-length % 4)
+
+def rtnl_request(sock, msg_type, flags, payload):
+    """
+    Send one rtnetlink request and wait for its acknowledgement.
+
+    :raises OSError: with the errno the kernel answered with
+    """
+    header = struct.pack("IHHII", 16 + len(payload), msg_type,
+                         NLM_F_REQUEST | NLM_F_ACK | flags, 1, 0)
+    sock.send(header + payload)
+    reply = sock.recv(4096)
+    if struct.unpack_from("H", reply, 4)[0] == NLMSG_ERROR:
+        error = -struct.unpack_from("i", reply, 16)[0]
+        if error:
+            raise OSError(error, os.strerror(error))
+
+def lxc_link():
+    """ :returns: the host side interface of the container's network """
+    try:
+        with open(tools.config.defaults["lxc"] + "/waydroid/config") as handle:
+            for line in handle:
+                key, _, value = line.partition("=")
+                if key.strip() in ["lxc.net.0.link", "lxc.network.link"]:
+                    return value.strip()
+    except FileNotFoundError:
+        pass
+    return BRIDGE
+
+def is_configured():
+    """
+    :returns: True when the bridge is up and dnsmasq serves it. The NAT rules
+              are applied in one batch before NETWORK_UP gets written, so
+              they are there too.
+    """
+    if not os.path.exists(NETWORK_UP):
+        return False
+    try:
+        with open("/sys/class/net/" + BRIDGE + "/flags") as handle:
+            if not int(handle.read(), 16) & IFF_UP:
+                return False
+        with open(DNSMASQ_PID) as handle:
+            os.kill(int(handle.read()), 0)
+    except (OSError, ValueError):
+        return False
+    return True
+
+def create_bridge():
+    mac = bytes.fromhex(BRIDGE_MAC.replace(":", ""))
+    address = socket.inet_aton(BRIDGE_ADDR)
+    broadcast = socket.inet_aton(BRIDGE_BROADCAST)
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                       NETLINK_ROUTE) as sock:
+        sock.bind((0, 0))
+
+        logging.debug("% ip link add dev {} address {} type bridge".format(
+            BRIDGE, BRIDGE_MAC))
+        ifinfo = struct.pack("BxHiII", socket.AF_UNSPEC, 0, 0, 0, 0)
+        rtnl_request(sock, RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL,
+                     ifinfo + rtattr(IFLA_IFNAME, BRIDGE.encode() + b"\0") +
+                     rtattr(IFLA_ADDRESS, mac) +
+                     rtattr(IFLA_LINKINFO,
+                            rtattr(IFLA_INFO_KIND, b"bridge")))
+        index = socket.if_nametoindex(BRIDGE)
+
+        write_sysctl("/proc/sys/net/ipv4/ip_forward", "1")
+        try:
+            write_sysctl("/proc/sys/net/ipv6/conf/" + BRIDGE + "/accept_dad",
+                         "0")
+        except OSError:
+            pass
+
+        logging.debug("% ip addr add {}/{} broadcast + dev {}".format(
+            BRIDGE_ADDR, BRIDGE_PREFIX, BRIDGE))
+        ifaddr = struct.pack("BBBBI", socket.AF_INET, BRIDGE_PREFIX, 0, 0,
+                             index)
+        rtnl_request(sock, RTM_NEWADDR, NLM_F_CREATE | NLM_F_EXCL,
+                     ifaddr + rtattr(IFA_LOCAL, address) +
+                     rtattr(IFA_ADDRESS, address) +
+                     rtattr(IFA_BROADCAST, broadcast))
+
+        logging.debug("% ip link set dev {} up".format(BRIDGE))
+        ifinfo = struct.pack("BxHiII", socket.AF_UNSPEC, 0, index, IFF_UP,
+                             IFF_UP)
+        rtnl_request(sock, RTM_NEWLINK, 0, ifinfo)
+
+def write_sysctl(path, value):
+    logging.debug("% echo {} > {}".format(value, path))
+    with open(path, "w") as handle:
+        handle.write(value)
+
+def nat_rules():
+    """
+    :returns: the rules waydroid-net.sh adds one iptables call at a time, as
+              input for iptables-restore --noflush
+    """
+    return "\n".join([
+        "*filter",
+        "-I INPUT -i {} -p udp --dport 67 -j ACCEPT".format(BRIDGE),
+        "-I INPUT -i {} -p tcp --dport 67 -j ACCEPT".format(BRIDGE),
+        "-I INPUT -i {} -p udp --dport 53 -j ACCEPT".format(BRIDGE),
+        "-I INPUT -i {} -p tcp --dport 53 -j ACCEPT".format(BRIDGE),
+        "-I FORWARD -i {} -j ACCEPT".format(BRIDGE),
+        "-I FORWARD -o {} -j ACCEPT".format(BRIDGE),
+        "COMMIT",
+        "*nat",
+        "-A POSTROUTING -s {0} ! -d {0} -j MASQUERADE".format(NETWORK),
+        "COMMIT",
+        "*mangle",
+        "-A POSTROUTING -o {} -p udp -m udp --dport 68 -j CHECKSUM"
+        " --checksum-fill".format(BRIDGE),
+        "COMMIT",
+        ""])
+
+def apply_nat_rules(args):
+    # waydroid-net.sh prefers the legacy backend, so stop finds the rules
+    iptables = which("iptables-legacy") or which("iptables")
+    if not iptables or not which(os.path.basename(iptables) + "-restore"):
+        raise RuntimeError("iptables-restore not found")
+    rules = VARRUN + "/iptables.rules"
+    with open(rules, "w") as handle:
+        handle.write(nat_rules())
+    tools.helpers.run.user(args, [os.path.basename(iptables) + "-restore",
+                                  "-w", "--noflush", rules])
+
+def start_dnsmasq(args):
+    for user in ["lxc-dnsmasq", "dnsmasq", "nobody"]:
+        try:
+            pwd.getpwnam(user)
+            break
+        except KeyError:
+            pass
+    os.makedirs(LEASES_DIR, exist_ok=True)
+    tools.helpers.run.user(args, [
+        "dnsmasq", "--conf-file=/dev/null", "-u", user,
+        "--strict-order", "--bind-interfaces", "--pid-file=" + DNSMASQ_PID,
+        "--listen-address", BRIDGE_ADDR, "--dhcp-range", DHCP_RANGE,
+        "--dhcp-lease-max=" + DHCP_MAX, "--dhcp-no-override",
+        "--except-interface=lo", "--interface=" + BRIDGE,
+        "--dhcp-leasefile=" + LEASES_DIR + "/dnsmasq." + BRIDGE + ".leases",
+        "--dhcp-authoritative"])
+
+def setup_bridge(args):
+    """
+    Do what waydroid-net.sh start does: create the bridge through rtnetlink,
+    apply the NAT rules in a single iptables-restore and start dnsmasq.
+    """
+    vnic = lxc_link()
+    if vnic != BRIDGE:
+        logging.debug("vnic is {}, not setting up {}".format(vnic, BRIDGE))
+        return
+    if is_configured():
+        logging.debug("waydroid-net is already running")
+        return
+    if os.path.exists(NETWORK_UP):
+        # e.g. dnsmasq died, tear the rest down before starting over
+        tools.helpers.run.user(args, [net_script(), "stop"], check=False)
+    if os.path.exists("/sys/class/net/" + BRIDGE):
+        raise RuntimeError(BRIDGE + " is left over from an earlier session")
+
+    if not os.path.isdir(VARRUN):
+        os.makedirs(VARRUN)
+        if which("restorecon"):
+            tools.helpers.run.user(args, ["restorecon", VARRUN])
+    create_bridge()
+    apply_nat_rules(args)
+    start_dnsmasq(args)
+    open(NETWORK_UP, "w").close()
+
+def start_network(args):
+    """
+    Set up the container's network, through waydroid-net.sh if that fails.
+    """
+    if backend == "native":
+        start = time.monotonic()
+        try:
+            setup_bridge(args)
+            logging.debug("Network setup took {:.1f} ms".format(
+                (time.monotonic() - start) * 1000))
+            return
+        except (OSError, RuntimeError) as e:
+            logging.warning("Setting up the network failed ({}), retrying"
+                            " with waydroid-net.sh".format(e))
+    tools.helpers.run.user(args, [net_script(), "start"])
@@ -0,0 +1,172 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import ctypes
+import json
+import logging
+import os
+import re
+import threading
+import tools.helpers.fileops
+import tools.helpers.trace
+
+"""
+Profile-guided prefetching of the Android images. After a boot finished,
+record() samples which pages of system.img and vendor.img are in the page
+cache (with mincore(2)) and stores them as a list of extents. The next
+mount_rootfs() hands those extents to the kernel with
+posix_fadvise(WILLNEED) in offset order from a background thread, so boot
+doesn't wait for the same random reads one by one.
+
+A profile belongs to exact images (inode, mtime and size), after an image
+upgrade it is recorded again on the next boot. The page cache of the
+images is dropped before such a boot, so the profile only contains what
+Android actually read.
+"""
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+# Resident ranges less than this far apart are merged into one extent
+MERGE_GAP = 64 * 1024
+
+PROT_READ = 1
+MAP_SHARED = 1
+MAP_FAILED = ctypes.c_void_p(-1).value
+
+libc = ctypes.CDLL(None, use_errno=True)
+libc.mmap.restype = ctypes.c_void_p
+libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int,
+                      ctypes.c_int, ctypes.c_int, ctypes.c_long]
+libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t,
+                         ctypes.POINTER(ctypes.c_ubyte)]
+
+# mincore() sets the lowest bit of resident pages, the others are reserved
+RESIDENT = bytes(i & 1 for i in range(256))
+
+def profile_path(args):
+    return args.work + "/boot_profile.json"
+
+def image_key(path):
+    st = os.stat(path)
+    return {"inode": st.st_ino, "mtime": st.st_mtime_ns, "size": st.st_size}
+
+def load(args):
+    try:
+        with open(profile_path(args)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+def is_current(profile, images):
+    """ :returns: True when profile was recorded for exactly these images """
+    try:
+        return all(profile.get(image, {}).get("key") == image_key(image)
+                   for image in images)
+    except OSError:
+        return False
+
+def resident_extents(path):
+    """
+    :returns: list of [offset, length] of the parts of a file that are in
+              the page cache
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        addr = libc.mmap(None, size, PROT_READ, MAP_SHARED, fd, 0)
+        if addr == MAP_FAILED:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        try:
+            pages = (size + PAGE_SIZE - 1) // PAGE_SIZE
+            vec = (ctypes.c_ubyte * pages)()
+            if libc.mincore(addr, size, vec) != 0:
+                err = ctypes.get_errno()
+                raise OSError(err, os.strerror(err), path)
+        finally:
+            libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+
+    extents = []
+    resident = bytes(vec).translate(RESIDENT)
+    for match in re.finditer(b"\x01+", resident):
+        offset = match.start() * PAGE_SIZE
+        end = min(match.end() * PAGE_SIZE, size)
+        if extents and offset - sum(extents[-1]) <= MERGE_GAP:
+            extents[-1][1] = end - extents[-1][0]
+        else:
+            extents.append([offset, end - offset])
+    return extents
+
+def record(args, images):
+    """ Store the resident parts of images as the boot profile. """
+    profile = {}
+    for image in images:
+        extents = resident_extents(image)
+        profile[image] = {"key": image_key(image), "extents": extents}
+        logging.info("Boot profile of {}: {} extents, {} MiB".format(
+            image, len(extents), sum(e[1] for e in extents) >> 20))
+    tools.helpers.fileops.atomic_write(profile_path(args),
+                                       json.dumps(profile) + "\n")
+
+def drop_cache(images):
+    """ Evict images from the page cache, so the next record() is exact """
+    for image in images:
+        fd = os.open(image, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+def prefetch_worker(profile, images, budget, trace_path):
+    start = tools.helpers.trace.now_us()
+    total = 0
+    for image in images:
+        fd = os.open(image, os.O_RDONLY | os.O_CLOEXEC)
+        try:
+            for offset, length in sorted(profile[image]["extents"]):
+                length = min(length, budget - total)
+                if length <= 0:
+                    break
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+                total += length
+        finally:
+            os.close(fd)
+    logging.debug("Prefetched {} MiB of the images in {:.1f} ms".format(
+        total >> 20, (tools.helpers.trace.now_us() - start) / 1000))
+    tools.helpers.trace.add_event("prefetch images", start,
+                                  tools.helpers.trace.now_us(),
+                                  args={"bytes": total}, path=trace_path)
+
+def start(args, images, budget_mb):
+    """
+    Prefetch the images according to the boot profile in the background,
+    at most budget_mb MiB. When there's no profile for these images, prepare
+    recording a new one instead.
+
+    :returns: True when the profile needs to be recorded after this boot
+    """
+    profile = load(args)
+    if not is_current(profile, images):
+        logging.info("No boot profile for the current images, recording one"
+                     " during this boot")
+        drop_cache(images)
+        return True
+
+    thread = threading.Thread(target=prefetch_worker, name="prefetch",
+                              args=(profile, images, budget_mb << 20,
+                                    tools.helpers.trace.current),
+                              daemon=True)
+    thread.start()
+    return False
+
+def reset(args):
+    """ Remove the boot profile, the next boot records a new one. """
+    try:
+        os.unlink(profile_path(args))
+        return True
+    except FileNotFoundError:
+        return False
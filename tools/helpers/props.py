@@ -4,24 +4,184 @@
 
 from shutil import which
 import subprocess
+import hashlib
+import json
 import logging
 import os
+import re
+import tools.helpers.fileops
 import tools.helpers.run
-from tools.interfaces import IPlatform
 
-def host_get(args, prop):
+class PropertyMap:
+    """
+    Properties in the order they get written, together with the source of
+    every value and the inputs (host props, config values, device files...)
+    they were generated from. Setting a key again replaces its value and
+    moves it to the end, like a later line in a .prop file overrides an
+    earlier one.
+    """
+    def __init__(self):
+        self.values = {}
+        self.sources = {}
+        self.inputs = {}
+
+    def input(self, name, value):
+        """ Record an input of the generation and return its value. """
+        self.inputs[name] = value
+        return value
+
+    def set(self, key, value, source="static"):
+        """
+        :param source: name of the input the value comes from, or a list
+                       of them
+        """
+        self.values.pop(key, None)
+        self.values[key] = value
+        self.sources[key] = source
+
+    def update(self, lines, source):
+        """ Set all key=value lines, e.g. of a .prop file """
+        for line in lines:
+            line = line.strip()
+            if not line or line[0] == "#":
+                continue
+            key, sep, value = line.partition("=")
+            if sep:
+                self.set(key, value, source)
+
+    def fingerprint(self):
+        return hashlib.sha256(json.dumps(
+            self.inputs, sort_keys=True).encode()).hexdigest()
+
+    def text(self):
+        return "".join(k + "=" + v + "\n" for k, v in self.values.items())
+
+    def write(self, path):
+        """
+        Write the properties to path and what they were generated from to
+        the path.json sidecar, unless the inputs are the same as last time
+        and path wasn't touched since.
+
+        :returns: True when path was written
+        """
+        fingerprint = self.fingerprint()
+        previous = load_sidecar(path)
+        text = self.text()
+        if self.is_written(path, previous):
+            logging.debug("{} is up to date".format(path))
+            return False
+
+        sidecar = {
+            "fingerprint": fingerprint,
+            "sha256": hashlib.sha256(text.encode()).hexdigest(),
+            "inputs": self.inputs,
+            "sources": self.sources,
+            "values": self.values,
+        }
+        if previous.get("fingerprint") not in [None, fingerprint]:
+            previous.pop("previous", None)
+            sidecar["previous"] = previous
+        elif "previous" in previous:
+            sidecar["previous"] = previous["previous"]
+        tools.helpers.fileops.atomic_write(path, text, 0o644)
+        tools.helpers.fileops.atomic_write(
+            path + ".json", json.dumps(sidecar, indent=1) + "\n", 0o644)
+        return True
+
+    def is_written(self, path, sidecar=None):
+        """
+        :returns: True when path was written from the same inputs and
+                  wasn't touched since
+        """
+        if sidecar is None:
+            sidecar = load_sidecar(path)
+        if sidecar.get("fingerprint") != self.fingerprint():
+            return False
+        try:
+            with open(path, "rb") as handle:
+                return hashlib.sha256(handle.read()).hexdigest() == \
+                    sidecar.get("sha256")
+        except FileNotFoundError:
+            return False
+
+def load_sidecar(path):
+    """ :returns: the path.json sidecar written by PropertyMap.write() """
+    try:
+        with open(path + ".json") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+def diff_sidecar(sidecar):
+    """
+    Compare the last generation of a .prop file with the one before.
+
+    :returns: list of (input, old value, new value, changed keys) with
+              changed keys as a list of (key, old value, new value). Keys
+              that changed without a changed input are listed under the
+              input None.
+    """
+    previous = sidecar.get("previous")
+    if not previous:
+        return []
+    old_values = previous.get("values", {})
+    new_values = sidecar.get("values", {})
+    old_inputs = previous.get("inputs", {})
+    new_inputs = sidecar.get("inputs", {})
+
+    changed_inputs = [name for name in {**old_inputs, **new_inputs}
+                      if old_inputs.get(name) != new_inputs.get(name)]
+    changed_keys = [key for key in {**old_values, **new_values}
+                    if old_values.get(key) != new_values.get(key)]
+
+    def sources(key):
+        source = sidecar.get("sources", {}).get(key) or \
+            previous.get("sources", {}).get(key)
+        return source if isinstance(source, list) else [source]
+
+    ret = []
+    attributed = []
+    for name in changed_inputs:
+        keys = [(key, old_values.get(key), new_values.get(key))
+                for key in changed_keys if name in sources(key)]
+        attributed.extend(key for key, _, _ in keys)
+        ret.append((name, old_inputs.get(name), new_inputs.get(name), keys))
+    rest = [(key, old_values.get(key), new_values.get(key))
+            for key in changed_keys if key not in attributed]
+    if rest:
+        ret.append((None, None, None, rest))
+    return ret
+
+# "[key]: [value]" lines of getprop, values may span several lines
+GETPROP_LINE = re.compile(r"^\[(.+?)\]: \[(.*?)\]$", re.MULTILINE | re.DOTALL)
+
+def host_props(args):
+    """
+    :returns: dict of all host properties. getprop runs once per command,
+              the result is kept in args.cache["host_props"].
+    """
+    if "host_props" in args.cache:
+        return args.cache["host_props"]
+    props = {}
     if which("getprop") is not None:
-        command = ["getprop", prop]
-        return subprocess.run(command, stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
-    else:
-        return ""
+        output = subprocess.run(["getprop"], stdout=subprocess.PIPE).stdout
+        for match in GETPROP_LINE.finditer(output.decode("utf-8", "replace")):
+            props[match.group(1)] = match.group(2).strip()
+    args.cache["host_props"] = props
+    return props
+
+def host_get(args, prop):
+    return host_props(args).get(prop, "")
 
 def host_set(args, prop, value):
     if which("setprop") is not None:
         command = ["setprop", prop, value]
         tools.helpers.run.user(args, command)
+        if "host_props" in args.cache:
+            args.cache["host_props"][prop] = value
 
 def get(args, prop):
+    from tools.interfaces import IPlatform
     platformService = IPlatform.get_service(args)
     if platformService:
         return platformService.getprop(prop, "")
@@ -29,6 +189,7 @@ def get(args, prop):
         logging.error("Failed to access IPlatform service")
 
 def set(args, prop, value):
+    from tools.interfaces import IPlatform
     platformService = IPlatform.get_service(args)
     if platformService:
         platformService.setprop(prop, value)
@@ -7,7 +7,6 @@ import logging
 
 # Call me with rootfs mounted!
 def set_aidl_version(args):
-    cfg = tools.config.load(args)
     android_api = 0
     try:
         android_api = int(helpers.props.file_get(args,
@@ -29,6 +28,12 @@ def set_aidl_version(args):
         binder_protocol = "aidl3"
         sm_protocol =     "aidl4"
 
+    current = tools.config.view(args)["waydroid"]
+    if current.get("binder_protocol") == binder_protocol and \
+            current.get("service_manager_protocol") == sm_protocol:
+        return
+
+    cfg = tools.config.load(args)
     cfg["waydroid"]["binder_protocol"] = binder_protocol
     cfg["waydroid"]["service_manager_protocol"] = sm_protocol
     tools.config.save(args, cfg)
@@ -5,11 +5,13 @@
 import fcntl
 import logging
 import selectors
+import signal
 import subprocess
 import sys
 import threading
 import time
 import os
+import tools.helpers.logging
 import tools.helpers.run
 
 """ For a detailed description of all output modes, read the description of
@@ -37,86 +39,211 @@ def sanity_checks(output="log", output_return=False, check=None):
 
 def background(args, cmd, working_dir=None):
     """ Run a subprocess in background and redirect its output to the log. """
-    ret = subprocess.Popen(cmd, stdout=args.logfd, stderr=args.logfd,
-                           cwd=working_dir)
+    logfd = tools.helpers.logging.dup_logfd(args)
+    try:
+        ret = subprocess.Popen(cmd, stdout=logfd, stderr=logfd,
+                               cwd=working_dir)
+    finally:
+        os.close(logfd)
     logging.debug("New background process: pid={}, output=background".format(ret.pid))
     return ret
 
 def pipe(args, cmd, working_dir=None):
     """ Run a subprocess in background and redirect its output to a pipe. """
-    ret = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=args.logfd,
-                           cwd=working_dir)
+    logfd = tools.helpers.logging.dup_logfd(args)
+    try:
+        ret = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=logfd,
+                               cwd=working_dir)
+    finally:
+        os.close(logfd)
     logging.verbose("New background process: pid={}, output=pipe".format(ret.pid))
     return ret
 
+# Size of the buffer foreground_pipe() reads command output into
+PIPE_BUFFER_SIZE = 1024 * 1024
+
 def pipe_read(args, process, output_to_stdout=False, output_return=False,
-              output_return_buffer=False):
+              output_return_buffer=False, buf=None):
     """
     Read all available output from a subprocess and copy it to the log and
     optionally stdout and a buffer variable. This is only meant to be called by
     foreground_pipe() below.
 
+    When the output only goes to the log, it gets spliced from the pipe to
+    the log file in the kernel (if the log file allows it), otherwise it is
+    read in large chunks into buf.
+
     :param process: subprocess.Popen instance
     :param output_to_stdout: copy all output to waydroid's stdout
     :param output_return: when set to True, output_return_buffer will be
                           extended
-    :param output_return_buffer: list of bytes that gets extended with the
+    :param output_return_buffer: bytearray that gets extended with the
                                  current output in case output_return is True.
+    :param buf: preallocated bytearray to read into
     """
+    handle = process.stdout.fileno()
+    if buf is None:
+        buf = bytearray(PIPE_BUFFER_SIZE)
+    view = memoryview(buf)
+    log_only = not output_to_stdout and not output_return
+
     while True:
         # Copy available output
-        out = process.stdout.readline()
-        if len(out):
-            args.logfd.buffer.write(out)
-            if output_to_stdout:
-                sys.stdout.buffer.write(out)
-            if output_return:
-                output_return_buffer.append(out)
-            continue
-
-        # No more output (flush buffers)
-        args.logfd.flush()
+        try:
+            if log_only:
+                size = tools.helpers.logging.splice(args, handle, len(buf))
+                if size is not None:
+                    if size:
+                        continue
+                    break
+            size = os.readv(handle, [buf])
+        except BlockingIOError:
+            break
+        if not size:
+            break
+
+        out = view[:size]
+        tools.helpers.logging.write_raw(args, out)
         if output_to_stdout:
-            sys.stdout.flush()
-        return
+            sys.stdout.buffer.write(out)
+        if output_return:
+            output_return_buffer += out
+
+    # No more output (flush buffers)
+    tools.helpers.logging.flush(args)
+    if output_to_stdout:
+        sys.stdout.flush()
 
-def kill_process_tree(args, pid, ppids, sudo):
+def proc_children(pid):
+    """
+    :returns: list of the direct children of a process, from
+              /proc/<pid>/task/*/children, or None when the kernel doesn't
+              provide that file (CONFIG_PROC_CHILDREN)
     """
-    Recursively kill a pid and its child processes
+    ret = []
+    try:
+        tasks = os.listdir("/proc/{}/task".format(pid))
+    except FileNotFoundError:
+        return ret
+    for tid in tasks:
+        try:
+            with open("/proc/{}/task/{}/children".format(pid, tid)) as handle:
+                ret += [int(child) for child in handle.read().split()]
+        except FileNotFoundError:
+            if not os.path.exists("/proc/{}/task".format(pid)):
+                return ret
+            return None
+    return ret
 
-    :param pid: process id that will be killed
-    :param ppids: list of process id and parent process id tuples (pid, ppid)
-    :param sudo: use sudo to kill the process
+def proc_ppids():
     """
-    if sudo:
-        tools.helpers.run.root(args, ["kill", "-9", str(pid)],
-                             check=False)
-    else:
-        tools.helpers.run.user(args, ["kill", "-9", str(pid)],
-                             check=False)
+    :returns: dict of ppid -> list of pids, by reading /proc/*/stat
+    """
+    ret = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/" + entry + "/stat") as handle:
+                stat = handle.read()
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        # The command name in parentheses may contain spaces
+        ppid = int(stat[stat.rfind(")") + 2:].split()[1])
+        ret.setdefault(ppid, []).append(int(entry))
+    return ret
 
-    for (child_pid, child_ppid) in ppids:
-        if child_ppid == str(pid):
-            kill_process_tree(args, child_pid, ppids, sudo)
+def process_tree(pid):
+    """
+    :returns: list of a pid and all of its descendants, parents first
+    """
+    ret = [pid]
+    ppids = None
+    i = 0
+    while i < len(ret):
+        children = proc_children(ret[i]) if ppids is None else None
+        if children is None:
+            if ppids is None:
+                ppids = proc_ppids()
+            children = ppids.get(ret[i], [])
+        ret += [child for child in children if child not in ret]
+        i += 1
+    return ret
 
-def kill_command(args, pid, sudo):
+def send_signal(pid, sig):
+    """
+    Send a signal through a pidfd where possible, so a pid that got reused
+    in the meantime doesn't get hit.
+
+    :returns: False when the process is gone
+    """
+    try:
+        pidfd = os.pidfd_open(pid)
+    except ProcessLookupError:
+        return False
+    except (AttributeError, OSError):
+        pidfd = None
+
+    try:
+        if pidfd is None:
+            os.kill(pid, sig)
+        else:
+            signal.pidfd_send_signal(pidfd, sig)
+    except ProcessLookupError:
+        return False
+    finally:
+        if pidfd is not None:
+            os.close(pidfd)
+    return True
+
+def kill_command(args, pid, sudo, pgid=None):
     """
-    Kill a command process and recursively kill its child processes
+    Kill a command process and all of its child processes. The whole tree is
+    stopped first (parents before children), so nothing can fork away while
+    it gets killed.
 
     :param pid: process id that will be killed
-    :param sudo: use sudo to kill the process
+    :param sudo: the process runs through sudo. When we are not allowed to
+                 signal it, fall back to a single "sudo kill".
+    :param pgid: process group of the command, if it got its own
     """
-    cmd = ["ps", "-e", "-o", "pid,ppid"]
-    ret = subprocess.run(cmd, check=True, stdout=subprocess.PIPE)
-    ppids = []
-    proc_entries = ret.stdout.decode("utf-8").rstrip().split('\n')[1:]
-    for row in proc_entries:
-        items = row.split()
-        if len(items) != 2:
-            raise RuntimeError("Unexpected ps output: " + row)
-        ppids.append(items)
-
-    kill_process_tree(args, pid, ppids, sudo)
+    stopped = []
+    try:
+        pids = process_tree(pid)
+        while pids:
+            for child in pids:
+                if send_signal(child, signal.SIGSTOP):
+                    stopped.append(child)
+            # Catch children that were forked before their parent stopped
+            pids = [child for child in process_tree(pid)
+                    if child not in stopped]
+
+        if pgid is not None:
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        for child in stopped:
+            send_signal(child, signal.SIGKILL)
+    except PermissionError:
+        # Don't leave what we already stopped hanging
+        for child in stopped:
+            try:
+                send_signal(child, signal.SIGCONT)
+            except PermissionError:
+                pass
+        if sudo:
+            tools.helpers.run.root(args, ["kill", "-9"] +
+                                   [str(child) for child in process_tree(pid)],
+                                   check=False)
+            return
+        logging.warning("Not allowed to kill all processes of pid {},"
+                        " killing the ones we can".format(pid))
+        for child in process_tree(pid):
+            try:
+                send_signal(child, signal.SIGKILL)
+            except PermissionError:
+                pass
 
 def foreground_pipe(args, cmd, working_dir=None, output_to_stdout=False,
                     output_return=False, output_timeout=True,
@@ -138,9 +265,13 @@ def foreground_pipe(args, cmd, working_dir=None, output_to_stdout=False,
               * output: ""
               * output: full program output string (output_return is True)
     """
-    # Start process in background (stdout and stderr combined)
+    # Start process in background (stdout and stderr combined). Put it in its
+    # own process group when it may get killed, so the whole group can be
+    # signalled at once.
     process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                               stderr=subprocess.STDOUT, cwd=working_dir)
+                               stderr=subprocess.STDOUT, cwd=working_dir,
+                               process_group=0 if output_timeout else None)
+    pgid = process.pid if output_timeout else None
 
     # Make process.stdout non-blocking
     handle = process.stdout.fileno()
@@ -148,38 +279,45 @@ def foreground_pipe(args, cmd, working_dir=None, output_to_stdout=False,
     fcntl.fcntl(handle, fcntl.F_SETFL, flags | os.O_NONBLOCK)
 
     # While process exists wait for output (with timeout)
-    output_buffer = []
+    output_buffer = bytearray()
+    buf = bytearray(PIPE_BUFFER_SIZE)
     sel = selectors.DefaultSelector()
     sel.register(process.stdout, selectors.EVENT_READ)
     timeout = args.timeout if output_timeout else None
-    while process.poll() is None:
-        wait_start = time.perf_counter() if output_timeout else None
-        sel.select(timeout)
-
-        # On timeout raise error (we need to measure time on our own, because
-        # select() may exit early even if there is no data to read and the
-        # timeout was not reached.)
-        if output_timeout:
-            wait_end = time.perf_counter()
-            if wait_end - wait_start >= args.timeout:
-                logging.info("Process did not write any output for " +
-                             str(args.timeout) + " seconds. Killing it.")
-                logging.info("NOTE: The timeout can be increased with"
-                             " 'waydroid -t'.")
-                kill_command(args, process.pid, sudo)
-                continue
-
-        # Read all currently available output
-        pipe_read(args, process, output_to_stdout, output_return,
-                  output_buffer)
+    try:
+        while process.poll() is None:
+            wait_start = time.perf_counter() if output_timeout else None
+            sel.select(timeout)
+
+            # On timeout raise error (we need to measure time on our own, because
+            # select() may exit early even if there is no data to read and the
+            # timeout was not reached.)
+            if output_timeout:
+                wait_end = time.perf_counter()
+                if wait_end - wait_start >= args.timeout:
+                    logging.info("Process did not write any output for " +
+                                 str(args.timeout) + " seconds. Killing it.")
+                    logging.info("NOTE: The timeout can be increased with"
+                                 " 'waydroid -t'.")
+                    kill_command(args, process.pid, sudo, pgid)
+                    continue
+
+            # Read all currently available output
+            pipe_read(args, process, output_to_stdout, output_return,
+                      output_buffer, buf)
+    except KeyboardInterrupt:
+        # The process group doesn't get the terminal's SIGINT anymore
+        if pgid is not None:
+            kill_command(args, process.pid, sudo, pgid)
+        raise
 
     # There may still be output after the process quit
-    pipe_read(args, process, output_to_stdout, output_return, output_buffer)
+    pipe_read(args, process, output_to_stdout, output_return, output_buffer,
+              buf)
 
-    # Return the return code and output (the output gets built as list of
-    # output chunks and combined at the end, this is faster than extending the
-    # combined string with each new chunk)
-    return (process.returncode, b"".join(output_buffer).decode("utf-8"))
+    # Return the return code and output (the output gets collected in one
+    # bytearray and only decoded once at the end)
+    return (process.returncode, output_buffer.decode("utf-8"))
 
 def foreground_tui(cmd, working_dir=None):
     """
@@ -0,0 +1,125 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import contextlib
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import tools.config
+
+"""
+Boot timeline tracing. Every container start gets its own trace file in
+Chrome's trace event format (JSON array format, which may lack the closing
+bracket), so it can be loaded in chrome://tracing or ui.perfetto.dev as is.
+
+The container manager starts a trace in do_start(), the session and the
+state change server attach to it and add their own spans. All timestamps
+are wall clock microseconds, so spans of different processes line up.
+"""
+
+TRACES_DIR = tools.config.defaults["work"] + "/traces"
+LAST_BOOT = TRACES_DIR + "/last-boot.json"
+# Number of boot traces to keep
+TRACES_KEEP = 10
+
+current = None
+
+def now_us():
+    return time.time_ns() // 1000
+
+def begin_boot(start_us=None, pid=None, uid=None):
+    """
+    Start the trace of a new boot and make it the last boot.
+
+    :param start_us: when the boot started, if it started before this call
+                     (e.g. in the session that requested it)
+    :param pid: pid of the process that started the boot at start_us
+    :param uid: user of the session, who gets to add its spans too
+    """
+    global current
+    os.makedirs(TRACES_DIR, 0o755, exist_ok=True)
+    path = os.path.join(TRACES_DIR, "boot-{}.json".format(
+        time.strftime("%Y%m%d-%H%M%S")))
+    with open(path, "w") as handle:
+        handle.write("[\n")
+    os.chmod(path, 0o644)
+    if uid is not None:
+        os.chown(path, uid, -1)
+
+    tmp = LAST_BOOT + ".tmp"
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    os.symlink(os.path.basename(path), tmp)
+    os.replace(tmp, LAST_BOOT)
+
+    for old in sorted(glob.glob(TRACES_DIR + "/boot-*.json"))[:-TRACES_KEEP]:
+        os.unlink(old)
+
+    current = path
+    if start_us is not None:
+        add_event("session start", start_us, now_us(), pid=pid)
+    logging.debug("Tracing boot to " + path)
+    return path
+
+def attach():
+    """ Add spans of this process to the last boot's trace. """
+    global current
+    current = os.path.realpath(LAST_BOOT) if os.path.exists(LAST_BOOT) else None
+
+def detach():
+    global current
+    current = None
+
+def add_event(name, start_us, end_us, pid=None, tid=None, args=None,
+              path=None):
+    """
+    :param path: trace to add the event to, for events that end after the
+                 trace got detached. Defaults to the current trace.
+    """
+    if path is None:
+        path = current
+    if path is None:
+        return
+    event = {
+        "name": name,
+        "cat": "boot",
+        "ph": "X",
+        "ts": start_us,
+        "dur": end_us - start_us,
+        "pid": pid if pid is not None else os.getpid(),
+        "tid": tid if tid is not None else threading.get_native_id(),
+    }
+    if args:
+        event["args"] = args
+    try:
+        with open(path, "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            handle.write(json.dumps(event) + ",\n")
+    except OSError as e:
+        logging.debug("Failed to write trace event: {}".format(e))
+
+@contextlib.contextmanager
+def span(name, **args):
+    """ Record the time spent in a with block, e.g. with span("lxc-start"): """
+    if current is None:
+        yield
+        return
+    start = now_us()
+    try:
+        yield
+    finally:
+        add_event(name, start, now_us(), args=args)
+
+def load(path=LAST_BOOT):
+    """
+    :returns: list of the trace events of a boot, sorted by start time
+    """
+    with open(path) as handle:
+        data = handle.read().rstrip().rstrip(",")
+    if not data.endswith("]"):
+        data += "]"
+    return sorted(json.loads(data), key=lambda event: event["ts"])
@@ -1,10 +1,8 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-import gbinder
 import logging
-from tools import helpers
-from gi.repository import GLib
+from tools.helpers import binder_stats
 
 INTERFACE = "lineageos.waydroid.IClipboard"
 SERVICE_NAME = "waydroidclipboard"
@@ -12,14 +10,14 @@ SERVICE_NAME = "waydroidclipboard"
 TRANSACTION_sendClipboardData = 1
 TRANSACTION_getClipboardData = 2
 
-def add_service(args, sendClipboardData, getClipboardData):
-    helpers.drivers.loadBinderNodes(args)
-    try:
-        serviceManager = gbinder.ServiceManager("/dev/" + args.BINDER_DRIVER, args.SERVICE_MANAGER_PROTOCOL, args.BINDER_PROTOCOL)
-    except TypeError:
-        serviceManager = gbinder.ServiceManager("/dev/" + args.BINDER_DRIVER)
+binder_stats.register_interface(INTERFACE, globals())
 
-    def response_handler(req, code, flags):
+def response_handler(sendClipboardData, getClipboardData):
+    """
+    Build the local object handler, to be registered with
+    tools.services.binder_hub.add_service().
+    """
+    def handler(response, req, code, flags):
         logging.debug(
             "{}: Received transaction: {}".format(SERVICE_NAME, code))
         reader = req.init_reader()
@@ -36,23 +34,4 @@ def add_service(args, sendClipboardData, getClipboardData):
             return local_response, -99999 # Some error unknown to binder to force a RemoteException
 
         return local_response, 0
-
-    def binder_presence():
-        if serviceManager.is_present():
-            status = serviceManager.add_service_sync(SERVICE_NAME, response)
-
-            if status:
-                logging.error("Failed to add service {}: {}".format(
-                    SERVICE_NAME, status))
-                args.clipboardLoop.quit()
-
-    response = serviceManager.new_local_object(INTERFACE, response_handler)
-    args.clipboardLoop = GLib.MainLoop()
-    binder_presence()
-    status = serviceManager.add_presence_handler(binder_presence)
-    if status:
-        args.clipboardLoop.run()
-        serviceManager.remove_handler(status)
-        del serviceManager
-    else:
-        logging.error("Failed to add presence handler: {}".format(status))
+    return handler
@@ -5,6 +5,7 @@ import gbinder
 import logging
 import time
 from tools import helpers
+from tools.helpers import binder_stats
 from gi.repository import GLib
 import signal
 
@@ -25,15 +26,20 @@ TRANSACTION_settingsPutInt = 11
 TRANSACTION_settingsGetInt = 12
 TRANSACTION_launchIntent = 13
 
+binder_stats.register_interface(INTERFACE, globals())
+
 class IPlatform:
     def __init__(self, remote):
         self.client = gbinder.Client(remote, INTERFACE)
 
+    def transact(self, code, request):
+        return binder_stats.transact(self.client, INTERFACE, code, request)
+
     def getprop(self, arg1, arg2):
         request = self.client.new_request()
         request.append_string16(arg1)
         request.append_string16(arg2)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_getprop, request)
 
         if status:
@@ -53,7 +59,7 @@ class IPlatform:
         request = self.client.new_request()
         request.append_string16(arg1)
         request.append_string16(arg2)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_setprop, request)
 
         if status:
@@ -70,7 +76,7 @@ class IPlatform:
 
     def getAppsInfo(self):
         request = self.client.new_request()
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_getAppsInfo, request)
 
         apps_list = []
@@ -106,7 +112,7 @@ class IPlatform:
     def getAppInfo(self, arg1):
         request = self.client.new_request()
         request.append_string16(arg1)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_getAppInfo, request)
 
         if status:
@@ -140,7 +146,7 @@ class IPlatform:
     def installApp(self, arg1):
         request = self.client.new_request()
         request.append_string16(arg1)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_installApp, request)
 
         if status:
@@ -159,7 +165,7 @@ class IPlatform:
     def removeApp(self, arg1):
         request = self.client.new_request()
         request.append_string16(arg1)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_removeApp, request)
 
         if status:
@@ -178,7 +184,7 @@ class IPlatform:
     def launchApp(self, arg1):
         request = self.client.new_request()
         request.append_string16(arg1)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_launchApp, request)
 
         if status:
@@ -193,7 +199,7 @@ class IPlatform:
         request = self.client.new_request()
         request.append_string16(arg1)
         request.append_string16(arg2)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_launchIntent, request)
 
         if status:
@@ -211,7 +217,7 @@ class IPlatform:
     def getAppName(self, arg1):
         request = self.client.new_request()
         request.append_string16(arg1)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_getAppName, request)
 
         if status:
@@ -232,7 +238,7 @@ class IPlatform:
         request.append_int32(arg1)
         request.append_string16(arg2)
         request.append_string16(arg3)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_settingsPutString, request)
 
         if status:
@@ -247,7 +253,7 @@ class IPlatform:
         request = self.client.new_request()
         request.append_int32(arg1)
         request.append_string16(arg2)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_settingsGetString, request)
 
         if status:
@@ -268,7 +274,7 @@ class IPlatform:
         request.append_int32(arg1)
         request.append_string16(arg2)
         request.append_int32(arg3)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_settingsPutInt, request)
 
         if status:
@@ -283,7 +289,7 @@ class IPlatform:
         request = self.client.new_request()
         request.append_int32(arg1)
         request.append_string16(arg2)
-        reply, status = self.client.transact_sync_reply(
+        reply, status = self.transact(
             TRANSACTION_settingsGetString, request)
 
         if status:
@@ -2,8 +2,17 @@
 # Copyright 2025 Bardia Moshiri
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from tools.services.user_manager import start, stop
-from tools.services.clipboard_manager import start, stop
-from tools.services.gnss_manager import start, stop
-from tools.services.notification_client import start, stop
-from tools.services.screen_manager import start, stop
+import importlib
+
+""" Service modules are imported on first use, see tools/actions/__init__.py.
+    Only the session needs them, and gnss_manager alone pulls in Geoclue. """
+
+def __getattr__(name):
+    try:
+        value = importlib.import_module("tools.services." + name)
+    except ModuleNotFoundError as e:
+        if e.name != "tools.services." + name:
+            raise
+        raise AttributeError("module 'tools.services' has no attribute '{}'".format(name))
+    globals()[name] = value
+    return value
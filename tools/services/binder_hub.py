@@ -0,0 +1,132 @@
+# Copyright 2025 Bardia Moshiri
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import gbinder
+import logging
+import threading
+from tools import helpers
+from tools.helpers import binder_stats
+from gi.repository import GLib
+
+""" One host side binder hub per session. It owns a single ServiceManager
+    and main loop, and (re-)registers every local object that was added
+    with add_service() together whenever the Android service manager comes
+    back, e.g. after an Android restart. """
+
+REGISTER_RETRY_SECONDS = 1
+
+stopping = False
+hub = None
+
+class BinderHub:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.services = {}
+        self.local_objects = {}
+        self.serviceManager = None
+        # Created up front so that stop() always has a loop to quit
+        self.looper = GLib.MainLoop()
+        self.retry_source = None
+
+    def add(self, name, interface, response_handler):
+        with self.lock:
+            self.services[name] = (interface, response_handler)
+        # Register right away if the hub is already up, from the hub thread
+        if self.serviceManager is not None:
+            GLib.idle_add(self.register_all)
+
+    def new_local_object(self, interface, response_handler):
+        local_object = None
+
+        def handler(req, code, flags):
+            return response_handler(local_object, req, code, flags)
+
+        local_object = self.serviceManager.new_local_object(
+            interface, binder_stats.instrument_handler(interface, handler))
+        return local_object
+
+    def register_all(self):
+        if not self.serviceManager.is_present():
+            return False
+
+        failed = False
+        with self.lock:
+            services = dict(self.services)
+        for name, (interface, response_handler) in services.items():
+            if name not in self.local_objects:
+                self.local_objects[name] = self.new_local_object(
+                    interface, response_handler)
+            status = self.serviceManager.add_service_sync(
+                name, self.local_objects[name])
+            if status:
+                logging.error("Failed to add service {}: {}".format(
+                    name, status))
+                failed = True
+            else:
+                logging.debug("Registered binder service {}".format(name))
+
+        if failed and self.retry_source is None and not stopping:
+            self.retry_source = GLib.timeout_add_seconds(
+                REGISTER_RETRY_SECONDS, self.retry)
+        return False
+
+    def retry(self):
+        self.retry_source = None
+        self.register_all()
+        return False
+
+    def run(self):
+        helpers.drivers.loadBinderNodes(self.args)
+        try:
+            self.serviceManager = gbinder.ServiceManager(
+                "/dev/" + self.args.BINDER_DRIVER,
+                self.args.SERVICE_MANAGER_PROTOCOL, self.args.BINDER_PROTOCOL)
+        except TypeError:
+            self.serviceManager = gbinder.ServiceManager(
+                "/dev/" + self.args.BINDER_DRIVER)
+
+        self.register_all()
+        status = self.serviceManager.add_presence_handler(self.register_all)
+        if status:
+            if not stopping:
+                self.looper.run()
+            self.serviceManager.remove_handler(status)
+        else:
+            logging.error("Failed to add presence handler: {}".format(status))
+        self.local_objects.clear()
+        self.serviceManager = None
+
+def add_service(args, name, interface, response_handler):
+    """
+    Register a local binder object with the session's hub.
+
+    :param response_handler: function (local_object, req, code, flags) that
+                             returns (reply, status), see e.g.
+                             tools.interfaces.IUserMonitor.response_handler()
+    """
+    if hub is None:
+        raise RuntimeError("Binder hub is not running")
+    hub.add(name, interface, response_handler)
+
+def start(args):
+    def service_thread():
+        try:
+            hub.run()
+        except Exception as e:
+            logging.error(f"Binder hub error: {str(e)}")
+
+    global stopping, hub
+    stopping = False
+    hub = BinderHub(args)
+    args.binder_hub = threading.Thread(target=service_thread)
+    args.binder_hub.start()
+
+def stop(args):
+    global stopping
+    stopping = True
+    if hub is not None:
+        # Quit from the loop itself, a quit() before run() would be lost
+        GLib.idle_add(hub.looper.quit)
+    else:
+        logging.debug("Binder hub is not even started")
@@ -7,9 +7,12 @@ import logging
 import threading
 from tools.interfaces import IClipboard
 from tools.helpers import WaylandClipboardHandler, drivers
+from tools.services import binder_hub
 import dbus.mainloop.glib
 from gi.repository import GLib
 
+logger = logging.getLogger(__name__)
+
 stopping = False
 clipboard_handler = None
 
@@ -24,18 +27,19 @@ def start(args):
             bus_name='id.waydro.StateChange'
         )
 
-    def service_thread_gbinder():
+    def add_service_gbinder():
         global clipboard_handler
         try:
             clipboard_handler = WaylandClipboardHandler()
-            while not stopping:
-                IClipboard.add_service(
-                    args,
+            binder_hub.add_service(
+                args, IClipboard.SERVICE_NAME, IClipboard.INTERFACE,
+                IClipboard.response_handler(
                     clipboard_handler.copy,
                     clipboard_handler.paste
                 )
+            )
         except Exception as e:
-            logging.debug(f"Clipboard service error: {str(e)}")
+            logger.debug("Clipboard service error: %s", str(e))
 
     def service_thread_statechange():
         global clipboard_handler
@@ -51,23 +55,20 @@ def start(args):
                 try:
                     args.clipboardLoop.run()
                 except Exception as e:
-                    logging.error(f"Error in clipboard manager loop: {e}")
+                    logger.error("Error in clipboard manager loop: %s", e)
                     if not stopping:
                         continue
                     break
         except Exception as e:
-            logging.debug(f"Clipboard service error: {str(e)}")
-
-    def service_thread():
-        if drivers.should_use_statechange():
-            service_thread_statechange()
-        else:
-            service_thread_gbinder()
+            logger.debug("Clipboard service error: %s", str(e))
 
     global stopping
     stopping = False
-    args.clipboard_manager = threading.Thread(target=service_thread)
-    args.clipboard_manager.start()
+    if drivers.should_use_statechange():
+        args.clipboard_manager = threading.Thread(target=service_thread_statechange)
+        args.clipboard_manager.start()
+    else:
+        add_service_gbinder()
 
 def stop(args):
     global stopping
@@ -76,4 +77,4 @@ def stop(args):
         if args.clipboardLoop:
             args.clipboardLoop.quit()
     except AttributeError:
-        logging.debug("Clipboard service is not even started")
+        logger.debug("Clipboard service is not even started")
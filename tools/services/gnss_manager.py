@@ -18,8 +18,6 @@ from gi.repository import Geoclue
 from tools import helpers
 from tools import config
 
-multiprocessing.set_start_method('spawn', force=True)
-
 stopping = False
 location_service = None
 
@@ -165,6 +163,9 @@ def start(args):
         except Exception as e:
             logging.error(f"Location service error: {str(e)}")
 
+    # The tracker process must not inherit our GLib and dbus state
+    multiprocessing.set_start_method('spawn', force=True)
+
     global stopping
     stopping = False
     args.gnss_manager = threading.Thread(target=service_thread)
@@ -13,6 +13,8 @@ from tools.helpers import ipc
 from tools.interfaces import IPlatform
 from tools.actions import app_manager
 
+logger = logging.getLogger(__name__)
+
 stopping = False
 
 class NotificationService:
@@ -49,7 +51,7 @@ class NotificationService:
                 path='/id/waydro/Notification'
             )
         except Exception as e:
-            logging.error(f"Failed to setup DBus signals: {e}")
+            logger.error("Failed to setup DBus signals: %s", e)
 
     def get_app_name(self, package_name):
         args = helpers.arguments()
@@ -73,7 +75,7 @@ class NotificationService:
             app_name = app_name_dict.get(package_name)
             return True, app_name
 
-        logging.error("Failed to access IPlatform service")
+        logger.error("Failed to access IPlatform service")
 
         if session["state"] == "FROZEN":
             cm.Freeze()
@@ -152,9 +154,9 @@ class NotificationService:
 
     def on_new_message(self, msg_hash, _msg_id, package_name, ticker, title, text, is_foreground_service,
                        is_group_summary, show_light, _when):
-        logging.debug(f"Received new message notification: {msg_hash}, {_msg_id}, {package_name}, " +
-                     f"{ticker}, {title}, {text}, {is_foreground_service}, {is_group_summary}, " +
-                     f"{show_light}, {_when}")
+        logger.debug("Received new message notification: %s, %s, %s, %s, %s, %s, %s, %s, %s, %s",
+                     msg_hash, _msg_id, package_name, ticker, title, text, is_foreground_service,
+                     is_group_summary, show_light, _when)
         try:
             ok, app_name = self.get_app_name(package_name)
             if ok and not is_group_summary:
@@ -162,13 +164,13 @@ class NotificationService:
                                             is_foreground_service, show_light, 0)
                 self.open_notifications[msg_hash] = notification_id
         except dbus.DBusException:
-            logging.error("WayDroid session is stopped")
+            logger.error("WayDroid session is stopped")
 
     def on_update_message(self, msg_hash, replaces_hash, _msg_id, package_name, ticker, title, text,
                           is_foreground_service, _is_group_summary, show_light, _when):
-        logging.debug(f"Received update message notification: {msg_hash}, {replaces_hash}, " +
-                     f"{_msg_id}, {package_name}, {ticker}, {title}, {text}, " +
-                     f"{is_foreground_service}, {_is_group_summary}, {show_light}, {_when}")
+        logger.debug("Received update message notification: %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s",
+                     msg_hash, replaces_hash, _msg_id, package_name, ticker, title, text,
+                     is_foreground_service, _is_group_summary, show_light, _when)
         try:
             ok, app_name = self.get_app_name(package_name)
             if ok and replaces_hash in self.open_notifications:
@@ -178,21 +180,21 @@ class NotificationService:
                 self.open_notifications[msg_hash] = notification_id
                 del self.open_notifications[replaces_hash]
         except dbus.DBusException:
-            logging.error("WayDroid session is stopped")
+            logger.error("WayDroid session is stopped")
 
     # on android, a notification disappeared (and was not replaced by another)
     def on_delete_message(self, msg_hash):
-        logging.debug(f"Received delete message notification: {msg_hash}")
+        logger.debug("Received delete message notification: %s", msg_hash)
         try:
             if msg_hash in self.open_notifications:
                 self.close_notification_send(self.open_notifications[msg_hash])
                 del self.open_notifications[msg_hash]
         except dbus.DBusException:
-            logging.error("WayDroid session is stopped")
+            logger.error("WayDroid session is stopped")
 
     def run(self):
         self.args.notificationLoop = GLib.MainLoop()
-        logging.debug("Notification client service running")
+        logger.debug("Notification client service running")
         self.args.notificationLoop.run()
 
 def service_thread(args):
@@ -206,16 +208,16 @@ def service_thread(args):
             try:
                 notification_service.run()
             except Exception as e:
-                logging.error(f"Error in notification service loop: {e}")
+                logger.error("Error in notification service loop: %s", e)
                 if not stopping:
                     continue
                 break
     except Exception as e:
-        logging.error(f"Notification service error: {str(e)}")
+        logger.error("Notification service error: %s", str(e))
 
 def start(args):
     global stopping
-    logging.debug("Starting notification client service")
+    logger.debug("Starting notification client service")
 
     stopping = False
     args.notification_manager = threading.Thread(target=service_thread, args=(args,))
@@ -225,11 +227,11 @@ def start(args):
 def stop(args):
     global stopping
 
-    logging.debug("Stopping notification client service")
+    logger.debug("Stopping notification client service")
     stopping = True
 
     try:
         if hasattr(args, 'notificationLoop') and args.notificationLoop:
             args.notificationLoop.quit()
     except Exception as e:
-        logging.error(f"Error stopping notification service: {e}")
+        logger.error("Error stopping notification service: %s", e)
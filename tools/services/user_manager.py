@@ -11,6 +11,7 @@ import tools.helpers.net
 from tools.helpers import ipc, drivers
 from tools.interfaces import IUserMonitor
 from tools.interfaces import IPlatform
+from tools.services import binder_hub
 import dbus.mainloop.glib
 from gi.repository import GLib
 
@@ -70,7 +71,7 @@ Icon={waydroid_data}/icons/com.android.settings.png
             return 0
 
     def userUnlocked(uid):
-        cfg = tools.config.load(args)
+        cfg = tools.config.view(args)
         logging.info("Android with user {} is ready".format(uid))
 
         if cfg["waydroid"]["auto_adb"] == "True":
@@ -94,6 +95,12 @@ Icon={waydroid_data}/icons/com.android.settings.png
         if timezone:
             cm.Setprop("persist.sys.timezone", timezone)
 
+        # Recording the boot profile is best effort
+        try:
+            cm.BootCompleted()
+        except dbus.DBusException as e:
+            logging.debug("Failed to report boot completion: {}".format(e))
+
     def packageStateChanged(mode, packageName, uid):
         platformService = IPlatform.get_service(args)
         if platformService:
@@ -125,10 +132,6 @@ Icon={waydroid_data}/icons/com.android.settings.png
             bus_name='id.waydro.StateChange'
         )
 
-    def service_thread_gbinder():
-        while not stopping:
-            IUserMonitor.add_service(args, userUnlocked, packageStateChanged)
-
     def service_thread_statechange():
         dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
         setup_dbus_signals()
@@ -143,16 +146,18 @@ Icon={waydroid_data}/icons/com.android.settings.png
                     continue
                 break
 
-    def service_thread():
-        if drivers.should_use_statechange():
-            service_thread_statechange()
-        else:
-            service_thread_gbinder()
-
     global stopping
     stopping = False
-    args.user_manager = threading.Thread(target=service_thread)
-    args.user_manager.start()
+    if drivers.should_use_statechange():
+        args.user_manager = threading.Thread(target=service_thread_statechange)
+        args.user_manager.start()
+    else:
+        binder_hub.add_service(args, IUserMonitor.SERVICE_NAME, IUserMonitor.INTERFACE,
+                               IUserMonitor.response_handler(userUnlocked, packageStateChanged))
+
+    if session.get("resumed") == "true":
+        # Android was kept in standby and is unlocked already
+        threading.Thread(target=userUnlocked, args=(0,), daemon=True).start()
 
 def stop(args):
     global stopping